@@ -0,0 +1,182 @@
+"""
+Synthetic campus data for benchmarks
+
+Generates a reproducible campus (students, classes with weekly schedules,
+enrollments and a semester of attendance) in the same nested layout as the
+local data service:
+
+    classes/{class_id}, students/{student_id}, attendance/{class_id}/{date}/{student_id}
+
+The same seed always produces the same campus, so benchmark runs are comparable.
+"""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+# Two hour teaching slots from 08:00 to 18:00
+SLOTS = [('08:00', '10:00'), ('10:00', '12:00'), ('12:00', '14:00'), ('14:00', '16:00'), ('16:00', '18:00')]
+
+
+def generate_campus(students: int = 20000, classes: int = 800, weeks: int = 16,
+                    classes_per_student: int = 5, sessions_per_week: int = 2,
+                    attendance_rate: float = 0.85, rooms: int = 120,
+                    start_date: Optional[str] = None, seed: int = 42) -> Dict[str, Any]:
+    """
+    Generate a campus in the local data service layout
+    start_date (YYYY-MM-DD) is the Monday of the first semester week,
+    by default the semester ends with the current week.
+    """
+    rng = random.Random(seed)
+
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    if start_date:
+        semester_start = datetime.strptime(start_date, '%Y-%m-%d')
+    else:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        semester_start = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+
+    db = {'classes': {}, 'students': {}, 'attendance': {}}
+
+    # Classes with weekly schedules
+    class_ids = []
+    for i in range(classes):
+        class_id = new_id()
+        class_ids.append(class_id)
+
+        room_number = f"R{rng.randrange(rooms):03d}"
+        schedules = []
+        for day in rng.sample(DAYS, sessions_per_week):
+            start_time, end_time = rng.choice(SLOTS)
+            schedules.append({
+                'day_of_week': day,
+                'start_time': start_time,
+                'end_time': end_time,
+                'room_number': room_number
+            })
+
+        db['classes'][class_id] = {
+            'class_id': class_id,
+            'class_name': f"Course {i + 1:04d}",
+            'lecturer': f"Lecturer {rng.randrange(classes // 3 + 1):03d}",
+            'schedules': schedules,
+            'enrolled_students': []
+        }
+
+    # Students with enrollments
+    for i in range(students):
+        student_id = new_id()
+        enrolled = rng.sample(class_ids, min(classes_per_student, len(class_ids)))
+
+        db['students'][student_id] = {
+            'student_id': student_id,
+            'name': f"Student {i + 1:06d}",
+            'fingerprint_id': i + 1,
+            'enrolled_classes': enrolled
+        }
+        for class_id in enrolled:
+            db['classes'][class_id]['enrolled_students'].append(student_id)
+
+    # A semester of attendance for every scheduled session
+    for class_id, class_info in db['classes'].items():
+        class_attendance = {}
+
+        for week in range(weeks):
+            week_start = semester_start + timedelta(weeks=week)
+            for schedule in class_info['schedules']:
+                session_day = week_start + timedelta(days=DAYS.index(schedule['day_of_week']))
+                date = session_day.strftime('%Y-%m-%d')
+                start_hour, start_minute = map(int, schedule['start_time'].split(':'))
+
+                records = {}
+                for student_id in class_info['enrolled_students']:
+                    if rng.random() >= attendance_rate:
+                        continue
+                    minute = start_minute + rng.randrange(20)
+                    records[student_id] = {
+                        'attendance_id': new_id(),
+                        'student_id': student_id,
+                        'class_id': class_id,
+                        'timestamp': f"{date} {start_hour:02d}:{minute:02d}:{rng.randrange(60):02d}",
+                        'status': 'present'
+                    }
+
+                if records:
+                    class_attendance[date] = records
+
+        if class_attendance:
+            db['attendance'][class_id] = class_attendance
+
+    return db
+
+
+def campus_summary(db: Dict[str, Any]) -> Dict[str, int]:
+    """Count the entities of a generated campus"""
+    records = 0
+    sessions = 0
+    for dates in db['attendance'].values():
+        sessions += len(dates)
+        for students in dates.values():
+            records += len(students)
+
+    return {
+        'students': len(db['students']),
+        'classes': len(db['classes']),
+        'sessions': sessions,
+        'attendance_records': records
+    }
+
+
+def iter_attendance_records(db: Dict[str, Any]):
+    """Iterate over all attendance records of a generated campus"""
+    for dates in db['attendance'].values():
+        for students in dates.values():
+            yield from students.values()
+
+
+def session_scans(db: Dict[str, Any], date: str, day_of_week: str, start_time: str,
+                  limit: Optional[int] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Build the scans of a changeover burst: every student enrolled in a class
+    starting at start_time on day_of_week scans in during the first minutes
+    """
+    rng = random.Random(seed)
+    start_hour, start_minute = map(int, start_time.split(':'))
+    scans = []
+
+    for class_info in db['classes'].values():
+        for schedule in class_info['schedules']:
+            if schedule['day_of_week'] != day_of_week or schedule['start_time'] != start_time:
+                continue
+            for student_id in class_info['enrolled_students']:
+                student = db['students'][student_id]
+                minute = start_minute + rng.randrange(10)
+                scans.append({
+                    'fingerprint_id': student['fingerprint_id'],
+                    'timestamp': f"{date} {start_hour:02d}:{minute:02d}:{rng.randrange(60):02d}"
+                })
+
+    rng.shuffle(scans)
+    return scans[:limit] if limit else scans
+
+
+def load_into_local(service, db: Dict[str, Any]):
+    """Replace the contents of a LocalDataService with a generated campus"""
+    service.load_data(db)
+
+
+def load_into_firestore(firestore_db, db: Dict[str, Any], workers: int = 8):
+    """Write a generated campus to Firestore (or the Firestore emulator) with the bulk loader"""
+    from services.bulk_loader import BulkLoader, FirestoreTarget
+
+    loader = BulkLoader(FirestoreTarget(firestore_db), workers=workers)
+    return loader.load({
+        'classes': list(db['classes'].values()),
+        'students': list(db['students'].values()),
+        'attendance': list(iter_attendance_records(db))
+    })
@@ -0,0 +1,249 @@
+"""
+End-to-end load test for the Fingerprint Attendance System API
+
+Generates a synthetic campus, seeds it into the local data service or the
+Firestore emulator, then drives the FastAPI app with a mix of concurrent
+workloads:
+
+    scans      changeover bursts of GET /api/attendance/record/{fingerprint_id}
+    reports    GET /api/attendance/report/{class_id}?date=...
+    dashboard  polling of GET /api/classes/, GET /api/students/ and
+               GET /api/attendance/student/{student_id}
+
+Latency percentiles (p50/p95/p99) and throughput are reported per endpoint and
+saved as JSON so runs can be compared.
+
+Usage:
+    python -m benchmarks.load_test --backend local --students 2000 --classes 80 --weeks 4
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.load_test --backend emulator
+    python -m benchmarks.load_test --base-url http://localhost:5000 --skip-seed
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+import httpx
+
+from benchmarks.campus import generate_campus, campus_summary, session_scans, load_into_local, load_into_firestore, DAYS, SLOTS
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Get a percentile of a list of values using nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class LatencyRecorder:
+    """Collects request latencies and errors per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        self.latencies.setdefault(endpoint, []).append(elapsed)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        results = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            results[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors.get(endpoint, 0),
+                'throughput_rps': round(len(values) / duration, 2) if duration else 0.0,
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(max(values) * 1000, 2),
+            }
+        return results
+
+
+async def timed_get(client: httpx.AsyncClient, recorder: LatencyRecorder, endpoint: str, url: str):
+    """Issue a GET request and record its latency under the endpoint name"""
+    start = time.perf_counter()
+    ok = False
+    try:
+        response = await client.get(url)
+        # Rejected scans (e.g. duplicate or no class scheduled) are valid answers
+        ok = response.status_code < 500
+    except httpx.HTTPError:
+        pass
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+
+
+async def run_scan_bursts(client, recorder, campus, args, rng):
+    """Replay changeover bursts: all students of classes starting in a slot scan within minutes"""
+    today = datetime.now()
+    semester_days = [today - timedelta(days=offset) for offset in range(7 * args.weeks)]
+    teaching_days = [day for day in semester_days if day.strftime('%A') in DAYS]
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.bursts):
+        day = rng.choice(teaching_days)
+        start_time = rng.choice(SLOTS)[0]
+        scans = session_scans(campus, day.strftime('%Y-%m-%d'), day.strftime('%A'), start_time,
+                              limit=args.scans_per_burst, seed=rng.randrange(1 << 30))
+        for scan in scans:
+            queue.put_nowait(scan)
+
+    async def worker():
+        while True:
+            try:
+                scan = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            url = f"/api/attendance/record/{scan['fingerprint_id']}?timestamp={scan['timestamp']}"
+            await timed_get(client, recorder, 'GET /api/attendance/record/{fingerprint_id}', url)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+
+
+async def run_reports(client, recorder, campus, args, rng, deadline):
+    """Request attendance reports for random past sessions"""
+    sessions = [(class_id, date) for class_id, dates in campus['attendance'].items() for date in dates]
+    if not sessions:
+        return
+
+    while time.perf_counter() < deadline:
+        class_id, date = rng.choice(sessions)
+        await timed_get(client, recorder, 'GET /api/attendance/report/{class_id}',
+                        f"/api/attendance/report/{class_id}?date={date}")
+        # The in-process transport rarely yields, give the other clients a turn
+        await asyncio.sleep(0)
+
+
+async def run_dashboard(client, recorder, campus, args, rng, deadline):
+    """Poll the dashboard endpoints"""
+    student_ids = list(campus['students'])
+
+    while time.perf_counter() < deadline:
+        await timed_get(client, recorder, 'GET /api/classes/', '/api/classes/')
+        await timed_get(client, recorder, 'GET /api/students/', '/api/students/')
+        await timed_get(client, recorder, 'GET /api/attendance/student/{student_id}',
+                        f"/api/attendance/student/{rng.choice(student_ids)}")
+        await asyncio.sleep(args.poll_interval)
+
+
+def build_app(args, campus):
+    """Import the application with its data service seeded with the campus"""
+    os.environ.setdefault('FIREBASE_SIMULATION', 'true')
+
+    if args.backend == 'local':
+        # LocalDataService is a singleton, so the data service of the routes
+        # and the attendance service reads the store seeded here
+        from services.local_data_service import LocalDataService
+
+        os.environ['DATA_BACKENDS'] = 'local'
+        local_service = LocalDataService()
+        if not args.skip_seed:
+            load_into_local(local_service, campus)
+    elif not args.skip_seed:
+        from services.firebase_service import FirebaseService
+        load_into_firestore(FirebaseService().db, campus)
+
+    from main import app
+    return app
+
+
+async def run(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+
+    print("Generating campus...")
+    start = time.perf_counter()
+    campus = generate_campus(students=args.students, classes=args.classes, weeks=args.weeks, seed=args.seed)
+    summary = campus_summary(campus)
+    print(f"Generated {summary} in {time.perf_counter() - start:.1f}s")
+
+    # Bearer token is required by the auth dependency, it is not verified in simulation mode
+    headers = {'Authorization': 'Bearer load-test'}
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=60.0)
+    else:
+        print("Seeding data and starting application...")
+        app = build_app(args, campus)
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url='http://load-test', headers=headers, timeout=60.0)
+
+    recorder = LatencyRecorder()
+    async with client:
+        print(f"Running {args.bursts} scan bursts with {args.concurrency} concurrent readers...")
+        start = time.perf_counter()
+
+        # Reports and dashboards run alongside the scan bursts
+        deadline = start + args.duration
+        scans = asyncio.create_task(run_scan_bursts(client, recorder, campus, args, rng))
+        background = [run_reports(client, recorder, campus, args, random.Random(rng.random()), deadline)
+                      for _ in range(args.report_clients)]
+        background += [run_dashboard(client, recorder, campus, args, random.Random(rng.random()), deadline)
+                       for _ in range(args.dashboard_clients)]
+        await asyncio.gather(scans, *background)
+
+        duration = time.perf_counter() - start
+
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'backend': 'remote' if args.base_url else args.backend,
+        'seed': args.seed,
+        'campus': summary,
+        'duration_s': round(duration, 2),
+        'endpoints': recorder.summary(duration),
+    }
+
+
+def print_results(results: Dict[str, Any]):
+    """Print the per-endpoint results as a table"""
+    print(f"\n{'endpoint':<48}{'reqs':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for endpoint, stats in results['endpoints'].items():
+        print(f"{endpoint:<48}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+    print(f"\nTotal duration: {results['duration_s']}s (latencies in ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the attendance API with a synthetic campus")
+    parser.add_argument('--backend', choices=['local', 'emulator'], default='local',
+                        help="Seed the local data service or the Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+    parser.add_argument('--base-url', help="Drive a running server instead of the in-process app")
+    parser.add_argument('--skip-seed', action='store_true', help="Do not seed data, use what the store already has")
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--classes', type=int, default=800)
+    parser.add_argument('--weeks', type=int, default=16, help="Weeks of attendance history to generate")
+    parser.add_argument('--bursts', type=int, default=5, help="Number of changeover scan bursts")
+    parser.add_argument('--scans-per-burst', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50, help="Concurrent scanning readers")
+    parser.add_argument('--report-clients', type=int, default=4)
+    parser.add_argument('--dashboard-clients', type=int, default=2)
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Dashboard polling interval in seconds")
+    parser.add_argument('--duration', type=float, default=30.0, help="Duration of report and dashboard load in seconds")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_output.json', help="File to save the results as JSON")
+    args = parser.parse_args()
+
+    if args.backend == 'emulator' and not args.base_url and not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        parser.error("--backend emulator requires FIRESTORE_EMULATOR_HOST to be set")
+
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
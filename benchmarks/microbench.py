@@ -0,0 +1,183 @@
+"""
+Microbenchmarks for the scan resolution hot path
+
+Times the pieces every scan touches, parameterized over the size of the data:
+
+    time_in_range                         utils.time_util.time_in_range
+    get_day_of_week                       utils.time_util.get_day_of_week
+    determine_current_class               AttendanceService._determine_current_class
+    get_student_by_fingerprint            LocalDataService.get_student_by_fingerprint
+    get_student_attendance                LocalDataService.get_student_attendance
+    reference_get                         LocalReference.get on a full attendance path
+
+Results are saved as JSON. Pass --compare with a previous result file to flag
+cases that became slower than the threshold; the exit code is 1 if any did.
+
+Usage:
+    python -m benchmarks.microbench --output microbench.json
+    python -m benchmarks.microbench --compare microbench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime
+from typing import Dict, Any, Callable, List
+
+from benchmarks.campus import generate_campus, load_into_local
+
+# Campus sizes as (students, classes); attendance covers four weeks
+DEFAULT_SIZES = [(500, 20), (5000, 200), (20000, 800)]
+
+
+def new_local_service(campus: Dict[str, Any]):
+    """Create a LocalDataService holding the given campus, bypassing the shared singleton"""
+    from services.local_data_service import LocalDataService
+
+    service = object.__new__(LocalDataService)
+    service._init_state()
+    load_into_local(service, campus)
+    return service
+
+
+def new_attendance_service(data_service):
+    """Create an AttendanceService reading from the given data service"""
+    from services.attendance_service import AttendanceService
+
+    # A bare backend reports no writes, so reports are computed on every call
+    return AttendanceService(data_service)
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """Time a callable, returning per-call statistics in microseconds"""
+    timer = timeit.Timer(func)
+
+    # Pick a loop count so that one repetition takes at least min_time
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'loops': number,
+        'min_us': round(min(runs), 3),
+        'median_us': round(statistics.median(runs), 3),
+        'stdev_us': round(statistics.stdev(runs), 3) if len(runs) > 1 else 0.0,
+    }
+
+
+def build_cases(students: int, classes: int) -> Dict[str, Callable[[], Any]]:
+    """Build the benchmark callables for a campus of the given size"""
+    from utils.time_util import time_in_range, get_day_of_week
+
+    campus = generate_campus(students=students, classes=classes, weeks=4, seed=7)
+    local_service = new_local_service(campus)
+    attendance_service = new_attendance_service(local_service)
+
+    # The last student is the worst case for a scan over all students
+    student = list(campus['students'].values())[-1]
+    class_id, dates = next(iter(campus['attendance'].items()))
+    date, records = next(iter(dates.items()))
+    record_student_id = next(iter(records))
+
+    schedule = campus['classes'][student['enrolled_classes'][-1]]['schedules'][0]
+    check_time = schedule['start_time'][:3] + '15'
+    when = datetime(2024, 3, 4, 9, 15)
+    attendance_path = f"attendance/{class_id}/{date}/{record_student_id}"
+
+    return {
+        'time_in_range': lambda: time_in_range('09:00', '11:00', '10:15'),
+        'get_day_of_week': lambda: get_day_of_week(when),
+        'determine_current_class': lambda: attendance_service._determine_current_class(
+            student, date, check_time, schedule['day_of_week']),
+        'get_student_by_fingerprint': lambda: local_service.get_student_by_fingerprint(student['fingerprint_id']),
+        'get_student_attendance': lambda: local_service.get_student_attendance(record_student_id),
+        'reference_get': lambda: local_service.get_reference(attendance_path).get(),
+    }
+
+
+def run(sizes: List[tuple], repeat: int, min_time: float, only: List[str]) -> Dict[str, Any]:
+    results: Dict[str, Dict[str, Any]] = {}
+
+    for students, classes in sizes:
+        size_key = f"{students}x{classes}"
+        print(f"Campus of {students} students and {classes} classes")
+        for name, func in build_cases(students, classes).items():
+            if only and name not in only:
+                continue
+            stats = measure(func, repeat, min_time)
+            results.setdefault(name, {})[size_key] = stats
+            print(f"  {name:<30}{stats['median_us']:>12.3f} us  (min {stats['min_us']:.3f}, {stats['loops']} loops)")
+
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """List the cases whose median time grew by more than threshold compared to the baseline"""
+    regressions = []
+    for name, sizes in current['results'].items():
+        for size_key, stats in sizes.items():
+            previous = baseline.get('results', {}).get(name, {}).get(size_key)
+            if not previous or not previous['median_us']:
+                continue
+            change = stats['median_us'] / previous['median_us'] - 1
+            marker = 'REGRESSION' if change > threshold else ''
+            print(f"  {name:<30}{size_key:>12}{previous['median_us']:>12.3f}{stats['median_us']:>12.3f}{change:>+9.1%}  {marker}")
+            if change > threshold:
+                regressions.append(f"{name}[{size_key}]")
+    return regressions
+
+
+def parse_sizes(value: str) -> List[tuple]:
+    """Parse sizes given as 500x20,5000x200"""
+    sizes = []
+    for part in value.split(','):
+        students, classes = part.lower().split('x')
+        sizes.append((int(students), int(classes)))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the scan resolution hot path")
+    parser.add_argument('--sizes', type=parse_sizes, default=DEFAULT_SIZES,
+                        help="Campus sizes as STUDENTSxCLASSES, comma separated (default: 500x20,5000x200,20000x800)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help="Minimum seconds per repetition")
+    parser.add_argument('--only', nargs='*', default=[], help="Only run the named cases")
+    parser.add_argument('--output', default='microbench.json', help="File to save the results as JSON")
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Read the baseline first, it may be the file the results are saved to
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+
+    current = run(args.sizes, args.repeat, args.min_time, args.only)
+
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if baseline is not None:
+        print(f"\nComparison with {args.compare} (median us):")
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions above {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
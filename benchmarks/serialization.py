@@ -0,0 +1,151 @@
+"""
+Serialization benchmark for the large read endpoints
+
+Times how long FastAPI takes to turn a handler result into a response body for
+the payloads of GET /api/students/, GET /api/classes/ and the attendance
+report of the largest class, with the data of a synthetic campus:
+
+    dict_json     response_model=Dict[str, Any], validated and encoded as plain data (before)
+    typed         the typed models of schemas/*, validated and serialized by Pydantic
+    fast_json     utils.json_response, rendered with orjson without validation (the
+                  class and student routes)
+
+Each route is called directly over ASGI, so the numbers contain routing,
+response model validation and encoding but no network or data access. The
+size of the body and of its gzip compressed form are reported as well.
+
+Usage:
+    python -m benchmarks.serialization --students 20000 --classes 800
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import platform
+from datetime import datetime
+from typing import Dict, Any, Callable
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+
+from benchmarks.campus import generate_campus
+from benchmarks.microbench import measure, new_local_service, new_attendance_service
+from schemas.attendance_schema import AttendanceReport
+from schemas.class_schema import ClassList
+from schemas.student_schema import StudentList
+from utils.json_response import json_response
+
+TYPED_MODELS = {'students': StudentList, 'classes': ClassList, 'report': AttendanceReport}
+
+# Variant -> (response class, response models, whether the handler returns a json_response)
+VARIANTS = {
+    'dict_json': (JSONResponse, {'students': Dict[str, Any], 'classes': Dict[str, Any], 'report': Dict[str, Any]}, False),
+    'typed': (JSONResponse, TYPED_MODELS, False),
+    'fast_json': (JSONResponse, TYPED_MODELS, True),
+}
+
+
+def build_payloads(students: int, classes: int) -> Dict[str, Any]:
+    """Handler results of the measured endpoints"""
+    campus = generate_campus(students=students, classes=classes, weeks=1)
+    data_service = new_local_service(campus)
+    attendance_service = new_attendance_service(data_service)
+
+    largest = max(campus['classes'].values(), key=lambda c: len(c.get('enrolled_students', [])))
+    date = datetime.now().strftime('%Y-%m-%d')
+    return {
+        'students': {'students': data_service.get_all_students()},
+        'classes': {'classes': data_service.get_all_classes()},
+        'report': attendance_service.generate_attendance_report(largest['class_id'], date),
+    }
+
+
+def build_app(response_class, models: Dict[str, Any], payloads: Dict[str, Any], fast: bool = False) -> FastAPI:
+    """An app serving the payloads with the given response class and models"""
+    app = FastAPI(default_response_class=response_class)
+    for name, payload in payloads.items():
+        # Not a default argument, FastAPI would take it for a query parameter and deep copy it
+        app.add_api_route(f"/{name}", _endpoint(payload, fast), methods=['GET'], response_model=models[name])
+    return app
+
+
+def _endpoint(payload, fast: bool):
+    async def endpoint():
+        if fast:
+            return json_response(payload, Response())
+        return payload
+    return endpoint
+
+
+def asgi_caller(app: FastAPI, path: str) -> Callable[[], bytes]:
+    """A callable sending one GET request straight to the app, returning the body"""
+    loop = asyncio.new_event_loop()
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'path': path, 'raw_path': path.encode(),
+             'query_string': b'', 'headers': [], 'scheme': 'http', 'server': ('bench', 80), 'client': ('bench', 1),
+             'root_path': ''}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def call():
+        chunks = []
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await app(scope, receive, send)
+        return b''.join(chunks)
+
+    return lambda: loop.run_until_complete(call())
+
+
+def run(students: int, classes: int, repeat: int, min_time: float) -> Dict[str, Any]:
+    print(f"Generating campus with {students} students and {classes} classes...")
+    payloads = build_payloads(students, classes)
+
+    results = {}
+    for variant, (response_class, models, fast) in VARIANTS.items():
+        app = build_app(response_class, models, payloads, fast)
+        for name in payloads:
+            call = asgi_caller(app, f"/{name}")
+            body = call()
+            stats = measure(call, repeat, min_time)
+            stats.update(bytes=len(body), gzip_bytes=len(gzip.compress(body)))
+            results.setdefault(name, {})[variant] = stats
+            print(f"{name:<10}{variant:<14}{stats['median_us'] / 1000:>10.2f} ms{stats['bytes']:>12} B{stats['gzip_bytes']:>10} B gzip")
+
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'students': students,
+        'classes': classes,
+        'endpoints': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure response serialization cost of the large read endpoints")
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--classes', type=int, default=800)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds per repetition")
+    parser.add_argument('--output', default='serialization.json', help="File to save the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.students, args.classes, args.repeat, args.min_time)
+
+    print("\nSpeedup over dict_json (median):")
+    for name, variants in results['endpoints'].items():
+        before = variants['dict_json']['median_us']
+        print(f"{name:<10}typed {before / variants['typed']['median_us']:>6.2f}x"
+              f"   fast_json {before / variants['fast_json']['median_us']:>6.2f}x")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Cold start benchmark for the Fingerprint Attendance System API
+
+Starts fresh interpreters and measures the phases a new worker goes through
+before it serves traffic:
+
+    import     importing main (routes, middleware and their imports)
+    startup    running the lifespan hook that creates the shared services
+    first      the first request, GET /api/students/
+
+Each phase is reported as the median over several runs. With --importtime the
+modules contributing most to the import phase are listed, taken from
+python -X importtime.
+
+Usage:
+    python -m benchmarks.startup --runs 10
+    python -m benchmarks.startup --backends local --importtime 15
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, Any, List
+
+# Runs in the child interpreter, prints the phase timings as JSON
+CHILD = '''
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def serve():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        started = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://startup') as client:
+            response = await client.get('/api/students/')
+            response.raise_for_status()
+        return started, time.perf_counter()
+
+started, first = asyncio.run(serve())
+print(json.dumps({'import': imported - start, 'startup': started - imported, 'first': first - started}))
+'''
+
+PHASES = ['import', 'startup', 'first']
+
+
+def child_env(backends: str) -> Dict[str, str]:
+    """Environment of the child interpreters"""
+    env = dict(os.environ)
+    env['DATA_BACKENDS'] = backends
+    env.setdefault('FIREBASE_SIMULATION', 'true')
+    env.setdefault('FINGERPRINT_SIMULATION', 'true')
+    return env
+
+
+def measure(backends: str) -> Dict[str, float]:
+    """Time the phases of one cold start"""
+    output = subprocess.run([sys.executable, '-c', CHILD], env=child_env(backends),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(backends: str, count: int) -> List[Dict[str, Any]]:
+    """The modules with the highest own import time when importing main"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], env=child_env(backends),
+                            capture_output=True, text=True, check=True).stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self_ms': int(own) / 1000.0, 'cumulative_ms': int(cumulative) / 1000.0})
+
+    modules.sort(key=lambda module: module['self_ms'], reverse=True)
+    return modules[:count]
+
+
+def run(backends: str, runs: int) -> Dict[str, Any]:
+    samples = {phase: [] for phase in PHASES}
+    for i in range(runs):
+        timings = measure(backends)
+        for phase in PHASES:
+            samples[phase].append(timings[phase] * 1000.0)
+        print(f"run {i + 1}/{runs}: " + ', '.join(f"{phase} {timings[phase] * 1000.0:.1f} ms" for phase in PHASES))
+
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'backends': backends,
+        'runs': runs,
+        'median_ms': {phase: round(statistics.median(values), 2) for phase, values in samples.items()},
+        'max_ms': {phase: round(max(values), 2) for phase, values in samples.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time, service startup and first request latency")
+    parser.add_argument('--runs', type=int, default=5, help="Number of cold starts to measure")
+    parser.add_argument('--backends', default='local', help="DATA_BACKENDS of the measured workers")
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help="Also list the N modules with the highest own import time")
+    parser.add_argument('--output', default='startup.json', help="File to save the results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.backends, args.runs)
+    print(f"\n{'phase':<10}{'median':>10}{'max':>10}")
+    for phase in PHASES:
+        print(f"{phase:<10}{results['median_ms'][phase]:>10}{results['max_ms'][phase]:>10}")
+    print(f"Ready after {sum(results['median_ms'].values()):.1f} ms (median, latencies in ms)")
+
+    if args.importtime:
+        results['slowest_imports'] = slowest_imports(args.backends, args.importtime)
+        print(f"\n{'module':<48}{'self':>10}{'cumulative':>12}")
+        for module in results['slowest_imports']:
+            print(f"{module['module']:<48}{module['self_ms']:>10.1f}{module['cumulative_ms']:>12.1f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
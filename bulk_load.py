@@ -0,0 +1,64 @@
+"""
+Bulk loader CLI for Fingerprint Attendance System
+
+Loads classes, students, enrollments and attendance from CSV or JSON files into
+Cloud Firestore, the SQLite data service or the local data service using batched
+commits across a pool of workers. An interrupted load is resumed from its
+checkpoint file.
+
+Usage:
+    python bulk_load.py data/ --target firestore --workers 8
+    python bulk_load.py data/ --target sqlite
+    python bulk_load.py data/ --target local --checkpoint .bulk_load.json
+"""
+
+import argparse
+import os
+
+import dotenv
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load attendance system data")
+    parser.add_argument('input_dir', help="Directory containing classes, students, enrollments and attendance files")
+    parser.add_argument('--target', choices=['firestore', 'sqlite', 'local'], default='firestore',
+                        help="Where to write the data (default: firestore)")
+    parser.add_argument('--workers', type=int, default=8, help="Number of concurrent batch commits")
+    parser.add_argument('--batch-size', type=int, default=500, help="Writes per batch (at most 500)")
+    parser.add_argument('--checkpoint', default='.bulk_load_checkpoint.json',
+                        help="Checkpoint file used to resume an interrupted load")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"Input directory {args.input_dir} does not exist")
+
+    from services.bulk_loader import BulkLoader, FirestoreTarget, LocalTarget, SQLiteTarget
+
+    if args.target == 'sqlite':
+        from services.sqlite_data_service import SQLiteDataService
+        target = SQLiteTarget(SQLiteDataService())
+    elif args.target == 'local':
+        from services.local_data_service import LocalDataService
+        target = LocalTarget(LocalDataService())
+    else:
+        from services.firebase_service import FirebaseService
+        target = FirestoreTarget(FirebaseService().db)
+
+    loader = BulkLoader(target, batch_size=args.batch_size, workers=args.workers,
+                        checkpoint_path=args.checkpoint)
+    stats = loader.load_directory(args.input_dir)
+
+    print(f"\nLoaded {stats['documents']} documents in {stats['elapsed']}s "
+          f"({stats['documents_per_second']} documents/s)")
+    for phase, phase_stats in stats['phases'].items():
+        print(f"  {phase:<12}{phase_stats['documents']:>10} documents{phase_stats['documents_per_second']:>12} documents/s")
+    for entity, count in stats['rejected'].items():
+        if count:
+            print(f"  {entity:<12}{count:>10} rows rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Attendance export job for Fingerprint Attendance System
+
+This script exports the attendance history into date-partitioned Parquet files
+for offline analytics. Runs are incremental: only days that were not exported
+before, and days of the last --revisit-days days whose records changed, are
+written.
+
+Usage:
+    python export_attendance.py --output exports/attendance
+    python export_attendance.py --source local --output exports/attendance --include-today
+"""
+
+import argparse
+import os
+import time
+
+import dotenv
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export attendance history to Parquet")
+    parser.add_argument('--source', choices=['firebase', 'local'], default='firebase',
+                        help="Data source to export from (default: firebase)")
+    parser.add_argument('--output', default=os.environ.get('ATTENDANCE_EXPORT_DIR', 'exports/attendance'),
+                        help="Output directory for the partitioned dataset")
+    parser.add_argument('--include-today', action='store_true',
+                        help="Also export the current day, it is rewritten on the next run")
+    parser.add_argument('--full', action='store_true',
+                        help="Ignore the manifest and export the whole history again")
+    parser.add_argument('--revisit-days', type=int,
+                        default=int(os.environ.get('ATTENDANCE_EXPORT_REVISIT_DAYS', '7')),
+                        help="Days before today checked again for late or corrected records (default: 7)")
+    args = parser.parse_args()
+
+    if args.source == 'local':
+        from services.local_data_service import LocalDataService
+        data_service = LocalDataService()
+    else:
+        from services.firebase_service import FirebaseService
+        data_service = FirebaseService()
+
+    from services.export_service import AttendanceExportService
+    export_service = AttendanceExportService(data_service, args.output, revisit_days=args.revisit_days)
+
+    start = time.time()
+    summary = export_service.export(include_today=args.include_today, full=args.full)
+    elapsed = time.time() - start
+
+    if summary['dates']:
+        print(f"\nExported {summary['records']} records across {len(summary['dates'])} days "
+              f"in {elapsed:.2f}s ({summary['dates'][0]} to {summary['dates'][-1]})")
+    else:
+        print("\nNo new or changed attendance days to export")
+
+
+if __name__ == "__main__":
+    main()
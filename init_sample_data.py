@@ -2,12 +2,11 @@
 Sample data initializer for Fingerprint Attendance System
 
 This script creates sample classes and students in the Firebase Cloud Firestore database.
+For larger data sets use bulk_load.py, which reads the data from CSV or JSON files.
 """
 
 import firebase_admin
 from firebase_admin import credentials, firestore
-import uuid
-import json
 import os
 from datetime import datetime, timedelta
 
@@ -121,175 +120,40 @@ SAMPLE_STUDENTS = [
 ]
 
 def create_sample_data():
-    """Create sample classes and students in Firestore"""
-    class_refs = {}
-    student_refs = {}
-    
-    # Create classes
-    classes_collection = db.collection('classes')
-    print("Creating sample classes...")
-    
-    for class_data in SAMPLE_CLASSES:
-        class_id = str(uuid.uuid4())
-        class_data['class_id'] = class_id
-        class_data['enrolled_students'] = []
-        
-        # Add document to Firestore
-        classes_collection.document(class_id).set(class_data)
-        class_refs[class_data['class_name']] = class_id
-        print(f"Created class: {class_data['class_name']} with ID: {class_id}")
-    
-    # Create students
-    students_collection = db.collection('students')
-    print("\nCreating sample students...")
-    
-    for student_data in SAMPLE_STUDENTS:
-        student_id = str(uuid.uuid4())
-        student_data['student_id'] = student_id
-        student_data['enrolled_classes'] = []
-        
-        # Add document to Firestore
-        students_collection.document(student_id).set(student_data)
-        student_refs[student_data['name']] = student_id
-        print(f"Created student: {student_data['name']} with ID: {student_id}")
-    
-    # Enroll students in classes
-    print("\nEnrolling students in classes...")
-    
-    # Enroll all students in Mathematics 101
-    math_class_id = class_refs.get("Mathematics 101")
-    for student_name, student_id in student_refs.items():
-        # Update student's enrolled classes
-        student_doc = students_collection.document(student_id).get()
-        student_data = student_doc.to_dict()
-        enrolled_classes = student_data.get('enrolled_classes', [])
-        enrolled_classes.append(math_class_id)
-        students_collection.document(student_id).update({
-            'enrolled_classes': enrolled_classes
-        })
-        
-        # Update class's enrolled students
-        class_doc = classes_collection.document(math_class_id).get()
-        class_data = class_doc.to_dict()
-        enrolled_students = class_data.get('enrolled_students', [])
-        enrolled_students.append(student_id)
-        classes_collection.document(math_class_id).update({
-            'enrolled_students': enrolled_students
-        })
-        
-        print(f"Enrolled {student_name} in Mathematics 101")
-    
-    # Enroll some students in Computer Science 202
-    cs_class_id = class_refs.get("Computer Science 202")
+    """Create sample classes, students, enrollments and attendance in Firestore"""
+    from services.bulk_loader import BulkLoader, FirestoreTarget
+
+    # Enroll all students in Mathematics 101 and some in the other classes
+    enrollments = [{"fingerprint_id": s["fingerprint_id"], "class_name": "Mathematics 101"} for s in SAMPLE_STUDENTS]
     cs_students = ["John Doe", "Jane Smith", "Robert Johnson"]
-    for student_name in cs_students:
-        student_id = student_refs.get(student_name)
-        if not student_id:
-            continue
-            
-        # Update student's enrolled classes
-        student_doc = students_collection.document(student_id).get()
-        student_data = student_doc.to_dict()
-        enrolled_classes = student_data.get('enrolled_classes', [])
-        enrolled_classes.append(cs_class_id)
-        students_collection.document(student_id).update({
-            'enrolled_classes': enrolled_classes
-        })
-        
-        # Update class's enrolled students
-        class_doc = classes_collection.document(cs_class_id).get()
-        class_data = class_doc.to_dict()
-        enrolled_students = class_data.get('enrolled_students', [])
-        enrolled_students.append(student_id)
-        classes_collection.document(cs_class_id).update({
-            'enrolled_students': enrolled_students
-        })
-        
-        print(f"Enrolled {student_name} in Computer Science 202")
-    
-    # Enroll some students in Physics 120
-    physics_class_id = class_refs.get("Physics 120")
     physics_students = ["Jane Smith", "Emily Davis", "Michael Wilson"]
-    for student_name in physics_students:
-        student_id = student_refs.get(student_name)
-        if not student_id:
-            continue
-            
-        # Update student's enrolled classes
-        student_doc = students_collection.document(student_id).get()
-        student_data = student_doc.to_dict()
-        enrolled_classes = student_data.get('enrolled_classes', [])
-        enrolled_classes.append(physics_class_id)
-        students_collection.document(student_id).update({
-            'enrolled_classes': enrolled_classes
-        })
-        
-        # Update class's enrolled students
-        class_doc = classes_collection.document(physics_class_id).get()
-        class_data = class_doc.to_dict()
-        enrolled_students = class_data.get('enrolled_students', [])
-        enrolled_students.append(student_id)
-        classes_collection.document(physics_class_id).update({
-            'enrolled_students': enrolled_students
-        })
-        
-        print(f"Enrolled {student_name} in Physics 120")
-    
-    # Create some sample attendance records
-    print("\nCreating sample attendance records...")
-    
-    # Get today's date and yesterday's date
+    fingerprints = {s["name"]: s["fingerprint_id"] for s in SAMPLE_STUDENTS}
+    enrollments += [{"fingerprint_id": fingerprints[name], "class_name": "Computer Science 202"} for name in cs_students]
+    enrollments += [{"fingerprint_id": fingerprints[name], "class_name": "Physics 120"} for name in physics_students]
+
+    # Attendance for Mathematics 101 yesterday and Computer Science 202 today
     today = datetime.now().strftime("%Y-%m-%d")
     yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-    
-    # Record attendance for Mathematics 101 yesterday
-    attendance_collection = db.collection('attendance')
-    math_students = student_refs.items()  # All students are in Math class
-    
-    for student_name, student_id in math_students:
-        # Create a timestamp for the attendance record
-        timestamp = f"{yesterday} 09:15:00"
-        
-        # Record attendance
-        attendance_id = str(uuid.uuid4())
-        attendance_data = {
-            "attendance_id": attendance_id,
-            "student_id": student_id,
-            "class_id": math_class_id,
-            "timestamp": timestamp,
-            "status": "present"
-        }
-        
-        # Create a document ID combining class, date and student
-        document_id = f"{math_class_id}_{yesterday}_{student_id}"
-        attendance_collection.document(document_id).set(attendance_data)
-        print(f"Recorded attendance for {student_name} in Mathematics 101 on {yesterday}")
-    
-    # Record attendance for Computer Science 202 today
-    for student_name in cs_students:
-        student_id = student_refs.get(student_name)
-        if not student_id:
-            continue
-            
-        # Create a timestamp for the attendance record
-        timestamp = f"{today} 13:10:00"
-        
-        # Record attendance
-        attendance_id = str(uuid.uuid4())
-        attendance_data = {
-            "attendance_id": attendance_id,
-            "student_id": student_id,
-            "class_id": cs_class_id,
-            "timestamp": timestamp,
-            "status": "present"
-        }
-        
-        # Create a document ID combining class, date and student
-        document_id = f"{cs_class_id}_{today}_{student_id}"
-        attendance_collection.document(document_id).set(attendance_data)
-        print(f"Recorded attendance for {student_name} in Computer Science 202 on {today}")
-    
-    print("\nSample data created successfully!")
+    attendance = [
+        {"fingerprint_id": s["fingerprint_id"], "class_name": "Mathematics 101", "timestamp": f"{yesterday} 09:15:00"}
+        for s in SAMPLE_STUDENTS
+    ]
+    attendance += [
+        {"fingerprint_id": fingerprints[name], "class_name": "Computer Science 202", "timestamp": f"{today} 13:10:00"}
+        for name in cs_students
+    ]
+
+    # Enrollments are folded into the class and student documents, so every
+    # document is written once in a few batched commits
+    loader = BulkLoader(FirestoreTarget(db))
+    stats = loader.load({
+        "classes": SAMPLE_CLASSES,
+        "students": SAMPLE_STUDENTS,
+        "enrollments": enrollments,
+        "attendance": attendance
+    })
+
+    print(f"\nSample data created successfully! ({stats['documents']} documents in {stats['elapsed']}s)")
 
 if __name__ == "__main__":
     create_sample_data()
\ No newline at end of file
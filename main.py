@@ -1,15 +1,16 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 import os
-import uvicorn
 import time
 import json
 from datetime import datetime
 import threading
 import dotenv
 from pathlib import Path
+from contextlib import asynccontextmanager
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -19,13 +20,51 @@ print(f"Firebase Project ID: {os.environ.get('FIREBASE_PROJECT_ID', 'Not set')}"
 print(f"Firebase Simulation Mode: {os.environ.get('FIREBASE_SIMULATION', 'false')}")
 
 # Import routes
-from routes import class_routes, student_routes, attendance_routes, fingerprint_routes
+from routes import class_routes, student_routes, attendance_routes, fingerprint_routes, device_routes
+from middleware.metrics_middleware import MetricsMiddleware
+from middleware.tracing_middleware import TracingMiddleware
+from utils.metrics import render_metrics, CONTENT_TYPE_LATEST
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared services once per worker, routes receive them as dependencies"""
+    from services.data_service import get_data_service
+    from services.attendance_service import AttendanceService
+    from utils.fingerprint_util import FingerprintUtil
+    from services.session_scheduler import create_session_scheduler
+    
+    start = time.perf_counter()
+    app.state.data_service = get_data_service()
+    app.state.attendance_service = AttendanceService(app.state.data_service)
+    app.state.fingerprint_util = FingerprintUtil()
+    print(f"Services ready in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    # Warm the caches before every session and close its roll when it ends
+    scheduler = create_session_scheduler(app.state.attendance_service)
+    if scheduler:
+        scheduler.start()
+    
+    # The scanner simulation of `python main.py` shares the services of the app
+    scanner_stop = threading.Event()
+    if getattr(app.state, 'scanner_simulation', False):
+        threading.Thread(
+            target=fingerprint_scanner_simulation,
+            args=(app.state.attendance_service, app.state.fingerprint_util, scanner_stop),
+            daemon=True
+        ).start()
+    
+    yield
+    
+    scanner_stop.set()
+    if scheduler:
+        await scheduler.stop()
 
 # Create FastAPI application
 app = FastAPI(
     title="Fingerprint Attendance System API",
     description="API for managing classes, students, and attendance records for an IoT-based fingerprint attendance system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -37,11 +76,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses such as the student and class lists, the event stream is left alone
+app.add_middleware(GZipMiddleware, minimum_size=int(os.environ.get('GZIP_MINIMUM_SIZE', '1000')))
+
+# Request latency and in-flight metrics
+app.add_middleware(MetricsMiddleware)
+
+# Firestore read/write accounting and request spans
+app.add_middleware(TracingMiddleware)
+
 # Include all routes
 app.include_router(class_routes.router)
 app.include_router(student_routes.router)
 app.include_router(attendance_routes.router)
 app.include_router(fingerprint_routes.router)
+app.include_router(device_routes.router)
 
 # Serve static files
 # Create web_interface directories for CSS and JS if they don't exist
@@ -84,6 +133,11 @@ async def health_check():
         "version": app.version
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -100,24 +154,16 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 # Background thread for simulating fingerprint scanning
-def fingerprint_scanner_simulation():
+def fingerprint_scanner_simulation(attendance_service, fingerprint_util, stop: threading.Event):
     """
     This function simulates a fingerprint scanner detecting fingerprints.
     In a real implementation, this would be replaced with actual fingerprint 
-    sensor hardware integration.
+    sensor hardware integration. It runs until stop is set.
     """
-    from utils.fingerprint_util import FingerprintUtil
-    from services.attendance_service import AttendanceService
-    
-    attendance_service = AttendanceService()
-    fingerprint_util = FingerprintUtil()
-    
     print("Starting fingerprint scanner simulation...")
     
-    while True:
-        # Simulate fingerprint scan every 5 seconds
-        time.sleep(5)
-        
+    # Simulate fingerprint scan every 5 seconds
+    while not stop.wait(5):
         # Try to verify a fingerprint
         success, fingerprint_id = fingerprint_util.verify_fingerprint()
         
@@ -138,9 +184,10 @@ def fingerprint_scanner_simulation():
 
 # Entry point for running the application
 if __name__ == "__main__":
-    # Start fingerprint scanner simulation in a separate thread
-    scanner_thread = threading.Thread(target=fingerprint_scanner_simulation, daemon=True)
-    scanner_thread.start()
+    import uvicorn
+    
+    # Start fingerprint scanner simulation in a separate thread once the services are created
+    app.state.scanner_simulation = True
     
     # Run the FastAPI application
     port = int(os.environ.get("PORT", 5000))
@@ -2,12 +2,11 @@
 Authentication middleware for the Fingerprint Attendance System API
 
 This module provides FastAPI middleware and dependencies for protecting
-API routes with Firebase Authentication.
+API routes with Firebase Authentication. The Firebase Admin SDK is only
+imported and initialized when the first token has to be verified.
 """
 
 import os
-import firebase_admin
-from firebase_admin import auth, credentials
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import logging
@@ -16,44 +15,6 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK if not already initialized
-if not firebase_admin._apps:
-    try:
-        # Get configuration from environment variables
-        cred_path = os.environ.get('FIREBASE_CREDENTIALS_PATH', 'firebase_config/credentials.json')
-        project_id = os.environ.get('FIREBASE_PROJECT_ID', 'fingerprint-attendance-system')
-        simulation_mode = os.environ.get('FIREBASE_SIMULATION', 'false').lower() == 'true'
-        
-        logger.info(f"Initializing Firebase with Project ID: {project_id}, Simulation mode: {simulation_mode}")
-        
-        if simulation_mode:
-            # Initialize without credentials in simulation mode
-            firebase_admin.initialize_app(options={
-                'projectId': project_id
-            })
-            logger.info(f"Firebase Admin SDK initialized in simulation mode with project ID: {project_id}")
-        elif os.path.exists(cred_path):
-            # Initialize with credentials file
-            cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred, {
-                'projectId': project_id
-            })
-            logger.info(f"Firebase Admin SDK initialized with credentials from {cred_path}")
-        else:
-            # Initialize without credentials for demo/development purposes
-            firebase_admin.initialize_app(options={
-                'projectId': project_id
-            })
-            logger.info(f"Firebase Admin SDK initialized with default project ID: {project_id}")
-    except Exception as e:
-        logger.error(f"Error initializing Firebase Admin SDK: {str(e)}")
-        # Don't fail completely, just log the error
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(options={
-                'projectId': 'fingerprint-attendance-system'
-            })
-            logger.warning("Firebase Admin SDK initialized with fallback configuration")
-
 # HTTP Bearer token setup for FastAPI
 security = HTTPBearer()
 
@@ -79,6 +40,10 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         logger.info("Simulation mode: Authentication bypassed")
         return {"email": "simulation@example.com", "uid": "simulation-user"}
     
+    from firebase_admin import auth
+    from services.firebase_app import initialize_firebase
+    initialize_firebase()
+    
     token = credentials.credentials
     try:
         # Verify the ID token
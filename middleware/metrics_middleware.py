@@ -0,0 +1,73 @@
+"""
+Metrics middleware for the Fingerprint Attendance System API
+
+This module provides a pure ASGI middleware that records request latency per
+route template and status code, and tracks the number of in-flight requests.
+"""
+
+import time
+
+from starlette.routing import Match
+
+from utils.metrics import histogram, gauge
+
+REQUEST_DURATION = histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by method, route template and status code',
+    ['method', 'route', 'status']
+)
+
+REQUESTS_IN_PROGRESS = gauge(
+    'http_requests_in_progress',
+    'Number of HTTP requests currently being processed',
+    ['method']
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency histograms"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status_code = 500
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            REQUEST_DURATION.labels(method, self._route_template(scope), status_code).observe(elapsed)
+
+    def _route_template(self, scope) -> str:
+        """
+        Get the route template (e.g. /api/students/{student_id}) for the request
+        Raw paths are never used as labels to keep the number of series bounded
+        """
+        route = scope.get('route')
+        if route is not None and hasattr(route, 'path'):
+            return route.path
+
+        # Older Starlette versions don't expose the matched route in the scope
+        app = scope.get('app')
+        for candidate in getattr(app, 'routes', []):
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                return candidate.path
+
+        return 'unmatched'
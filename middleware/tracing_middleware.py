@@ -0,0 +1,67 @@
+"""
+Tracing middleware for the Fingerprint Attendance System API
+
+This module provides a pure ASGI middleware that opens a root span per request
+and accounts the Firestore reads, writes, round trips and time spent by the
+request. In debug mode (DEBUG=true) the totals are returned as response headers:
+
+    X-Firestore-Reads, X-Firestore-Writes, X-Firestore-Round-Trips, X-Firestore-Time-Ms
+"""
+
+import os
+
+from utils.metrics import histogram
+from utils.tracing import start_usage, end_usage, current_usage, start_span
+
+FIRESTORE_READS_PER_REQUEST = histogram(
+    'http_request_firestore_reads',
+    'Firestore documents read per HTTP request by route template',
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+
+
+def is_debug_mode():
+    """Check if the application is running in debug mode"""
+    return os.environ.get('DEBUG', 'false').lower() == 'true'
+
+
+class TracingMiddleware:
+    """ASGI middleware accounting Firestore usage per request"""
+
+    def __init__(self, app):
+        self.app = app
+        self.debug_headers = is_debug_mode()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        token = start_usage()
+        usage = current_usage()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and self.debug_headers:
+                headers = list(message.get('headers', []))
+                headers.extend([
+                    (b'x-firestore-reads', str(usage.reads).encode()),
+                    (b'x-firestore-writes', str(usage.writes).encode()),
+                    (b'x-firestore-round-trips', str(usage.round_trips).encode()),
+                    (b'x-firestore-time-ms', f"{usage.elapsed * 1000:.1f}".encode()),
+                ])
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            attributes = {'http.method': scope['method'], 'http.target': scope['path']}
+            with start_span(f"{scope['method']} {scope['path']}", attributes) as span:
+                await self.app(scope, receive, send_wrapper)
+
+                # Name the span after the route template once routing is done
+                route_path = getattr(scope.get('route'), 'path', 'unmatched')
+                span.name = f"{scope['method']} {route_path}"
+                span.set_attribute('http.route', route_path)
+                FIRESTORE_READS_PER_REQUEST.labels(route_path).observe(usage.reads)
+        finally:
+            end_usage(token)
@@ -0,0 +1,45 @@
+"""
+Attendance migration CLI for Fingerprint Attendance System
+
+Moves the Firestore attendance collection (one document per check-in) into
+one roll document per class and date. Run the application with
+ATTENDANCE_MODEL=dual first, so new check-ins go to rolls while the old ones
+are still read, migrate, then switch to ATTENDANCE_MODEL=rolls.
+
+Usage:
+    python migrate_attendance.py --dry-run
+    python migrate_attendance.py --start-date 2024-01-01
+    python migrate_attendance.py --delete
+"""
+
+import argparse
+
+import dotenv
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate Firestore attendance records to session rolls")
+    parser.add_argument('--start-date', help="Only migrate records on or after this date (YYYY-MM-DD)")
+    parser.add_argument('--batch-size', type=int, default=500, help="Writes per batch (at most 500)")
+    parser.add_argument('--delete', action='store_true',
+                        help="Delete the migrated documents from the attendance collection")
+    parser.add_argument('--dry-run', action='store_true', help="Count what would be migrated without writing")
+    args = parser.parse_args()
+
+    from services.firebase_service import FirebaseService
+    from services.roll_migration import RollMigration
+
+    migration = RollMigration(FirebaseService().db, batch_size=args.batch_size,
+                              delete=args.delete, dry_run=args.dry_run)
+    stats = migration.run(args.start_date)
+
+    prefix = "Would migrate" if args.dry_run else "Migrated"
+    print(f"\n{prefix} {stats['migrated']} of {stats['records']} records into {stats['rolls']} rolls "
+          f"in {stats['elapsed']}s ({stats['skipped']} already in a roll, {stats['deleted']} deleted)")
+
+
+if __name__ == "__main__":
+    main()
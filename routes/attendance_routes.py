@@ -1,20 +1,36 @@
-from fastapi import APIRouter, HTTPException, Path, Body, Query
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Path, Body, Query, Depends, Request
+from fastapi.responses import StreamingResponse, Response
+from typing import Dict, Any, List, Optional
+import asyncio
+import json
+import os
 
-from schemas.attendance_schema import Attendance, AttendanceCreate
+from starlette.concurrency import run_in_threadpool
+
+from schemas.attendance_schema import Attendance, AttendanceCreate, AttendanceReport
+from schemas.student_schema import StudentAttendanceSummary
+from services.data_service import DataService
 from services.attendance_service import AttendanceService
+from services.event_bus import get_event_bus, publish_attendance
+from services.providers import provide_data_service, provide_attendance_service
+from utils import codec
+from utils.time_util import get_current_time
 
 # Create router
 router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 
-# Initialize services
-attendance_service = AttendanceService()
+# Seconds between keep-alive comments on idle event streams
+STREAM_HEARTBEAT_INTERVAL = 15.0
+
+# Seconds clients may keep a report of a past date without asking again
+REPORT_MAX_AGE = int(os.environ.get('REPORT_MAX_AGE', '86400'))
 
 @router.get("/record/{fingerprint_id}", response_model=Dict[str, Any])
-async def record_attendance(fingerprint_id: int, timestamp: Optional[str] = None):
+async def record_attendance(fingerprint_id: int, timestamp: Optional[str] = None, attendance_service: AttendanceService = Depends(provide_attendance_service)):
     """Record attendance for a student based on fingerprint ID"""
     try:
-        result = attendance_service.record_attendance(fingerprint_id, timestamp)
+        # Off the event loop, so concurrent scans can share a group commit
+        result = await run_in_threadpool(attendance_service.record_attendance, fingerprint_id, timestamp)
         
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
@@ -25,8 +41,52 @@ async def record_attendance(fingerprint_id: int, timestamp: Optional[str] = None
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error recording attendance: {str(e)}")
 
+@router.post("/scan")
+async def submit_scan(request: Request, attendance_service: AttendanceService = Depends(provide_attendance_service)):
+    """
+    Record attendance for one scan or a list of buffered scans from a reader
+    The body and response are JSON, MessagePack or CBOR, see utils/codec.py
+    """
+    try:
+        media_type = codec.request_encoding(request.headers.get("content-type"))
+    except codec.UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    try:
+        body = codec.decode(media_type, await request.body())
+        scans = [codec.parse_scan(message) for message in (body if isinstance(body, list) else [body])]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    results: List[Dict[str, Any]] = [{} for _ in scans]
+    
+    async def record(indexes: List[int]):
+        for index in indexes:
+            scan = scans[index]
+            try:
+                results[index] = await run_in_threadpool(attendance_service.record_attendance, scan["fingerprint_id"], scan["timestamp"])
+            except Exception as e:
+                results[index] = {"error": f"Error recording attendance: {str(e)}"}
+    
+    # Scans of different students are recorded concurrently so they share group
+    # commits, the scans of one student stay in order
+    by_fingerprint: Dict[int, List[int]] = {}
+    for index, scan in enumerate(scans):
+        by_fingerprint.setdefault(scan["fingerprint_id"], []).append(index)
+    await asyncio.gather(*(record(indexes) for indexes in by_fingerprint.values()))
+    acks = [codec.compact_ack(result, scan["sequence"]) for scan, result in zip(scans, results)]
+    
+    # A single rejected scan answers like GET /record, a list always succeeds per scan
+    status_code = 400 if not isinstance(body, list) and not acks[0]["ok"] else 200
+    response_type = codec.response_encoding(request.headers.get("accept"), media_type)
+    return Response(
+        content=codec.encode(response_type, acks if isinstance(body, list) else acks[0]),
+        status_code=status_code,
+        media_type=response_type
+    )
+
 @router.post("/manual", response_model=Dict[str, Any])
-async def manual_attendance(attendance_data: AttendanceCreate):
+async def manual_attendance(attendance_data: AttendanceCreate, data_service: DataService = Depends(provide_data_service)):
     """Manually record attendance"""
     try:
         # Convert attendance data to dict
@@ -38,14 +98,11 @@ async def manual_attendance(attendance_data: AttendanceCreate):
         timestamp = attendance_dict.get("timestamp")
         
         # Validate that student and class exist
-        from services.firebase_service import FirebaseService
-        firebase_service = FirebaseService()
-        
-        student = firebase_service.get_student(student_id)
+        student = await run_in_threadpool(data_service.get_student, student_id)
         if not student:
             raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
         
-        class_info = firebase_service.get_class(class_id)
+        class_info = await run_in_threadpool(data_service.get_class, class_id)
         if not class_info:
             raise HTTPException(status_code=404, detail=f"Class with ID {class_id} not found")
         
@@ -64,8 +121,12 @@ async def manual_attendance(attendance_data: AttendanceCreate):
             "status": "present"
         }
         
-        # Save attendance record
-        attendance_id = firebase_service.create_attendance(attendance_data)
+        # Save attendance record, off the event loop while it waits for its group commit
+        attendance_id = await run_in_threadpool(data_service.create_attendance, attendance_data)
+        attendance_data["attendance_id"] = attendance_id
+        
+        # Notify live dashboards
+        publish_attendance(attendance_data, student["name"], class_info["class_name"], source="manual")
         
         return {
             "attendance_id": attendance_id,
@@ -79,27 +140,37 @@ async def manual_attendance(attendance_data: AttendanceCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error recording attendance: {str(e)}")
 
-@router.get("/report/{class_id}", response_model=Dict[str, Any])
+@router.get("/report/{class_id}", response_model=AttendanceReport)
 async def get_attendance_report(
+    response: Response,
     class_id: str = Path(..., description="The ID of the class"),
-    date: str = Query(..., description="Date in YYYY-MM-DD format")
+    date: str = Query(..., description="Date in YYYY-MM-DD format"),
+    attendance_service: AttendanceService = Depends(provide_attendance_service)
 ):
-    """Get attendance report for a class on a specific date"""
+    """
+    Get attendance report for a class on a specific date
+    Reports of past dates may be kept by clients for REPORT_MAX_AGE seconds
+    """
     try:
         result = attendance_service.generate_attendance_report(class_id, date)
         
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         
+        if date < get_current_time().strftime('%Y-%m-%d'):
+            response.headers["Cache-Control"] = f"private, max-age={REPORT_MAX_AGE}"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
         return result
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating attendance report: {str(e)}")
 
-@router.get("/student/{student_id}", response_model=Dict[str, Any])
+@router.get("/student/{student_id}", response_model=StudentAttendanceSummary)
 async def get_student_attendance(
-    student_id: str = Path(..., description="The ID of the student")
+    student_id: str = Path(..., description="The ID of the student"),
+    attendance_service: AttendanceService = Depends(provide_attendance_service)
 ):
     """Get attendance summary for a student"""
     try:
@@ -112,4 +183,36 @@ async def get_student_attendance(
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving student attendance: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error retrieving student attendance: {str(e)}")
+
+@router.get("/stream")
+async def attendance_stream(
+    request: Request,
+    class_id: Optional[str] = Query(None, description="Only stream check-ins of this class")
+):
+    """Stream check-ins as Server-Sent Events"""
+    last_event_id = request.headers.get("last-event-id")
+    subscription = get_event_bus().subscribe(
+        class_id=class_id,
+        last_event_id=int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    )
+    
+    async def events():
+        try:
+            # Ask browsers to reconnect after 3 seconds if the stream breaks
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=STREAM_HEARTBEAT_INTERVAL)
+                if event is None:
+                    # Keep proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,46 +1,73 @@
-from fastapi import APIRouter, HTTPException, Path, Body, Depends
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Path, Body, Query, Depends, Request, Response
+from typing import Dict, Any, Optional
 
-from schemas.class_schema import Class, ClassCreate
-from services.firebase_service import FirebaseService
+from schemas.class_schema import Class, ClassCreate, ClassList
 from middleware.auth_middleware import verify_token
+from services.data_service import DataService
+from services.change_log import get_change_log
+from services.providers import provide_data_service
+from utils.conditional import not_modified
+from utils.json_response import json_response
+from utils.projection import parse_fields
 
 # Create router
 router = APIRouter(prefix="/api/classes", tags=["classes"])
 
-# Initialize services
-firebase_service = FirebaseService()
-
 @router.post("/", response_model=Dict[str, str])
-async def create_class(class_data: ClassCreate, user_data: Dict = Depends(verify_token)):
+async def create_class(class_data: ClassCreate, user_data: Dict = Depends(verify_token), data_service: DataService = Depends(provide_data_service)):
     """Create a new class"""
     try:
         class_dict = class_data.dict()
-        class_id = firebase_service.create_class(class_dict)
+        class_id = data_service.create_class(class_dict)
         return {"class_id": class_id, "message": "Class created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating class: {str(e)}")
 
-@router.get("/", response_model=Dict[str, Any])
-async def get_all_classes(user_data: Dict = Depends(verify_token)):
-    """Get all classes"""
+@router.get("/", response_model=ClassList)
+async def get_all_classes(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. class_name,schedules"),
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
+):
+    """
+    Get all classes, answers If-None-Match with 304 while no class changed
+    With fields, only those fields of each class are returned
+    """
     try:
-        classes = firebase_service.get_all_classes()
-        return {"classes": classes}
+        projection = parse_fields(fields, Class.model_fields, "class_id")
+        cached = not_modified(request, response, get_change_log().etag("classes", fields=projection))
+        if cached:
+            return cached
+        
+        classes = data_service.get_all_classes(projection)
+        return json_response({"classes": classes}, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving classes: {str(e)}")
 
-@router.get("/{class_id}", response_model=Dict[str, Any])
+@router.get("/{class_id}", response_model=Class)
 async def get_class(
+    request: Request,
+    response: Response,
     class_id: str = Path(..., description="The ID of the class to retrieve"),
-    user_data: Dict = Depends(verify_token)
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. class_name,schedules"),
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
 ):
-    """Get a class by ID"""
+    """Get a class by ID, answers If-None-Match with 304 while it is unchanged"""
     try:
-        class_data = firebase_service.get_class(class_id)
+        projection = parse_fields(fields, Class.model_fields, "class_id")
+        cached = not_modified(request, response, get_change_log().etag("classes", class_id, projection))
+        if cached:
+            return cached
+        
+        class_data = data_service.get_class(class_id, projection)
         if not class_data:
             raise HTTPException(status_code=404, detail=f"Class with ID {class_id} not found")
-        return class_data
+        return json_response(class_data, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -50,12 +77,13 @@ async def get_class(
 async def update_class(
     class_data: ClassCreate,
     class_id: str = Path(..., description="The ID of the class to update"),
-    user_data: Dict = Depends(verify_token)
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
 ):
     """Update a class"""
     try:
         class_dict = class_data.dict()
-        success = firebase_service.update_class(class_id, class_dict)
+        success = data_service.update_class(class_id, class_dict)
         
         if not success:
             raise HTTPException(status_code=404, detail=f"Class with ID {class_id} not found")
@@ -69,11 +97,12 @@ async def update_class(
 @router.delete("/{class_id}", response_model=Dict[str, str])
 async def delete_class(
     class_id: str = Path(..., description="The ID of the class to delete"),
-    user_data: Dict = Depends(verify_token)
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
 ):
     """Delete a class"""
     try:
-        success = firebase_service.delete_class(class_id)
+        success = data_service.delete_class(class_id)
         
         if not success:
             raise HTTPException(status_code=404, detail=f"Class with ID {class_id} not found")
@@ -88,11 +117,12 @@ async def delete_class(
 async def enroll_student(
     class_id: str = Path(..., description="The ID of the class"),
     student_id: str = Path(..., description="The ID of the student to enroll"),
-    user_data: Dict = Depends(verify_token)
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
 ):
     """Enroll a student in a class"""
     try:
-        success = firebase_service.enroll_student_in_class(student_id, class_id)
+        success = data_service.enroll_student_in_class(student_id, class_id)
         
         if not success:
             raise HTTPException(
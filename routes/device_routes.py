@@ -0,0 +1,164 @@
+"""
+Device Routes for the Fingerprint Attendance System API
+
+Readers keep a WebSocket connection to /api/devices/ws/{device_id} open for
+scans, acknowledgements and heartbeats, see services/device_gateway.py for the
+message format. They authenticate with their device token (see
+services/device_registry.py) as a bearer token or a token query parameter. Administrators list the connected readers and push enroll and
+delete commands to them over HTTP. Readers keep a local copy of the roster and
+the timetable of their room in sync with /api/devices/{device_id}/roster.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, Path, Query, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import Dict, Any, Optional
+
+from middleware.auth_middleware import verify_token, is_simulation_mode
+from services.data_service import DataService
+from services.attendance_service import AttendanceService
+from services.change_log import get_change_log
+from services.device_gateway import get_device_gateway, COMMANDS
+from services.device_registry import get_device_registry
+from services.providers import provide_data_service, provide_attendance_service
+from utils import codec
+from utils.time_util import upcoming_sessions
+
+router = APIRouter(
+    prefix="/api/devices",
+    tags=["devices"],
+    responses={404: {"description": "Not found"}},
+)
+
+# Models
+class DeviceCommandRequest(BaseModel):
+    """Request model for pushing a command to a reader"""
+    command: str
+    fingerprint_id: int
+    student_id: Optional[str] = None
+    wait: float = 0.0
+
+@router.websocket("/ws/{device_id}")
+async def device_connection(
+    websocket: WebSocket,
+    device_id: str,
+    attendance_service: AttendanceService = Depends(provide_attendance_service)
+):
+    """Persistent connection of a reader, refused without its device token"""
+    # Authentication is skipped in simulation mode like for the other routes
+    if not is_simulation_mode() and not get_device_registry().authenticate(device_id, _device_token(websocket)):
+        print(f"Device {device_id}: connection refused, invalid device token")
+        await websocket.close(code=1008)
+        return
+    await get_device_gateway().serve(device_id, websocket, attendance_service)
+
+def _device_token(websocket: WebSocket) -> Optional[str]:
+    """The token sent by a reader in the Authorization header or the token query parameter"""
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return websocket.query_params.get("token")
+
+@router.get("/", response_model=Dict[str, Any])
+async def get_connected_devices(user_data: Dict = Depends(verify_token)):
+    """List the readers connected to the gateway"""
+    devices = get_device_gateway().connected_devices()
+    return {"devices": devices, "count": len(devices)}
+
+@router.post("/{device_id}/commands", response_model=Dict[str, Any])
+async def send_device_command(
+    request: DeviceCommandRequest,
+    device_id: str = Path(..., description="The ID of the reader"),
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service)
+):
+    """
+    Push an enroll or delete command to a connected reader
+    With student_id, a successful enrollment assigns the fingerprint ID to the student
+    """
+    if request.command not in COMMANDS:
+        raise HTTPException(status_code=400, detail=f"Unknown command {request.command}, use one of {', '.join(COMMANDS)}")
+
+    on_ack = None
+    if request.command == "enroll" and request.student_id:
+        student = data_service.get_student(request.student_id)
+        if not student:
+            raise HTTPException(status_code=404, detail=f"Student with ID {request.student_id} not found")
+
+        def on_ack(ack: Dict[str, Any]):
+            if ack["ok"]:
+                data_service.update_student(
+                    student["student_id"],
+                    {"fingerprint_id": request.fingerprint_id, "name": student["name"]}
+                )
+                print(f"Device {device_id} enrolled fingerprint ID {request.fingerprint_id} for student {student['name']}")
+
+    result = await get_device_gateway().send_command(
+        device_id, request.command, request.fingerprint_id, wait=min(max(request.wait, 0.0), 60.0), on_ack=on_ack
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Device {device_id} is not connected")
+    return result
+
+@router.get("/{device_id}/roster")
+async def get_device_roster(
+    request: Request,
+    device_id: str = Path(..., description="The ID of the reader"),
+    since: Optional[str] = Query(None, description="Version returned by the previous sync"),
+    hours: int = Query(24, ge=1, le=168, description="Hours of timetable to include"),
+    data_service: DataService = Depends(provide_data_service)
+):
+    """
+    Roster and room timetable for a reader, as changes since a previous sync
+    
+    students   [student_id, fingerprint_id, name, [class_id, ...]] added or changed
+    removed    student IDs to drop
+    timetable  [class_id, class_name, date, start_time, end_time] of the room's upcoming sessions
+    
+    With full set, the reader replaces its roster instead of applying the changes.
+    The response is JSON, MessagePack or CBOR depending on Accept.
+    """
+    try:
+        change_log = get_change_log()
+        # Take the version before reading, changes made during the sync are sent again next time
+        version = change_log.version
+        since_version = change_log.parse_token(since)
+        changes = change_log.changes_since(since_version) if since_version is not None else None
+        changed_students = changes.get("students", set()) if changes is not None else None
+        full = changed_students is None or None in changed_students
+        
+        students = []
+        removed = []
+        if full:
+            for student_id, student in data_service.get_all_students().items():
+                students.append(_roster_entry(student_id, student))
+        else:
+            for student_id in sorted(changed_students):
+                student = data_service.get_student(student_id)
+                if student:
+                    students.append(_roster_entry(student_id, student))
+                else:
+                    removed.append(student_id)
+        
+        room_number = get_device_registry().room_of(device_id)
+        timetable = [
+            [session["class_id"], session["class_name"], session["date"], session["start_time"], session["end_time"]]
+            for session in upcoming_sessions(data_service.get_all_classes(), room_number, hours=hours)
+        ]
+        
+        roster = {
+            "version": change_log.token(version),
+            "full": full,
+            "room_number": room_number,
+            "students": students,
+            "removed": removed,
+            "timetable": timetable
+        }
+        media_type = codec.response_encoding(request.headers.get("accept"))
+        return Response(content=codec.encode(media_type, roster), media_type=media_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building roster: {str(e)}")
+
+def _roster_entry(student_id: str, student: Dict[str, Any]):
+    """Compact roster entry of a student"""
+    return [student_id, student.get("fingerprint_id"), student.get("name"), student.get("enrolled_classes", [])]
@@ -10,9 +10,10 @@ from typing import Dict, Any, Optional, List
 import time
 from datetime import datetime
 
-from utils.fingerprint_util import FingerprintUtil
 from middleware.auth_middleware import verify_token
-from services.firebase_service import FirebaseService
+from services.data_service import DataService
+from utils.fingerprint_util import FingerprintUtil
+from services.providers import provide_data_service, provide_fingerprint_util
 
 router = APIRouter(
     prefix="/api/fingerprints",
@@ -20,10 +21,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Initialize services
-firebase_service = FirebaseService()
-fingerprint_util = FingerprintUtil()
-
 # Models
 class FingerprintEnrollRequest(BaseModel):
     """Request model for enrolling a new fingerprint"""
@@ -45,7 +42,9 @@ class FingerprintStatusResponse(BaseModel):
 async def enroll_fingerprint(
     request: FingerprintEnrollRequest,
     background_tasks: BackgroundTasks,
-    user_data: Dict = Depends(verify_token)
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service),
+    fingerprint_util: FingerprintUtil = Depends(provide_fingerprint_util)
 ):
     """
     Enroll a new fingerprint for a student
@@ -55,7 +54,7 @@ async def enroll_fingerprint(
     """
     try:
         # Check if the student exists
-        student = firebase_service.get_student(request.student_id)
+        student = data_service.get_student(request.student_id)
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
         
@@ -63,14 +62,14 @@ async def enroll_fingerprint(
         fingerprint_id = request.fingerprint_id
         if fingerprint_id is None:
             # Get all students to find the next available fingerprint ID
-            students = firebase_service.get_all_students()
+            students = data_service.get_all_students()
             existing_ids = [s.get('fingerprint_id', 0) for s in students.values() if s.get('fingerprint_id')]
             fingerprint_id = 1  # Start with ID 1
             while fingerprint_id in existing_ids:
                 fingerprint_id += 1
         
         # Check if the fingerprint ID is already in use by another student
-        existing_student = firebase_service.get_student_by_fingerprint(fingerprint_id)
+        existing_student = data_service.get_student_by_fingerprint(fingerprint_id)
         if existing_student and existing_student.get('student_id') != request.student_id:
             raise HTTPException(
                 status_code=400, 
@@ -85,7 +84,7 @@ async def enroll_fingerprint(
             if result:
                 # Update student's fingerprint ID in database
                 if student and "name" in student and "student_id" in student:
-                    firebase_service.update_student(
+                    data_service.update_student(
                         student["student_id"], 
                         {"fingerprint_id": fingerprint_id, "name": student["name"]}
                     )
@@ -114,7 +113,9 @@ async def enroll_fingerprint(
 @router.post("/remove", response_model=FingerprintStatusResponse)
 async def remove_fingerprint(
     request: FingerprintRemoveRequest,
-    user_data: Dict = Depends(verify_token)
+    user_data: Dict = Depends(verify_token),
+    data_service: DataService = Depends(provide_data_service),
+    fingerprint_util: FingerprintUtil = Depends(provide_fingerprint_util)
 ):
     """
     Remove a fingerprint from the system
@@ -123,7 +124,7 @@ async def remove_fingerprint(
     """
     try:
         # Find the student with this fingerprint ID
-        student = firebase_service.get_student_by_fingerprint(request.fingerprint_id)
+        student = data_service.get_student_by_fingerprint(request.fingerprint_id)
         if not student:
             raise HTTPException(status_code=404, detail="No student found with this fingerprint ID")
         
@@ -135,7 +136,7 @@ async def remove_fingerprint(
             if student and "student_id" in student and "name" in student:
                 student_id = student["student_id"]
                 student_name = student["name"]
-                firebase_service.update_student(
+                data_service.update_student(
                     student_id, 
                     {"fingerprint_id": 0, "name": student_name}
                 )
@@ -166,7 +167,7 @@ async def remove_fingerprint(
         raise HTTPException(status_code=500, detail=f"Removal error: {str(e)}")
 
 @router.get("/status", response_model=FingerprintStatusResponse)
-async def fingerprint_sensor_status(user_data: Dict = Depends(verify_token)):
+async def fingerprint_sensor_status(user_data: Dict = Depends(verify_token), fingerprint_util: FingerprintUtil = Depends(provide_fingerprint_util)):
     """
     Get the status of the fingerprint sensor
     """
@@ -1,63 +1,91 @@
-from fastapi import APIRouter, HTTPException, Path, Body, Query
-from typing import Dict, Any, List
+from fastapi import APIRouter, HTTPException, Path, Body, Query, Depends, Request, Response
+from typing import Dict, Any, List, Optional
 
-from schemas.student_schema import Student, StudentCreate
-from services.firebase_service import FirebaseService
+from schemas.student_schema import Student, StudentCreate, StudentList
+from services.data_service import DataService
+from services.change_log import get_change_log
+from services.providers import provide_data_service
+from utils.conditional import not_modified
+from utils.json_response import json_response
+from utils.projection import parse_fields
 
 # Create router
 router = APIRouter(prefix="/api/students", tags=["students"])
 
-# Initialize services
-firebase_service = FirebaseService()
-
 @router.post("/", response_model=Dict[str, str])
-async def create_student(student_data: StudentCreate):
+async def create_student(student_data: StudentCreate, data_service: DataService = Depends(provide_data_service)):
     """Create a new student"""
     try:
         student_dict = student_data.dict()
         
         # Check if fingerprint ID already exists
-        existing_student = firebase_service.get_student_by_fingerprint(student_dict['fingerprint_id'])
+        existing_student = data_service.get_student_by_fingerprint(student_dict['fingerprint_id'])
         if existing_student:
             raise HTTPException(
                 status_code=400,
                 detail=f"Fingerprint ID {student_dict['fingerprint_id']} is already registered"
             )
         
-        student_id = firebase_service.create_student(student_dict)
+        student_id = data_service.create_student(student_dict)
         return {"student_id": student_id, "message": "Student created successfully"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating student: {str(e)}")
 
-@router.get("/", response_model=Dict[str, Any])
-async def get_all_students():
-    """Get all students"""
+@router.get("/", response_model=StudentList)
+async def get_all_students(
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. name,fingerprint_id"),
+    data_service: DataService = Depends(provide_data_service)
+):
+    """
+    Get all students, answers If-None-Match with 304 while no student changed
+    With fields, only those fields of each student are returned
+    """
     try:
-        students = firebase_service.get_all_students()
-        return {"students": students}
+        projection = parse_fields(fields, Student.model_fields, "student_id")
+        cached = not_modified(request, response, get_change_log().etag("students", fields=projection))
+        if cached:
+            return cached
+        
+        students = data_service.get_all_students(projection)
+        return json_response({"students": students}, response)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving students: {str(e)}")
 
-@router.get("/{student_id}", response_model=Dict[str, Any])
-async def get_student(student_id: str = Path(..., description="The ID of the student to retrieve")):
-    """Get a student by ID"""
+@router.get("/{student_id}", response_model=Student)
+async def get_student(
+    request: Request,
+    response: Response,
+    student_id: str = Path(..., description="The ID of the student to retrieve"),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. name,fingerprint_id"),
+    data_service: DataService = Depends(provide_data_service)
+):
+    """Get a student by ID, answers If-None-Match with 304 while it is unchanged"""
     try:
-        student_data = firebase_service.get_student(student_id)
+        projection = parse_fields(fields, Student.model_fields, "student_id")
+        cached = not_modified(request, response, get_change_log().etag("students", student_id, projection))
+        if cached:
+            return cached
+        
+        student_data = data_service.get_student(student_id, projection)
         if not student_data:
             raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
-        return student_data
+        return json_response(student_data, response)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving student: {str(e)}")
 
-@router.get("/fingerprint/{fingerprint_id}", response_model=Dict[str, Any])
-async def get_student_by_fingerprint(fingerprint_id: int = Path(..., description="The fingerprint ID to look up")):
+@router.get("/fingerprint/{fingerprint_id}", response_model=Student)
+async def get_student_by_fingerprint(fingerprint_id: int = Path(..., description="The fingerprint ID to look up"), data_service: DataService = Depends(provide_data_service)):
     """Get a student by fingerprint ID"""
     try:
-        student_data = firebase_service.get_student_by_fingerprint(fingerprint_id)
+        student_data = data_service.get_student_by_fingerprint(fingerprint_id)
         if not student_data:
             raise HTTPException(status_code=404, detail=f"No student found with fingerprint ID {fingerprint_id}")
         return student_data
@@ -69,21 +97,22 @@ async def get_student_by_fingerprint(fingerprint_id: int = Path(..., description
 @router.put("/{student_id}", response_model=Dict[str, str])
 async def update_student(
     student_data: StudentCreate,
-    student_id: str = Path(..., description="The ID of the student to update")
+    student_id: str = Path(..., description="The ID of the student to update"),
+    data_service: DataService = Depends(provide_data_service)
 ):
     """Update a student"""
     try:
         student_dict = student_data.dict()
         
         # Check if the new fingerprint ID already exists in another student
-        existing_student = firebase_service.get_student_by_fingerprint(student_dict['fingerprint_id'])
+        existing_student = data_service.get_student_by_fingerprint(student_dict['fingerprint_id'])
         if existing_student and existing_student.get('student_id') != student_id:
             raise HTTPException(
                 status_code=400,
                 detail=f"Fingerprint ID {student_dict['fingerprint_id']} is already registered to another student"
             )
         
-        success = firebase_service.update_student(student_id, student_dict)
+        success = data_service.update_student(student_id, student_dict)
         
         if not success:
             raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
@@ -95,10 +124,10 @@ async def update_student(
         raise HTTPException(status_code=500, detail=f"Error updating student: {str(e)}")
 
 @router.delete("/{student_id}", response_model=Dict[str, str])
-async def delete_student(student_id: str = Path(..., description="The ID of the student to delete")):
+async def delete_student(student_id: str = Path(..., description="The ID of the student to delete"), data_service: DataService = Depends(provide_data_service)):
     """Delete a student"""
     try:
-        success = firebase_service.delete_student(student_id)
+        success = data_service.delete_student(student_id)
         
         if not success:
             raise HTTPException(status_code=404, detail=f"Student with ID {student_id} not found")
@@ -15,12 +15,20 @@ class AttendanceCreate(BaseModel):
     class_id: str
     timestamp: str  # ISO format datetime string
 
+class AttendanceEntry(BaseModel):
+    """Schema for the attendance of one student in a report"""
+    student_id: str
+    name: str
+    status: str  # present, late or absent
+
 class AttendanceReport(BaseModel):
     """Schema for attendance report"""
     class_id: str
     class_name: str
     date: str
     total_students: int
-    present_students: int
+    present_students: int  # Including late students
+    late_students: int = 0
     absent_students: int
-    attendance_list: List[Dict[str, str]]  # List of {student_id, name, status}
\ No newline at end of file
+    attendance_list: List[AttendanceEntry]
+    materialized_at: Optional[str] = None  # Set once the roll of the session is closed
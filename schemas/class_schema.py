@@ -1,23 +1,30 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Dict
 
 class ClassSchedule(BaseModel):
     """Schema for class schedule times"""
     day_of_week: str
     start_time: str  # Format: "HH:MM"
     end_time: str    # Format: "HH:MM"
-    room_number: str
+    room_number: Optional[str] = None
 
 class Class(BaseModel):
     """Schema for class information"""
+    # Stored documents may carry additional fields, they are passed through
+    model_config = ConfigDict(extra='allow')
+    
     class_id: str
     class_name: str
-    lecturer: str
-    schedules: List[ClassSchedule]
+    lecturer: Optional[str] = None
+    schedules: List[ClassSchedule] = []
     enrolled_students: List[str] = []  # List of student IDs enrolled in this class
 
 class ClassCreate(BaseModel):
     """Schema for creating a new class"""
     class_name: str
-    lecturer: str
-    schedules: List[ClassSchedule]
\ No newline at end of file
+    lecturer: Optional[str] = None
+    schedules: List[ClassSchedule]
+
+class ClassList(BaseModel):
+    """Schema for the list of all classes"""
+    classes: Dict[str, Class]  # Classes by class_id
@@ -1,14 +1,36 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Dict
 
 class Student(BaseModel):
     """Schema for student information"""
+    # Stored documents may carry additional fields, they are passed through
+    model_config = ConfigDict(extra='allow')
+    
     student_id: str
     name: str
-    fingerprint_id: int  # ID stored in the fingerprint sensor
+    fingerprint_id: Optional[int] = None  # ID stored in the fingerprint sensor
     enrolled_classes: List[str] = []  # List of class_ids the student is enrolled in
 
 class StudentCreate(BaseModel):
     """Schema for creating a new student"""
     name: str
-    fingerprint_id: int
\ No newline at end of file
+    fingerprint_id: int
+
+class StudentList(BaseModel):
+    """Schema for the list of all students"""
+    students: Dict[str, Student]  # Students by student_id
+
+class ClassAttendance(BaseModel):
+    """Schema for a student's attendance in one class"""
+    class_id: str
+    class_name: str
+    total_days: int
+    attended_days: int
+    attendance_percentage: int
+
+class StudentAttendanceSummary(BaseModel):
+    """Schema for the attendance summary of a student"""
+    student_id: str
+    name: str
+    enrolled_classes: int  # Number of classes the student is enrolled in
+    class_attendance: List[ClassAttendance]
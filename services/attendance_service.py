@@ -1,40 +1,67 @@
 from typing import Dict, Any, Optional, List, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import os
+import threading
+import time
 
-from services.firebase_service import FirebaseService
-from utils.time_util import get_current_time, get_day_of_week, time_in_range, format_datetime
+from services.data_service import get_data_service
+from services.event_bus import publish_attendance
+from services.report_cache import ReportCache
+from utils.time_util import get_current_time, get_day_of_week, time_in_range, format_datetime, ended_sessions
+from utils.metrics import histogram
+
+RECORD_ATTENDANCE_DURATION = histogram(
+    'attendance_record_duration_seconds',
+    'Time from receiving a scan to the attendance record being stored, by result',
+    ['result']
+)
+
+# Scans later than this many minutes after the start of the session are marked late
+LATE_AFTER_MINUTES = int(os.environ.get('LATE_AFTER_MINUTES', '15'))
 
 class AttendanceService:
     """Service to handle attendance-related operations"""
     
-    def __init__(self):
+    def __init__(self, data_service=None):
         """Initialize the attendance service"""
-        self.firebase_service = FirebaseService()
+        # The data service falls back to the local data service in simulation mode
+        self.data_service = data_service or get_data_service()
         
-        # Initialize optional local data service if we're in simulation mode
-        self.local_service = None
-        if os.environ.get('FIREBASE_SIMULATION', 'false').lower() == 'true':
-            try:
-                from services.local_data_service import LocalDataService
-                self.local_service = LocalDataService()
-                print("AttendanceService: Using local data service as backup")
-            except Exception as e:
-                print(f"AttendanceService: Error initializing local data service: {str(e)}")
+        # Reports of days with attendance recorded by this process, by when it was
+        # last recorded. They are computed from the records, and the scheduler
+        # materializes again the ones recorded after a session of that day ended
+        self._stale_reports: Dict[Tuple[str, str], datetime] = {}
+        self._stale_lock = threading.Lock()
+        
+        # Reports are cached only when the data service reports its writes, and for
+        # REPORT_CACHE_TTL seconds for writes made elsewhere. Stale reports are
+        # marked before the cache drops them, so they are not cached again
+        self.report_cache = None
+        if hasattr(self.data_service, 'add_write_listener'):
+            self.report_cache = ReportCache(int(os.environ.get('REPORT_CACHE_SIZE', '1000')),
+                                            float(os.environ.get('REPORT_CACHE_TTL', os.environ.get('DATA_CACHE_TTL', '60'))))
+            self.data_service.add_write_listener(self._on_write)
+            self.data_service.add_write_listener(self.report_cache.on_write)
     
     def record_attendance(self, fingerprint_id: int, timestamp: str = None) -> Dict[str, Any]:
         """
         Record attendance based on fingerprint ID
         Returns attendance data if successful, otherwise error message
         """
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            data = self._record_attendance(fingerprint_id, timestamp)
+            result = 'rejected' if 'error' in data else 'recorded'
+            return data
+        finally:
+            RECORD_ATTENDANCE_DURATION.labels(result).observe(time.perf_counter() - start)
+
+    def _record_attendance(self, fingerprint_id: int, timestamp: str = None) -> Dict[str, Any]:
+        """Resolve the student and current class for a scan and store the record"""
         # Get student by fingerprint ID
-        student = self.firebase_service.get_student_by_fingerprint(fingerprint_id)
-        
-        # Try local service as fallback if we're in simulation mode
-        if not student and self.local_service:
-            print(f"Using local service to find student with fingerprint ID: {fingerprint_id}")
-            student = self.local_service.get_student_by_fingerprint(fingerprint_id)
+        student = self.data_service.get_student_by_fingerprint(fingerprint_id)
         
         if not student:
             return {"error": f"No student found with fingerprint ID: {fingerprint_id}"}
@@ -70,11 +97,15 @@ class AttendanceService:
             "student_id": student["student_id"],
             "class_id": current_class["class_id"],
             "timestamp": timestamp,
-            "status": "present"
+            "status": self._arrival_status(current_class, day_of_week, time_str)
         }
         
         # Save attendance record
-        attendance_id = self.firebase_service.create_attendance(attendance_data)
+        attendance_id = self.data_service.create_attendance(attendance_data)
+        attendance_data["attendance_id"] = attendance_id
+        
+        # Notify live dashboards
+        publish_attendance(attendance_data, student["name"], current_class["class_name"], source="scan")
         
         # Return confirmation data
         return {
@@ -87,14 +118,128 @@ class AttendanceService:
         }
     
     def generate_attendance_report(self, class_id: str, date: str) -> Dict[str, Any]:
-        """Generate attendance report for a class on a specific date"""
+        """Generate attendance report for a class on a specific date, served from the report cache when possible"""
+        if self.report_cache is None:
+            return self._load_attendance_report(class_id, date)
+        return self.report_cache.get_or_compute(class_id, date, lambda: self._load_attendance_report(class_id, date))
+    
+    def _load_attendance_report(self, class_id: str, date: str) -> Dict[str, Any]:
+        """The materialized report of a finished session, computed from the records otherwise"""
+        with self._stale_lock:
+            stale = (class_id, date) in self._stale_reports
+        if not stale:
+            report = self.data_service.get_report(class_id, date)
+            if report:
+                return report
+        return self._generate_attendance_report(class_id, date)
+    
+    def materialize_report(self, class_id: str, date: str, end_time: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Close the roll of a class on a date: store an absent record for every
+        enrolled student without a record and the final report as one document.
+        Without end_time the roll is closed at the end of the last session of
+        that date that has ended, and not at all when none has
+        """
+        key = (class_id, date)
+        if end_time is None:
+            end_time = self._closed_session_end(class_id, date, get_current_time().replace(tzinfo=None))
+            if end_time is None:
+                return {"error": f"No session of class {class_id} on {date} has ended"}
+        
+        with self._stale_lock:
+            # Dropped before the records are read, so any record stored from
+            # here on marks the report stale again
+            self._stale_reports.pop(key, None)
+        
+        attendance_records = self.data_service.get_attendance(class_id, date)
+        report = self._generate_attendance_report(class_id, date, attendance_records)
+        if "error" in report:
+            return report
+        
+        timestamp = f"{date} {end_time}:00"
+        
+        absent_records = [
+            {
+                "student_id": entry["student_id"],
+                "class_id": class_id,
+                "timestamp": timestamp,
+                "status": "absent"
+            }
+            for entry in report["attendance_list"]
+            if entry["student_id"] not in attendance_records
+        ]
+        report["materialized_at"] = format_datetime(get_current_time())
+        
+        if not self.data_service.save_report(report, absent_records):
+            # A student checked in after the records were read, try again on the next check
+            with self._stale_lock:
+                self._stale_reports.setdefault(key, get_current_time().replace(tzinfo=None))
+            return {"error": f"Attendance of class {class_id} on {date} changed while its roll was closed"}
+        print(f"Materialized report of {report['class_name']} on {date}: "
+              f"{report['present_students']} present, {report['late_students']} late, {report['absent_students']} absent")
+        return report
+    
+    def stale_reports(self) -> List[Tuple[str, str, str]]:
+        """
+        The (class_id, date, end_time) of rolls to close again because this process
+        recorded attendance after a session of that date ended. Records of sessions
+        that had not ended are read when those close and are forgotten here
+        """
+        with self._stale_lock:
+            candidates = sorted(self._stale_reports.items())
+        
+        rolls = []
+        for key, recorded_at in candidates:
+            end_time = self._closed_session_end(key[0], key[1], recorded_at)
+            if end_time is None:
+                with self._stale_lock:
+                    if self._stale_reports.get(key) == recorded_at:
+                        del self._stale_reports[key]
+                continue
+            rolls.append((key[0], key[1], end_time))
+        return rolls
+    
+    def _on_write(self, operation: str, args: Tuple, result: Any):
+        """Data service write listener marking the reports a record may have outdated"""
+        if operation != 'create_attendance':
+            return
+        record = args[0]
+        key = (record.get('class_id'), record.get('timestamp', '').split(' ')[0])
+        # The roll may have been closed by any process, the scheduler checks the schedule
+        now = get_current_time().replace(tzinfo=None)
+        if key[1] > now.strftime('%Y-%m-%d'):
+            return
+        with self._stale_lock:
+            self._stale_reports[key] = now
+    
+    def _closed_session_end(self, class_id: str, date: str, now: datetime) -> Optional[str]:
+        """End time of the last session of a class on a date whose end minute had passed at now, None without one"""
+        class_info = self.data_service.get_class(class_id)
+        if not class_info:
+            return None
+        try:
+            day = datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return None
+        # Scans are accepted until the end of the end minute, overnight sessions end on the next day
+        until = min(now - timedelta(minutes=1), day + timedelta(days=2))
+        end_times = [
+            session['end_time']
+            for session in ended_sessions({class_id: class_info}, day - timedelta(microseconds=1), until)
+            if session['date'] == date
+        ]
+        return end_times[-1] if end_times else None
+    
+    def _generate_attendance_report(self, class_id: str, date: str, attendance_records: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the attendance report of a class on a date from the data service"""
         # Get class information
-        class_info = self.firebase_service.get_class(class_id)
+        class_info = self.data_service.get_class(class_id)
         if not class_info:
             return {"error": f"No class found with ID: {class_id}"}
         
         # Get all attendance records for this class on this date
-        attendance_records = self.firebase_service.get_attendance(class_id, date)
+        if attendance_records is None:
+            attendance_records = self.data_service.get_attendance(class_id, date)
         
         # Get all enrolled students for this class
         enrolled_student_ids = class_info.get("enrolled_students", [])
@@ -102,20 +247,22 @@ class AttendanceService:
         # Get student details
         students_data = {}
         for student_id in enrolled_student_ids:
-            student = self.firebase_service.get_student(student_id)
+            student = self.data_service.get_student(student_id)
             if student:
                 students_data[student_id] = student
         
-        # Create attendance list with status for each student
+        # Create attendance list with status for each student, late students count as present
         attendance_list = []
         present_count = 0
+        late_count = 0
         
         for student_id, student in students_data.items():
-            if student_id in attendance_records:
-                status = "present"
+            record = attendance_records.get(student_id)
+            status = record.get("status", "present") if record else "absent"
+            if status != "absent":
                 present_count += 1
-            else:
-                status = "absent"
+            if status == "late":
+                late_count += 1
             
             attendance_list.append({
                 "student_id": student_id,
@@ -136,6 +283,7 @@ class AttendanceService:
             "date": date,
             "total_students": total_students,
             "present_students": present_count,
+            "late_students": late_count,
             "absent_students": absent_count,
             "attendance_list": attendance_list
         }
@@ -145,12 +293,12 @@ class AttendanceService:
     def get_student_attendance_summary(self, student_id: str) -> Dict[str, Any]:
         """Get attendance summary for a student"""
         # Get student information
-        student = self.firebase_service.get_student(student_id)
+        student = self.data_service.get_student(student_id)
         if not student:
             return {"error": f"No student found with ID: {student_id}"}
         
         # Get all student's attendance records
-        student_attendance = self.firebase_service.get_student_attendance(student_id)
+        student_attendance = self.data_service.get_student_attendance(student_id)
         
         # Get all classes the student is enrolled in
         enrolled_classes = student.get("enrolled_classes", [])
@@ -160,14 +308,16 @@ class AttendanceService:
         
         # Get class information for each enrolled class
         for class_id in enrolled_classes:
-            class_info = self.firebase_service.get_class(class_id)
+            class_info = self.data_service.get_class(class_id)
             if not class_info:
                 continue
             
             # Count days attended for this class
-            attended_days = 0
-            if class_id in student_attendance:
-                attended_days = len(student_attendance[class_id])
+            # Absent records written when a roll is closed do not count
+            attended_days = sum(
+                1 for record in student_attendance.get(class_id, {}).values()
+                if record.get("status", "present") != "absent"
+            )
             
             # For now, assume total days equals attended days * 2 as a placeholder
             # In a real implementation, this would be calculated based on the class schedule
@@ -196,6 +346,24 @@ class AttendanceService:
         
         return summary_data
     
+    def _arrival_status(self, class_info: Dict[str, Any], day_of_week: str, current_time: str) -> str:
+        """Present, or late when the scan is more than LATE_AFTER_MINUTES after the start of the session"""
+        scan_time = datetime.strptime(current_time, '%H:%M')
+        for schedule in class_info.get('schedules', []):
+            start_time = schedule.get('start_time')
+            end_time = schedule.get('end_time')
+            if (schedule.get('day_of_week') != day_of_week or not start_time or not end_time or
+                    not time_in_range(start_time, end_time, current_time)):
+                continue
+            
+            minutes = (scan_time - datetime.strptime(start_time, '%H:%M')) / timedelta(minutes=1)
+            if minutes < 0:
+                # After midnight in an overnight session
+                minutes += 24 * 60
+            return "late" if minutes > LATE_AFTER_MINUTES else "present"
+        
+        return "present"
+    
     def _determine_current_class(self, student: Dict[str, Any], date: str, current_time: str, day_of_week: str) -> Optional[Dict[str, Any]]:
         """
         Determine which class the student is attending based on day and time
@@ -205,7 +373,7 @@ class AttendanceService:
         enrolled_class_ids = student.get('enrolled_classes', [])
         
         for class_id in enrolled_class_ids:
-            class_info = self.firebase_service.get_class(class_id)
+            class_info = self.data_service.get_class(class_id)
             
             if not class_info:
                 continue
@@ -0,0 +1,457 @@
+"""
+Bulk loader for classes, students, enrollments and attendance
+
+Reads records from CSV or JSON files and writes them with batched commits
+across a pool of worker threads. Enrollments are folded into the class and
+student documents written in the same run, so each document is written once
+instead of being followed by one array update per enrollment. Progress is kept
+in a checkpoint file so an interrupted load resumes with the first batch that
+was not committed.
+
+Input directory layout (each file may be .csv or .json, all are optional):
+
+    classes      class_id, class_name, lecturer, schedules, enrolled_students
+    students     student_id, name, fingerprint_id, enrolled_classes
+    enrollments  student_id or fingerprint_id, class_id or class_name
+    attendance   student_id or fingerprint_id, class_id or class_name, timestamp, status, attendance_id
+
+In CSV files schedules are written as "Monday 09:00-11:00 A101; Wednesday 09:00-11:00 A101",
+in JSON files as a list of schedule objects. enrolled_students and
+enrolled_classes hold IDs, separated by ";" in CSV files, and are added to the
+other side of the enrollment as well. Missing class and student IDs are
+derived from the class name and fingerprint ID, so reruns produce the same IDs.
+
+Rerunning a load updates the fields of existing documents and adds to their
+enrollments, it never drops enrollments made by earlier loads or the app.
+Rows without a usable fingerprint ID, class or student are rejected and
+counted per entity instead of aborting the load.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.event_bus import publish_attendance
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_SIZE = 500
+
+ENTITIES = ['classes', 'students', 'enrollments', 'attendance']
+
+# Enrollment list of each document, merged with the stored one instead of replacing it
+ENROLLMENT_FIELDS = {'classes': 'enrolled_students', 'students': 'enrolled_classes'}
+
+_ID_NAMESPACE = uuid.UUID('8a6c3f52-3f1e-4c5e-9d7a-4b1f0f4f2a11')
+
+
+def derive_id(kind: str, key: Any) -> str:
+    """Derive a stable document ID from a natural key"""
+    return str(uuid.uuid5(_ID_NAMESPACE, f"{kind}:{key}"))
+
+
+def parse_schedules(value: Any) -> List[Dict[str, str]]:
+    """Parse schedules from a JSON list or the compact CSV notation"""
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+
+    schedules = []
+    for entry in str(value).split(';'):
+        parts = entry.split()
+        if len(parts) < 2:
+            continue
+        start_time, end_time = parts[1].split('-')
+        schedules.append({
+            'day_of_week': parts[0],
+            'start_time': start_time,
+            'end_time': end_time,
+            'room_number': parts[2] if len(parts) > 2 else ''
+        })
+    return schedules
+
+
+def parse_list(value: Any) -> List[str]:
+    """Parse a list of IDs from a JSON list or a ';' separated CSV value"""
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+
+def parse_fingerprint_id(value: Any) -> Optional[int]:
+    """The fingerprint ID of a row, None if it is missing or not a number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_records(input_dir: str, entity: str) -> List[Dict[str, Any]]:
+    """Read the records of an entity from <entity>.json or <entity>.csv"""
+    json_path = os.path.join(input_dir, f"{entity}.json")
+    csv_path = os.path.join(input_dir, f"{entity}.csv")
+
+    if os.path.exists(json_path):
+        with open(json_path, 'r') as f:
+            data = json.load(f)
+        # Accept a plain list or {"<entity>": [...]}
+        return data.get(entity, []) if isinstance(data, dict) else data
+
+    if os.path.exists(csv_path):
+        with open(csv_path, 'r', newline='') as f:
+            return [{k: v for k, v in row.items() if v not in (None, '')} for row in csv.DictReader(f)]
+
+    return []
+
+
+class FirestoreTarget:
+    """Writes operations to Firestore with one batched commit per batch"""
+
+    name = 'firestore'
+
+    def __init__(self, db):
+        self.db = db
+
+    def write_batch(self, operations: List[Tuple]):
+        from firebase_admin import firestore
+        from services.firebase_service import ROLLS_COLLECTION, roll_id, roll_fields, writes_rolls
+
+        batch = self.db.batch()
+        rolls: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for operation in operations:
+            kind = operation[0]
+            if kind == 'set':
+                _, collection, document_id, data = operation
+                # Enrollments are added to the stored ones, an empty union is not allowed
+                field = ENROLLMENT_FIELDS[collection]
+                fields = {key: value for key, value in data.items() if key != field}
+                if data[field]:
+                    fields[field] = firestore.ArrayUnion(data[field])
+                batch.set(self.db.collection(collection).document(document_id), fields, merge=True)
+            elif kind == 'array_union':
+                _, collection, document_id, field, values = operation
+                batch.update(self.db.collection(collection).document(document_id), {
+                    field: firestore.ArrayUnion(values)
+                })
+            elif kind == 'attendance':
+                record = operation[1]
+                date = record['timestamp'].split(' ')[0]
+                if writes_rolls():
+                    rolls.setdefault((record['class_id'], date), []).append(record)
+                    continue
+                document_id = f"{record['class_id']}_{date}_{record['student_id']}"
+                batch.set(self.db.collection('attendance').document(document_id), record)
+
+        # One merge per session when check-ins are written to rolls
+        for (class_id, date), records in rolls.items():
+            batch.set(self.db.collection(ROLLS_COLLECTION).document(roll_id(class_id, date)),
+                      roll_fields(class_id, date, records), merge=True)
+        batch.commit()
+
+
+class LocalTarget:
+    """Writes operations to the local data service"""
+
+    name = 'local'
+
+    def __init__(self, service):
+        self.service = service
+        self._lock = threading.Lock()
+
+    def write_batch(self, operations: List[Tuple]):
+        with self._lock:
+            for operation in operations:
+                kind = operation[0]
+                if kind == 'set':
+                    _, collection, document_id, data = operation
+                    reference = self.service.get_reference(f"{collection}/{document_id}")
+                    current = reference.get()
+                    if current is None:
+                        reference.set(data)
+                        continue
+                    field = ENROLLMENT_FIELDS[collection]
+                    merged = list(current.get(field, []))
+                    merged.extend(v for v in data[field] if v not in merged)
+                    reference.update({**data, field: merged})
+                elif kind == 'array_union':
+                    _, collection, document_id, field, values = operation
+                    reference = self.service.get_reference(f"{collection}/{document_id}")
+                    current = reference.get()
+                    if current is None:
+                        continue
+                    merged = list(current.get(field, []))
+                    merged.extend(v for v in values if v not in merged)
+                    reference.update({field: merged})
+                elif kind == 'attendance':
+                    record = operation[1]
+                    date = record['timestamp'].split(' ')[0]
+                    path = f"attendance/{record['class_id']}/{date}/{record['student_id']}"
+                    self.service.get_reference(path).set(record)
+
+
+class SQLiteTarget:
+    """Writes operations to the SQLite data service with one transaction per batch"""
+
+    name = 'sqlite'
+
+    def __init__(self, service):
+        self.service = service
+
+    def write_batch(self, operations: List[Tuple]):
+        with self.service.transaction():
+            for operation in operations:
+                kind = operation[0]
+                if kind == 'set':
+                    _, collection, document_id, data = operation
+                    # Both phases list the same enrollments, neither may drop the rows of the other
+                    if collection == 'classes':
+                        self.service.put_class(data, replace_enrollments=False)
+                    elif collection == 'students':
+                        self.service.put_student(data, replace_enrollments=False)
+                elif kind == 'array_union':
+                    _, collection, document_id, field, values = operation
+                    if collection == 'students':
+                        self.service.put_enrollments([(document_id, class_id) for class_id in values])
+                    else:
+                        self.service.put_enrollments([(student_id, document_id) for student_id in values])
+                elif kind == 'attendance':
+                    self.service.put_attendance([operation[1]])
+
+
+class BulkLoader:
+    """Loads records into a target with batched commits across a worker pool"""
+
+    def __init__(self, target, batch_size: int = MAX_BATCH_SIZE, workers: int = 8,
+                 checkpoint_path: Optional[str] = None, retries: int = 3):
+        self.target = target
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.workers = max(workers, 1)
+        self.checkpoint_path = checkpoint_path
+        self.retries = retries
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint: Dict[str, Any] = {}
+
+    def load(self, data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Load classes, students, enrollments and attendance
+        Returns the number of documents written and the throughput per phase,
+        and the number of rejected rows per entity
+        """
+        operations, rejected = self._build_operations(data)
+        self._checkpoint = self._load_checkpoint(self._fingerprint(operations))
+
+        stats = {'phases': {}, 'documents': 0, 'elapsed': 0.0, 'rejected': rejected}
+        start = time.perf_counter()
+
+        # Phases run in order so enrollments and attendance find their documents
+        for phase in ENTITIES:
+            phase_ops = operations.get(phase, [])
+            if not phase_ops:
+                continue
+            written, elapsed = self._run_phase(phase, phase_ops)
+            stats['phases'][phase] = {
+                'documents': written,
+                'seconds': round(elapsed, 3),
+                'documents_per_second': round(written / elapsed, 1) if elapsed else 0.0
+            }
+            stats['documents'] += written
+
+        stats['elapsed'] = round(time.perf_counter() - start, 3)
+        stats['documents_per_second'] = round(stats['documents'] / stats['elapsed'], 1) if stats['elapsed'] else 0.0
+
+        # A finished load doesn't need its checkpoint anymore
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        return stats
+
+    def load_directory(self, input_dir: str) -> Dict[str, Any]:
+        """Load all entity files found in a directory"""
+        return self.load({entity: read_records(input_dir, entity) for entity in ENTITIES})
+
+    def _build_operations(self, data: Dict[str, List[Dict[str, Any]]]) -> Tuple[Dict[str, List[Tuple]], Dict[str, int]]:
+        """Turn input records into write operations grouped by phase, and count the rejected rows per entity"""
+        rejected = {entity: 0 for entity in ENTITIES}
+
+        classes: Dict[str, Dict[str, Any]] = {}
+        class_ids_by_name: Dict[str, str] = {}
+        for row in data.get('classes', []):
+            class_id = row.get('class_id') or derive_id('class', row['class_name'])
+            classes[class_id] = {
+                'class_id': class_id,
+                'class_name': row['class_name'],
+                'lecturer': row.get('lecturer', ''),
+                'schedules': parse_schedules(row.get('schedules')),
+                'enrolled_students': parse_list(row.get('enrolled_students'))
+            }
+            class_ids_by_name[row['class_name']] = class_id
+
+        students: Dict[str, Dict[str, Any]] = {}
+        student_ids_by_fingerprint: Dict[int, str] = {}
+        for row in data.get('students', []):
+            fingerprint_id = parse_fingerprint_id(row.get('fingerprint_id'))
+            if fingerprint_id is None:
+                print(f"Rejected student {row.get('name', '')!r}: invalid fingerprint_id {row.get('fingerprint_id')!r}")
+                rejected['students'] += 1
+                continue
+            student_id = row.get('student_id') or derive_id('student', fingerprint_id)
+            students[student_id] = {
+                'student_id': student_id,
+                'name': row['name'],
+                'fingerprint_id': fingerprint_id,
+                'enrolled_classes': parse_list(row.get('enrolled_classes'))
+            }
+            student_ids_by_fingerprint[fingerprint_id] = student_id
+
+        def resolve(row: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+            student_id = row.get('student_id')
+            if not student_id:
+                fingerprint_id = parse_fingerprint_id(row.get('fingerprint_id'))
+                if fingerprint_id is not None:
+                    student_id = student_ids_by_fingerprint.get(fingerprint_id) or derive_id('student', fingerprint_id)
+            class_id = row.get('class_id')
+            if not class_id and row.get('class_name'):
+                class_id = class_ids_by_name.get(row['class_name']) or derive_id('class', row['class_name'])
+            return student_id, class_id
+
+        # Enrollments listed on a class or student document are enrollments too
+        listed = [{'student_id': student_id, 'class_id': class_id}
+                  for class_id, doc in classes.items() for student_id in doc['enrolled_students']]
+        listed += [{'student_id': student_id, 'class_id': class_id}
+                   for student_id, doc in students.items() for class_id in doc['enrolled_classes']]
+
+        # Fold enrollments into documents written in this run, the rest become array updates
+        class_additions: Dict[str, List[str]] = {}
+        student_additions: Dict[str, List[str]] = {}
+        for index, row in enumerate(listed + data.get('enrollments', [])):
+            student_id, class_id = resolve(row)
+            if not student_id or not class_id:
+                if index >= len(listed):
+                    rejected['enrollments'] += 1
+                continue
+
+            if class_id in classes:
+                if student_id not in classes[class_id]['enrolled_students']:
+                    classes[class_id]['enrolled_students'].append(student_id)
+            elif student_id not in class_additions.get(class_id, []):
+                class_additions.setdefault(class_id, []).append(student_id)
+
+            if student_id in students:
+                if class_id not in students[student_id]['enrolled_classes']:
+                    students[student_id]['enrolled_classes'].append(class_id)
+            elif class_id not in student_additions.get(student_id, []):
+                student_additions.setdefault(student_id, []).append(class_id)
+
+        attendance = []
+        for row in data.get('attendance', []):
+            student_id, class_id = resolve(row)
+            if not student_id or not class_id or not row.get('timestamp'):
+                rejected['attendance'] += 1
+                continue
+            date = row['timestamp'].split(' ')[0]
+            attendance.append({
+                'attendance_id': row.get('attendance_id') or derive_id('attendance', f"{class_id}_{date}_{student_id}"),
+                'student_id': student_id,
+                'class_id': class_id,
+                'timestamp': row['timestamp'],
+                'status': row.get('status', 'present')
+            })
+
+        enrollments = [('array_union', 'classes', class_id, 'enrolled_students', values)
+                       for class_id, values in class_additions.items()]
+        enrollments += [('array_union', 'students', student_id, 'enrolled_classes', values)
+                        for student_id, values in student_additions.items()]
+
+        operations = {
+            'classes': [('set', 'classes', class_id, doc) for class_id, doc in classes.items()],
+            'students': [('set', 'students', student_id, doc) for student_id, doc in students.items()],
+            'enrollments': enrollments,
+            'attendance': [('attendance', record) for record in attendance]
+        }
+        return operations, rejected
+
+    def _run_phase(self, phase: str, operations: List[Tuple]) -> Tuple[int, float]:
+        """Commit the operations of a phase in batches across the worker pool"""
+        batches = [operations[i:i + self.batch_size] for i in range(0, len(operations), self.batch_size)]
+        completed = set(self._checkpoint['completed'].get(phase, []))
+        pending = [(index, batch) for index, batch in enumerate(batches) if index not in completed]
+
+        if completed:
+            print(f"{phase}: resuming, {len(completed)} of {len(batches)} batches already committed")
+
+        start = time.perf_counter()
+        written = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._commit, batch): (index, batch) for index, batch in pending}
+            for future in as_completed(futures):
+                index, batch = futures[future]
+                # Propagate failures, the checkpoint keeps the committed batches
+                future.result()
+                written += len(batch)
+                self._mark_completed(phase, index)
+
+        elapsed = time.perf_counter() - start
+        print(f"{phase}: wrote {written} documents in {len(pending)} batches ({elapsed:.2f}s)")
+        return written, elapsed
+
+    def _commit(self, batch: List[Tuple]):
+        """Commit a batch, retrying transient failures with exponential backoff"""
+        for attempt in range(self.retries):
+            try:
+                self.target.write_batch(batch)
+                self._publish(batch)
+                return
+            except Exception as e:
+                if attempt == self.retries - 1:
+                    raise
+                delay = 0.5 * (2 ** attempt)
+                print(f"Batch commit failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    @staticmethod
+    def _publish(batch: List[Tuple]):
+        """Publish the committed attendance records to live dashboards in this process"""
+        for operation in batch:
+            if operation[0] == 'attendance':
+                publish_attendance(operation[1], source='bulk')
+
+    @staticmethod
+    def _fingerprint(operations: Dict[str, List[Tuple]]) -> str:
+        """Identify the input so a checkpoint is only reused for the same data"""
+        digest = hashlib.sha256()
+        for phase in ENTITIES:
+            digest.update(json.dumps(operations.get(phase, []), sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _load_checkpoint(self, input_hash: str) -> Dict[str, Any]:
+        """Load the checkpoint of a previous run of the same input"""
+        empty = {'input_hash': input_hash, 'target': self.target.name, 'completed': {}}
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return empty
+
+        with open(self.checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+
+        if checkpoint.get('input_hash') != input_hash or checkpoint.get('target') != self.target.name:
+            print("Checkpoint belongs to a different input or target, starting over")
+            return empty
+        return checkpoint
+
+    def _mark_completed(self, phase: str, index: int):
+        """Record a committed batch in the checkpoint file"""
+        with self._checkpoint_lock:
+            self._checkpoint['completed'].setdefault(phase, []).append(index)
+            if not self.checkpoint_path:
+                return
+            tmp_path = self.checkpoint_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._checkpoint, f)
+            os.replace(tmp_path, self.checkpoint_path)
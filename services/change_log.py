@@ -0,0 +1,169 @@
+"""
+Versioned change log of the class and student collections
+
+Every successful class or student write through the data service gets the
+next version number and records which documents it touched. Readers that
+synced at some version ask for the documents changed since then instead of
+downloading everything again.
+
+Versions are only meaningful within one process: a version token carries the
+epoch of the log that issued it, and a token from another epoch, or one older
+than the retained history, asks for a full sync. The log only sees the writes
+made through this process, so changes are only answered when it is complete,
+i.e. when no other process, tool or console writes classes or students: the
+primary backend is private to the process (the in-memory local data service)
+or ROSTER_SINGLE_WRITER is set. Otherwise every sync is a full one. A write whose affected
+documents are not known individually (e.g. deleting a class updates the
+enrollments of its students) is recorded for the whole collection.
+
+The log also keeps the version of the last change of every collection and
+document. They are used as ETags, so clients polling an unchanged list or
+document are answered without reading it again. Each fields projection has
+its own ETag, as it is a different body. Unless the log is complete,
+the ETags also carry the current period of DATA_CACHE_TTL seconds, so a
+write made elsewhere is served at most that late, like from the cache tier.
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, Set
+
+# Documents touched by each write operation, from its arguments and result
+_CHANGES = {
+    'create_class': lambda args, result: [('classes', result)],
+    'update_class': lambda args, result: [('classes', args[0])],
+    'delete_class': lambda args, result: [('classes', args[0]), ('students', None)],
+    'create_student': lambda args, result: [('students', result)],
+    'update_student': lambda args, result: [('students', args[0])],
+    'delete_student': lambda args, result: [('students', args[0]), ('classes', None)],
+    'enroll_student_in_class': lambda args, result: [('students', args[0]), ('classes', args[1])],
+}
+
+
+class ChangeLog:
+    """Monotonically versioned log of the documents changed by writes"""
+
+    def __init__(self, max_entries: int = 10000, complete: bool = False, etag_ttl: float = 60.0):
+        """
+        complete tells that every class and student write goes through this log,
+        otherwise ETags change every etag_ttl seconds
+        """
+        self.complete = complete
+        self.etag_ttl = max(etag_ttl, 1.0)
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        # (version, collection, document_id or None for the whole collection)
+        self._entries: deque = deque(maxlen=max_entries)
+        # Highest version of which entries have been dropped from the history
+        self._dropped = 0
+        # Version of the last change of each collection, of each document and
+        # of the last change to all documents of a collection
+        self._collection_versions: Dict[str, int] = {}
+        self._document_versions: Dict[Tuple[str, str], int] = {}
+        self._collection_wide_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, changes: List[Tuple[str, Optional[str]]]) -> int:
+        """Record the documents changed by one write, returns its version"""
+        with self._lock:
+            self.version += 1
+            for collection, document_id in changes:
+                if len(self._entries) == self._entries.maxlen:
+                    self._dropped = self._entries[0][0]
+                self._entries.append((self.version, collection, document_id))
+                self._collection_versions[collection] = self.version
+                if document_id is None:
+                    self._collection_wide_versions[collection] = self.version
+                    # Older document versions are covered by the collection wide change
+                    for key in [key for key in self._document_versions if key[0] == collection]:
+                        del self._document_versions[key]
+                else:
+                    self._document_versions[(collection, document_id)] = self.version
+            return self.version
+
+    def on_write(self, operation: str, args: Tuple, result: Any):
+        """Data service write listener"""
+        changes = _CHANGES.get(operation)
+        # Failed writes (False or no ID) change nothing
+        if changes is None or not result:
+            return
+        self.record(changes(args, result))
+
+    def changes_since(self, version: int) -> Optional[Dict[str, Set[Optional[str]]]]:
+        """
+        The changed document IDs per collection after a version, None as an ID
+        stands for the whole collection. Returns None when the history does
+        not reach back to the version, or may miss writes made elsewhere.
+        """
+        with self._lock:
+            if not self.complete or version > self.version or version < self._dropped:
+                return None
+
+            changes: Dict[str, Set[Optional[str]]] = {}
+            for entry_version, collection, document_id in reversed(self._entries):
+                if entry_version <= version:
+                    break
+                changes.setdefault(collection, set()).add(document_id)
+            return changes
+
+    def collection_version(self, collection: str) -> int:
+        """Version of the last change to a collection"""
+        return self._collection_versions.get(collection, 0)
+
+    def document_version(self, collection: str, document_id: str) -> int:
+        """Version of the last change to a document"""
+        with self._lock:
+            return max(self._document_versions.get((collection, document_id), 0),
+                       self._collection_wide_versions.get(collection, 0))
+
+    def etag(self, collection: str, document_id: Optional[str] = None, fields: Optional[Tuple[str, ...]] = None) -> str:
+        """Weak ETag of a collection, or of one of its documents, projected to fields when given"""
+        if document_id is None:
+            tag = f"{self.epoch}.{collection}.{self.collection_version(collection)}"
+        else:
+            tag = f"{self.epoch}.{collection}.{document_id}.{self.document_version(collection, document_id)}"
+        if fields:
+            # Every projection is a different representation of the resource
+            tag += f".{hashlib.sha1(','.join(fields).encode()).hexdigest()[:8]}"
+        if not self.complete:
+            # Writes made elsewhere are not versioned, so a tag is only valid for one period
+            tag += f".{int(time.time() // self.etag_ttl)}"
+        return f'W/"{tag}"'
+
+    def token(self, version: Optional[int] = None) -> str:
+        """The version token handed to clients"""
+        return f"{self.epoch}.{self.version if version is None else version}"
+
+    def parse_token(self, token: Optional[str]) -> Optional[int]:
+        """The version of a token issued by this log, None for foreign or malformed tokens"""
+        if not token:
+            return None
+        epoch, _, version = token.partition('.')
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+
+_change_log: Optional[ChangeLog] = None
+_change_log_lock = threading.Lock()
+
+
+def get_change_log() -> ChangeLog:
+    """Get the change log of the shared data service, created on first use"""
+    global _change_log
+    if _change_log is None:
+        with _change_log_lock:
+            if _change_log is None:
+                from services.data_service import get_data_service
+                data_service = get_data_service()
+                complete = (getattr(data_service.primary, 'process_private', False)
+                            or os.environ.get('ROSTER_SINGLE_WRITER', 'false').lower() == 'true')
+                change_log = ChangeLog(complete=complete,
+                                       etag_ttl=float(os.environ.get('DATA_CACHE_TTL', '60')))
+                data_service.add_write_listener(change_log.on_write)
+                _change_log = change_log
+    return _change_log
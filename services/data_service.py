@@ -0,0 +1,464 @@
+"""
+Data service layer
+
+Routes and services talk to a DataService rather than to a storage backend.
+Backends are registered by name and combined into a chain of tiers with the
+DATA_BACKENDS environment variable, e.g.
+
+    DATA_BACKENDS=cache,firebase,local
+
+Reads go through the cache tiers in order and return the first hit. On a
+miss the first storage tier (the primary) answers, and its answer stands
+even when it is None or empty; later storage tiers only answer in place of
+tiers that fail with an error. Cache tiers are filled with what the storage
+tiers returned, and identical reads issued while one is in flight wait for
+its result instead of reading the storage tiers again. Writes go to the
+primary and invalidate the caches. Every tier records its own latency and hit/miss
+counts, so the contribution of each tier is visible in /metrics.
+
+Registered backends:
+
+    firebase  Cloud Firestore
+    sqlite    Local SQLite database at SQLITE_DB_PATH
+    local     In-memory local data service
+    cache     In-process read cache (DATA_CACHE_TTL seconds, DATA_CACHE_SIZE entries)
+
+Without DATA_BACKENDS the single DATA_BACKEND (default firebase) is used,
+followed by the local data service as a fallback for failed reads in
+simulation mode. A backend that fails to be created (e.g. Firestore without
+credentials) is left out of the chain unless it is the last one.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable, Protocol, Set, Tuple, runtime_checkable
+
+from utils.data_util import clone_data
+from utils.metrics import counter, histogram, record_cache_lookup
+from utils.singleflight import SingleFlight
+
+TIER_REQUESTS = counter(
+    'data_service_tier_requests_total',
+    'Data service calls per tier, by operation and result (hit, miss, error or write)',
+    ['tier', 'operation', 'result']
+)
+TIER_DURATION = histogram(
+    'data_service_tier_duration_seconds',
+    'Time spent in each data service tier, by operation',
+    ['tier', 'operation']
+)
+SHARED_READS = counter(
+    'data_service_shared_reads_total',
+    'Reads answered by one storage call shared with identical concurrent reads, by operation',
+    ['operation']
+)
+
+
+@runtime_checkable
+class DataService(Protocol):
+    """The operations every storage backend provides"""
+
+    def create_class(self, class_data: Dict[str, Any]) -> str: ...
+    def get_class(self, class_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]: ...
+    def get_all_classes(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]: ...
+    def update_class(self, class_id: str, class_data: Dict[str, Any]) -> bool: ...
+    def delete_class(self, class_id: str) -> bool: ...
+
+    def create_student(self, student_data: Dict[str, Any]) -> str: ...
+    def get_student(self, student_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]: ...
+    def get_student_by_fingerprint(self, fingerprint_id: int) -> Optional[Dict[str, Any]]: ...
+    def get_all_students(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]: ...
+    def update_student(self, student_id: str, student_data: Dict[str, Any]) -> bool: ...
+    def delete_student(self, student_id: str) -> bool: ...
+    def enroll_student_in_class(self, student_id: str, class_id: str) -> bool: ...
+
+    def create_attendance(self, attendance_data: Dict[str, Any]) -> str: ...
+    def get_attendance(self, class_id: str, date: str) -> Dict[str, Any]: ...
+    def get_student_attendance(self, student_id: str) -> Dict[str, Any]: ...
+    def iter_attendance(self, start_date: Optional[str] = None): ...
+
+    def save_report(self, report: Dict[str, Any], absent_records: List[Dict[str, Any]]) -> bool: ...
+    def get_report(self, class_id: str, date: str) -> Optional[Dict[str, Any]]: ...
+
+
+# Cached reads that any class or student write may change
+ROSTER_READS = ('get_class', 'get_all_classes', 'get_student', 'get_student_by_fingerprint', 'get_all_students')
+
+
+class CacheTier:
+    """In-process LRU cache of read results with a time to live"""
+
+    is_cache = True
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, Tuple[float, Any]]' = OrderedDict()
+        # operation -> keys of its entries, so invalidation never scans the whole cache
+        self._keys: Dict[str, Set[Tuple]] = {}
+        # operation -> number of invalidations, a result read across one is not stored
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, operation: str, args: Tuple) -> Tuple[bool, Any]:
+        """Return (hit, value) for a read; the value is a private copy"""
+        key = (operation,) + args
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                record_cache_lookup('data_service', False)
+                return False, None
+            self._entries.move_to_end(key)
+
+        record_cache_lookup('data_service', True)
+        return True, clone_data(entry[1])
+
+    def generation(self, operation: str) -> int:
+        """The invalidation count of operation, taken before a read and passed to store"""
+        with self._lock:
+            return self._generations.get(operation, 0)
+
+    def store(self, operation: str, args: Tuple, value: Any, hold: float = 0.0, generation: Optional[int] = None):
+        """
+        Remember the result of a read, for hold seconds longer than the TTL when given
+        The result is dropped if operation was invalidated since generation was taken
+        """
+        key = (operation,) + args
+        with self._lock:
+            if generation is not None and generation != self._generations.get(operation, 0):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl + hold, clone_data(value))
+            self._entries.move_to_end(key)
+            self._keys.setdefault(operation, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, operations: Tuple[str, ...], args: Optional[Set[Tuple]] = None):
+        """Drop the cached results of operations, only those called with one of args when given"""
+        with self._lock:
+            for operation in operations:
+                self._generations[operation] = self._generations.get(operation, 0) + 1
+                if args is None:
+                    keys = list(self._keys.get(operation, ()))
+                else:
+                    keys = [(operation,) + read_args for read_args in args]
+                for key in keys:
+                    if key in self._entries:
+                        self._remove(key)
+
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def _remove(self, key: Tuple):
+        """Drop an entry, the lock must be held"""
+        del self._entries[key]
+        keys = self._keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[0]]
+
+
+class TieredDataService:
+    """A DataService reading through a chain of tiers and writing to the primary one"""
+
+    def __init__(self, tiers: List[Tuple[str, Any]]):
+        """tiers is a list of (name, backend) in read order"""
+        self.tiers = tiers
+        self.caches = [(name, tier) for name, tier in tiers if getattr(tier, 'is_cache', False)]
+        self.storage = [(name, tier) for name, tier in tiers if not getattr(tier, 'is_cache', False)]
+        if not self.storage:
+            raise ValueError("At least one storage backend is required")
+
+        self.primary_name, self.primary = self.storage[0]
+        # Concurrent identical reads that miss the caches share one storage read
+        self._flights = SingleFlight()
+        self._write_listeners: List[Callable[[str, Tuple, Any], None]] = []
+
+    def add_write_listener(self, listener: Callable[[str, Tuple, Any], None]):
+        """Call listener(operation, args, result) after every successful write"""
+        self._write_listeners.append(listener)
+
+    # Class operations
+    def create_class(self, class_data: Dict[str, Any]) -> str:
+        return self._write('create_class', class_data)
+
+    def get_class(self, class_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        return self._read('get_class', class_id, *_projection(fields))
+
+    def get_all_classes(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        return self._read('get_all_classes', *_projection(fields))
+
+    def update_class(self, class_id: str, class_data: Dict[str, Any]) -> bool:
+        return self._write('update_class', class_id, class_data)
+
+    def delete_class(self, class_id: str) -> bool:
+        return self._write('delete_class', class_id)
+
+    # Student operations
+    def create_student(self, student_data: Dict[str, Any]) -> str:
+        return self._write('create_student', student_data)
+
+    def get_student(self, student_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        return self._read('get_student', student_id, *_projection(fields))
+
+    def get_student_by_fingerprint(self, fingerprint_id: int) -> Optional[Dict[str, Any]]:
+        return self._read('get_student_by_fingerprint', fingerprint_id)
+
+    def get_all_students(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        return self._read('get_all_students', *_projection(fields))
+
+    def update_student(self, student_id: str, student_data: Dict[str, Any]) -> bool:
+        return self._write('update_student', student_id, student_data)
+
+    def delete_student(self, student_id: str) -> bool:
+        return self._write('delete_student', student_id)
+
+    def enroll_student_in_class(self, student_id: str, class_id: str) -> bool:
+        return self._write('enroll_student_in_class', student_id, class_id)
+
+    # Attendance operations
+    def create_attendance(self, attendance_data: Dict[str, Any]) -> str:
+        return self._write('create_attendance', attendance_data)
+
+    def get_attendance(self, class_id: str, date: str) -> Dict[str, Any]:
+        return self._read('get_attendance', class_id, date)
+
+    def get_student_attendance(self, student_id: str) -> Dict[str, Any]:
+        return self._read('get_student_attendance', student_id)
+
+    def iter_attendance(self, start_date: Optional[str] = None):
+        """Stream attendance from the primary backend"""
+        return self.primary.iter_attendance(start_date)
+
+    # Report operations
+    def save_report(self, report: Dict[str, Any], absent_records: List[Dict[str, Any]]) -> bool:
+        return self._write('save_report', report, absent_records)
+
+    def get_report(self, class_id: str, date: str) -> Optional[Dict[str, Any]]:
+        return self._read('get_report', class_id, date)
+
+    def prewarm(self, class_ids: List[str], hold: float = 0.0) -> int:
+        """
+        Load all classes and the students enrolled in class_ids into the cache
+        tiers, by ID and by fingerprint, for hold seconds longer than their TTL.
+        Returns the number of students loaded.
+        """
+        if not self.caches:
+            return 0
+
+        # One query warms every class a scanning student may be enrolled in.
+        # Generations are taken before each read, so nothing read across a
+        # roster write is cached, least of all for the extra hold
+        generations = self._generations('get_class')
+        classes = self._read_storage('get_all_classes', (), hold)
+        for class_id, class_info in classes.items():
+            self._store('get_class', (class_id,), class_info, hold, generations)
+
+        student_ids = {student_id for class_id in class_ids
+                       for student_id in (classes.get(class_id) or {}).get('enrolled_students', [])}
+        for student_id in student_ids:
+            generations = self._generations('get_student_by_fingerprint')
+            student = self._read_storage('get_student', (student_id,), hold)
+            if student and student.get('fingerprint_id') is not None:
+                self._store('get_student_by_fingerprint', (student['fingerprint_id'],), student, hold, generations)
+        return len(student_ids)
+
+    def _read(self, operation: str, *args):
+        """Return the first hit from the tiers, filling the caches in front of it"""
+        for name, cache in self.caches:
+            hit, value = cache.lookup(operation, args)
+            TIER_REQUESTS.labels(name, operation, 'hit' if hit else 'miss').inc()
+            if hit:
+                return value
+
+        value, shared = self._flights.do((operation,) + args, lambda: self._read_storage(operation, args))
+        if shared:
+            SHARED_READS.labels(operation).inc()
+            return clone_data(value)
+        return value
+
+    def _read_storage(self, operation: str, args: Tuple, hold: float = 0.0):
+        """Return the answer of the first storage tier that does not fail and fill the caches with it"""
+        generations = self._generations(operation)
+        value = None
+        error = None
+        answered = False
+        for name, backend in self.storage:
+            start = time.perf_counter()
+            try:
+                value = getattr(backend, operation)(*args)
+            except Exception as e:
+                # A failing tier is skipped, the error surfaces if no tier answers
+                TIER_REQUESTS.labels(name, operation, 'error').inc()
+                print(f"DataService: {name} failed on {operation}: {str(e)}")
+                error = e
+                continue
+            finally:
+                TIER_DURATION.labels(name, operation).observe(time.perf_counter() - start)
+
+            # A miss is authoritative too, e.g. a student deleted from the primary
+            # must not be served from stale data in a later tier
+            answered = True
+            TIER_REQUESTS.labels(name, operation, 'hit' if value else 'miss').inc()
+            break
+
+        if not answered:
+            raise error
+
+        if value:
+            self._store(operation, args, value, hold, generations)
+        return value
+
+    def _generations(self, operation: str) -> List[int]:
+        """The generation of operation in every cache tier, taken before a storage read"""
+        return [cache.generation(operation) for _, cache in self.caches]
+
+    def _store(self, operation: str, args: Tuple, value: Any, hold: float = 0.0,
+               generations: Optional[List[int]] = None):
+        """Fill the caches, except those invalidated for operation since generations were taken"""
+        for index, (_, cache) in enumerate(self.caches):
+            cache.store(operation, args, value, hold, generations[index] if generations else None)
+
+    def _write(self, operation: str, *args):
+        """Apply a write to the primary backend, then invalidate caches and notify listeners"""
+        start = time.perf_counter()
+        try:
+            result = getattr(self.primary, operation)(*args)
+        finally:
+            TIER_DURATION.labels(self.primary_name, operation).observe(time.perf_counter() - start)
+        TIER_REQUESTS.labels(self.primary_name, operation, 'write').inc()
+
+        self._invalidate(operation, args)
+
+        for listener in self._write_listeners:
+            try:
+                listener(operation, args, result)
+            except Exception as e:
+                print(f"DataService: write listener failed on {operation}: {str(e)}")
+
+        return result
+
+    def _invalidate(self, operation: str, args: Tuple):
+        """Drop the cached and in flight reads a write may have changed"""
+        for operations, read_args in self._changed_reads(operation, args):
+            self._flights.forget(lambda key: key[0] in operations and (read_args is None or key[1:] in read_args))
+            for _, cache in self.caches:
+                cache.invalidate(operations, read_args)
+
+    def _changed_reads(self, operation: str, args: Tuple) -> List[Tuple[Tuple[str, ...], Optional[Set[Tuple]]]]:
+        """The reads a write may have changed as (operations, args), all calls of the operations when args is None"""
+        if operation == 'create_attendance':
+            records = [args[0]]
+        elif operation == 'save_report':
+            report, records = args
+        else:
+            # Classes and students reference each other, so any roster write
+            # invalidates all roster reads
+            return [(ROSTER_READS, None)]
+
+        days = {(record.get('class_id'), record.get('timestamp', '').split(' ')[0]) for record in records}
+        students = {(record.get('student_id'),) for record in records}
+        changed = [(('get_attendance',), days), (('get_student_attendance',), students)]
+        if operation == 'save_report':
+            changed.append((('get_report',), {(report['class_id'], report['date'])}))
+        return changed
+
+
+def _projection(fields: Optional[Tuple[str, ...]]) -> Tuple:
+    """Trailing read arguments for a field projection, the whole document needs none"""
+    return (tuple(fields),) if fields else ()
+
+
+# Backend registry
+_BACKENDS: Dict[str, Callable[[], Any]] = {}
+
+
+def register_backend(name: str, factory: Callable[[], Any]):
+    """Register a factory creating the backend selected by name in DATA_BACKENDS"""
+    _BACKENDS[name] = factory
+
+
+def _firebase_backend():
+    from services.firebase_service import FirebaseService
+    return FirebaseService()
+
+
+def _sqlite_backend():
+    from services.sqlite_data_service import SQLiteDataService
+    return SQLiteDataService()
+
+
+def _local_backend():
+    from services.local_data_service import LocalDataService
+    return LocalDataService()
+
+
+def _cache_backend():
+    return CacheTier(
+        ttl=float(os.environ.get('DATA_CACHE_TTL', '60')),
+        max_entries=int(os.environ.get('DATA_CACHE_SIZE', '10000'))
+    )
+
+
+register_backend('firebase', _firebase_backend)
+register_backend('sqlite', _sqlite_backend)
+register_backend('local', _local_backend)
+register_backend('cache', _cache_backend)
+
+
+def configured_backends() -> List[str]:
+    """The backend names in read order, from DATA_BACKENDS or DATA_BACKEND"""
+    names = os.environ.get('DATA_BACKENDS')
+    if names:
+        return [name.strip().lower() for name in names.split(',') if name.strip()]
+
+    names = [os.environ.get('DATA_BACKEND', 'firebase').lower()]
+    if os.environ.get('FIREBASE_SIMULATION', 'false').lower() == 'true' and 'local' not in names:
+        names.append('local')
+    return names
+
+
+def create_data_service(names: Optional[List[str]] = None) -> TieredDataService:
+    """Create a data service from backend names, by default the configured ones"""
+    names = names or configured_backends()
+    tiers = []
+    for index, name in enumerate(names):
+        if name not in _BACKENDS:
+            raise ValueError(f"Unknown data backend {name}, use one of {', '.join(_BACKENDS)}")
+        try:
+            tiers.append((name, _BACKENDS[name]()))
+        except Exception as e:
+            # A backend that cannot be created is left out while later ones can take its place
+            if index == len(names) - 1:
+                raise
+            print(f"DataService: leaving out {name}, it could not be created: {str(e)}")
+
+    print(f"DataService: using {' -> '.join(name for name, _ in tiers)}")
+    return TieredDataService(tiers)
+
+
+_data_service: Optional[TieredDataService] = None
+_data_service_lock = threading.Lock()
+
+
+def get_data_service() -> TieredDataService:
+    """Get the shared data service of the configured backends"""
+    global _data_service
+    if _data_service is None:
+        with _data_service_lock:
+            if _data_service is None:
+                _data_service = create_data_service()
+    return _data_service
+
+
+def set_data_service(service: Optional[TieredDataService]):
+    """Replace the shared data service, e.g. with one over pre-seeded backends"""
+    global _data_service
+    _data_service = service
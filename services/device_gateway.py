@@ -0,0 +1,263 @@
+"""
+Gateway for fingerprint readers holding a persistent WebSocket connection
+
+A reader keeps one connection open and exchanges JSON messages over it
+instead of opening an HTTP request per scan:
+
+    reader -> server
+        {"type": "scan", "id": 7, "fingerprint_id": 12, "timestamp": "2024-09-02 09:01:13"}
+        {"type": "ack", "id": "<command id>", "ok": true, "detail": "..."}
+        {"type": "ping", "id": 8}
+        {"type": "pong", "id": "<ping id>"}
+
+    server -> reader
+        {"type": "hello", "device_id": "...", "heartbeat_interval": 30}
+        {"type": "scan_result", "id": 7, "ok": true, "name": "...", "class_name": "..."}
+        {"type": "command", "id": "<command id>", "command": "enroll", "fingerprint_id": 12}
+        {"type": "ping", "id": "<ping id>"}
+        {"type": "pong", "id": 8, "server_time": "2024-09-02 09:01:14"}
+        {"type": "error", "id": 7, "error": "..."}
+
+Readers authenticate with their device token when connecting, see
+routes/device_routes.py. A device ID has one connection at a time: another
+connection with the same ID is refused until the first one closes, which a
+reader that went away without closing does after two heartbeat intervals.
+Acknowledgements are only accepted for commands sent on the same connection.
+
+The timestamp of a scan is optional, readers that buffered scans while offline
+send the time of the scan. When a connection has been idle for the heartbeat
+interval the server pings the reader and closes the connection if the next
+interval passes without any message. Ping round trips and scan handling times
+are recorded per device for the readers in the device registry, all other
+readers share the "unknown" label so clients cannot create metric series.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, Any, Optional, Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from services.device_registry import get_device_registry
+from utils.metrics import counter, gauge, histogram
+
+DEVICE_CONNECTIONS = gauge(
+    'device_connections',
+    'Readers currently connected to the device gateway'
+)
+DEVICE_CONNECTIONS_OPENED = counter(
+    'device_connections_opened_total',
+    'Reader connections accepted by the device gateway'
+)
+DEVICE_MESSAGES = counter(
+    'device_messages_total',
+    'Messages exchanged with readers, by direction and type',
+    ['direction', 'type']
+)
+DEVICE_ROUND_TRIP = histogram(
+    'device_round_trip_seconds',
+    'Round trip time of server pings and commands, by registered device',
+    ['device_id']
+)
+DEVICE_SCAN_DURATION = histogram(
+    'device_scan_duration_seconds',
+    'Time from receiving a scan on the gateway to sending its result, by registered device',
+    ['device_id']
+)
+
+# Commands a reader understands
+COMMANDS = ('enroll', 'delete')
+
+
+class DeviceConnection:
+    """A connected reader"""
+
+    def __init__(self, device_id: str, websocket):
+        self.device_id = device_id
+        # Device IDs come from the connection path, only registered ones label metrics
+        self.metric_label = device_id if get_device_registry().is_registered(device_id) else 'unknown'
+        self.websocket = websocket
+        self.connected_at = time.time()
+        self.last_seen = time.time()
+        self.pending_ping: Optional[tuple] = None
+        self.ping_unanswered = False
+        self.pending_commands: Dict[str, Dict[str, Any]] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: Dict[str, Any]):
+        """Send a message, serialized with sends from other tasks"""
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+        DEVICE_MESSAGES.labels('out', message.get('type', 'unknown')).inc()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            'device_id': self.device_id,
+            'connected_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.connected_at)),
+            'last_seen': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_seen)),
+            'pending_commands': len(self.pending_commands)
+        }
+
+
+class DeviceGateway:
+    """Keeps track of connected readers and handles their messages"""
+
+    def __init__(self, heartbeat_interval: float = 30.0):
+        self.heartbeat_interval = heartbeat_interval
+        self.connections: Dict[str, DeviceConnection] = {}
+
+    async def serve(self, device_id: str, websocket, attendance_service):
+        """Serve a reader connection until it closes or stops answering"""
+        from starlette.websockets import WebSocketDisconnect
+
+        if device_id in self.connections:
+            # Never taken over, the open connection ends when its reader stops answering
+            print(f"Device {device_id} is already connected, refusing another connection")
+            await websocket.close(code=1008)
+            return
+
+        connection = DeviceConnection(device_id, websocket)
+        self.connections[device_id] = connection
+        DEVICE_CONNECTIONS.inc()
+        DEVICE_CONNECTIONS_OPENED.inc()
+
+        try:
+            await websocket.accept()
+            print(f"Device {device_id} connected")
+            await connection.send({'type': 'hello', 'device_id': device_id, 'heartbeat_interval': self.heartbeat_interval})
+            while True:
+                try:
+                    message = await asyncio.wait_for(websocket.receive_json(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    if connection.ping_unanswered:
+                        print(f"Device {device_id} stopped answering, closing connection")
+                        break
+                    ping_id = uuid.uuid4().hex
+                    connection.pending_ping = (ping_id, time.perf_counter())
+                    connection.ping_unanswered = True
+                    await connection.send({'type': 'ping', 'id': ping_id})
+                    continue
+                except (ValueError, KeyError):
+                    # Not JSON, a bad message does not end the connection
+                    await connection.send({'type': 'error', 'error': 'Messages must be JSON objects'})
+                    continue
+
+                connection.last_seen = time.time()
+                connection.ping_unanswered = False
+                await self._handle(connection, message, attendance_service)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"Device {device_id} connection error: {str(e)}")
+        finally:
+            await self._close(connection)
+            if self.connections.get(device_id) is connection:
+                del self.connections[device_id]
+                DEVICE_CONNECTIONS.dec()
+            for pending in connection.pending_commands.values():
+                if not pending['future'].done():
+                    pending['future'].set_result({'ok': False, 'detail': 'Device disconnected'})
+            print(f"Device {device_id} disconnected")
+
+    async def _handle(self, connection: DeviceConnection, message: Dict[str, Any], attendance_service):
+        """Handle one message from a reader"""
+        message_type = message.get('type') if isinstance(message, dict) else None
+        DEVICE_MESSAGES.labels('in', message_type or 'unknown').inc()
+
+        if message_type == 'scan':
+            await self._handle_scan(connection, message, attendance_service)
+        elif message_type == 'ack':
+            # Only commands sent on this connection are acknowledged, anything else is ignored
+            pending = connection.pending_commands.pop(str(message.get('id')), None)
+            if pending is None:
+                return
+            DEVICE_ROUND_TRIP.labels(connection.metric_label).observe(time.perf_counter() - pending['sent'])
+            ack = {'ok': bool(message.get('ok')), 'detail': message.get('detail')}
+            if pending['on_ack'] is not None:
+                try:
+                    # on_ack may write to the data service
+                    await run_in_threadpool(pending['on_ack'], ack)
+                except Exception as e:
+                    print(f"Device {connection.device_id}: error handling acknowledgement: {str(e)}")
+            if not pending['future'].done():
+                pending['future'].set_result(ack)
+        elif message_type == 'ping':
+            await connection.send({'type': 'pong', 'id': message.get('id'), 'server_time': time.strftime('%Y-%m-%d %H:%M:%S')})
+        elif message_type == 'pong':
+            if connection.pending_ping is not None and connection.pending_ping[0] == message.get('id'):
+                DEVICE_ROUND_TRIP.labels(connection.metric_label).observe(time.perf_counter() - connection.pending_ping[1])
+                connection.pending_ping = None
+        else:
+            await connection.send({'type': 'error', 'id': message.get('id') if isinstance(message, dict) else None,
+                                   'error': f"Unknown message type: {message_type}"})
+
+    async def _handle_scan(self, connection: DeviceConnection, message: Dict[str, Any], attendance_service):
+        """Record attendance for a scan and send the result"""
+        start = time.perf_counter()
+        try:
+            fingerprint_id = int(message['fingerprint_id'])
+        except (KeyError, TypeError, ValueError):
+            await connection.send({'type': 'error', 'id': message.get('id'), 'error': 'fingerprint_id is required'})
+            return
+
+        try:
+            result = await run_in_threadpool(attendance_service.record_attendance, fingerprint_id, message.get('timestamp'))
+        except Exception as e:
+            result = {'error': f"Error recording attendance: {str(e)}"}
+
+        if 'error' in result:
+            reply = {'type': 'scan_result', 'id': message.get('id'), 'ok': False, 'error': result['error']}
+        else:
+            reply = {'type': 'scan_result', 'id': message.get('id'), 'ok': True, **result}
+        await connection.send(reply)
+        DEVICE_SCAN_DURATION.labels(connection.metric_label).observe(time.perf_counter() - start)
+
+    async def send_command(self, device_id: str, command: str, fingerprint_id: int, wait: float = 0.0,
+                           on_ack: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Push a command to a connected reader, on_ack is called with the acknowledgement in a worker thread
+        Returns None if the reader is not connected, otherwise the command ID and,
+        when waiting, the acknowledgement of the reader
+        """
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command}, use one of {', '.join(COMMANDS)}")
+
+        connection = self.connections.get(device_id)
+        if connection is None:
+            return None
+
+        command_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        connection.pending_commands[command_id] = {'future': future, 'sent': time.perf_counter(), 'on_ack': on_ack}
+        await connection.send({'type': 'command', 'id': command_id, 'command': command, 'fingerprint_id': fingerprint_id})
+
+        result = {'command_id': command_id, 'status': 'sent'}
+        if wait > 0:
+            try:
+                ack = await asyncio.wait_for(asyncio.shield(future), wait)
+                result.update(status='acknowledged' if ack['ok'] else 'failed', detail=ack['detail'])
+            except asyncio.TimeoutError:
+                result['status'] = 'timeout'
+        return result
+
+    def connected_devices(self):
+        return [connection.info() for connection in self.connections.values()]
+
+    async def _close(self, connection: DeviceConnection):
+        try:
+            await connection.websocket.close()
+        except Exception:
+            pass
+
+
+_gateway: Optional[DeviceGateway] = None
+
+
+def get_device_gateway() -> DeviceGateway:
+    """Get the device gateway of the process"""
+    global _gateway
+    if _gateway is None:
+        _gateway = DeviceGateway(heartbeat_interval=float(os.environ.get('DEVICE_HEARTBEAT_INTERVAL', '30')))
+    return _gateway
@@ -0,0 +1,86 @@
+"""
+Registry of the fingerprint readers installed on campus
+
+Maps reader IDs to the room they are mounted in. The registry is a JSON file
+at DEVICE_REGISTRY_PATH,
+
+    {"reader-a101": {"room_number": "A101", "name": "A101 front door", "token": "..."}}
+
+that is re-read when it changes. Readers not in the registry are assumed to be
+named after their room, so a reader with ID "A101" serves room A101.
+
+Readers authenticate with the token of their entry, or with the token shared
+by all readers in DEVICE_TOKEN when their entry has none.
+"""
+
+import hmac
+import json
+import os
+import threading
+from typing import Dict, Any, Optional
+
+
+class DeviceRegistry:
+    """Reader ID to room lookup backed by a JSON file"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Reload the registry file if it changed"""
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            try:
+                with open(self.path, 'r') as f:
+                    devices = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading device registry {self.path}: {str(e)}")
+                return
+            self._devices = {str(device_id): info for device_id, info in devices.items()}
+            self._mtime = mtime
+
+    def get_device(self, device_id: str) -> Dict[str, Any]:
+        """The registry entry of a reader, with the room falling back to its ID"""
+        self._refresh()
+        device = dict(self._devices.get(device_id, {}))
+        device['device_id'] = device_id
+        device.setdefault('room_number', device_id)
+        return device
+
+    def is_registered(self, device_id: str) -> bool:
+        """Whether the reader is listed in the registry file"""
+        self._refresh()
+        return device_id in self._devices
+
+    def authenticate(self, device_id: str, token: Optional[str]) -> bool:
+        """Whether token is the token of the reader, always False without a configured one"""
+        self._refresh()
+        expected = self._devices.get(device_id, {}).get('token') or os.environ.get('DEVICE_TOKEN')
+        if not expected or not token:
+            return False
+        return hmac.compare_digest(str(expected).encode(), token.encode())
+
+    def room_of(self, device_id: str) -> str:
+        return self.get_device(device_id)['room_number']
+
+
+_registry: Optional[DeviceRegistry] = None
+
+
+def get_device_registry() -> DeviceRegistry:
+    """Get the device registry at DEVICE_REGISTRY_PATH"""
+    global _registry
+    if _registry is None:
+        _registry = DeviceRegistry(os.environ.get('DEVICE_REGISTRY_PATH'))
+    return _registry
@@ -0,0 +1,141 @@
+"""
+In-process event bus for live attendance updates
+
+Attendance writes publish check-in events here and the Server-Sent Events
+endpoint streams them to dashboards. Publishing is thread safe and never
+blocks: every subscriber has a bounded queue on its own event loop, and a
+subscriber that falls behind loses its oldest events instead of slowing down
+the scan path. The most recent events are kept so a reconnecting client can
+resume from the last event ID it received.
+"""
+
+import asyncio
+import itertools
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+from utils.metrics import counter, gauge
+
+EVENTS_PUBLISHED = counter(
+    'event_bus_events_published_total',
+    'Events published on the in-process event bus, by type',
+    ['type']
+)
+EVENTS_DROPPED = counter(
+    'event_bus_events_dropped_total',
+    'Events dropped because a subscriber queue was full'
+)
+SUBSCRIBERS = gauge(
+    'event_bus_subscribers',
+    'Open event bus subscriptions'
+)
+
+
+class Subscription:
+    """The queue of events delivered to one subscriber"""
+
+    def __init__(self, bus: 'EventBus', class_id: Optional[str], max_queued: int):
+        self.bus = bus
+        self.class_id = class_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.loop = asyncio.get_running_loop()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """Whether the subscriber wants an event"""
+        return self.class_id is None or event['data'].get('class_id') == self.class_id
+
+    def deliver(self, event: Dict[str, Any]):
+        """Queue an event, dropping the oldest one when the queue is full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            EVENTS_DROPPED.inc()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the next event, None when the timeout passes first"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """Publish/subscribe of events within the process"""
+
+    def __init__(self, history: int = 256):
+        self._subscriptions: List[Subscription] = []
+        self._history: deque = deque(maxlen=history)
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self, class_id: Optional[str] = None, last_event_id: Optional[int] = None,
+                  max_queued: int = 100) -> Subscription:
+        """
+        Subscribe from within an event loop, optionally to one class only
+        Events after last_event_id that are still in the history are queued first
+        """
+        subscription = Subscription(self, class_id, max_queued)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._history:
+                    if event['id'] > last_event_id and subscription.matches(event):
+                        subscription.deliver(event)
+            self._subscriptions.append(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+        SUBSCRIBERS.dec()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Publish an event from any thread, returns the event with its ID"""
+        with self._lock:
+            event = {'id': next(self._sequence), 'type': event_type, 'data': data}
+            self._history.append(event)
+            subscriptions = [s for s in self._subscriptions if s.matches(event)]
+        EVENTS_PUBLISHED.labels(event_type).inc()
+
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop is closed
+                self.unsubscribe(subscription)
+        return event
+
+
+def publish_attendance(record: Dict[str, Any], student_name: Optional[str] = None,
+                       class_name: Optional[str] = None, source: str = 'scan'):
+    """Publish a check-in event for a stored attendance record"""
+    get_event_bus().publish('attendance', {
+        'attendance_id': record.get('attendance_id'),
+        'student_id': record.get('student_id'),
+        'student_name': student_name,
+        'class_id': record.get('class_id'),
+        'class_name': class_name,
+        'timestamp': record.get('timestamp'),
+        'status': record.get('status', 'present'),
+        'source': source
+    })
+
+
+_event_bus: Optional[EventBus] = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    """Get the shared event bus of the process"""
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                _event_bus = EventBus()
+    return _event_bus
@@ -0,0 +1,196 @@
+"""
+Attendance export service for offline analytics
+
+This service streams attendance records out of Firestore or the local data
+service and writes them as Parquet files partitioned by date, so analytics
+jobs can read compact columnar data instead of paging through the REST API.
+
+Exported days are not final: readers sync offline scans late, records are
+corrected and absent records are added when rolls are closed. The last
+revisit_days days before today are read again on every run, and a day is
+rewritten when its records differ from the export, which the manifest keeps
+a digest of. Older changes need a full export.
+"""
+
+import hashlib
+import os
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+
+# Parquet support is optional, the rest of the application works without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+MANIFEST_FILE = '_manifest.json'
+
+
+def _attendance_schema():
+    """Arrow schema for exported attendance records"""
+    # Identifier columns repeat heavily within a day, so store them
+    # dictionary-encoded to keep the files small
+    return pa.schema([
+        ('attendance_id', pa.string()),
+        ('class_id', pa.dictionary(pa.int32(), pa.string())),
+        ('student_id', pa.dictionary(pa.int32(), pa.string())),
+        ('timestamp', pa.timestamp('s')),
+        ('status', pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+class AttendanceExportService:
+    """Service to export attendance history into date-partitioned Parquet files"""
+
+    def __init__(self, data_service, output_dir: str, compression: str = 'zstd', revisit_days: int = 7):
+        """
+        Initialize the export service
+        data_service can be any service providing iter_attendance (Firebase or local),
+        exported days of the last revisit_days days are rewritten when they changed
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is required for Parquet export, install it with 'pip install pyarrow'")
+
+        self.data_service = data_service
+        self.output_dir = output_dir
+        self.compression = compression
+        self.schema = _attendance_schema()
+        self.revisit_days = max(revisit_days, 0)
+
+    def export(self, include_today: bool = False, full: bool = False) -> Dict[str, Any]:
+        """
+        Export attendance records into one partition per date
+        Only days after the last exported day, and days of the last revisit_days
+        days whose records changed, are written unless full is True.
+        The current day is skipped by default because it may still receive check-ins,
+        when it is included it is rewritten on the next run.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        manifest = self._empty_manifest() if full else self._load_manifest()
+
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        revisit_from = (now - timedelta(days=self.revisit_days)).strftime('%Y-%m-%d')
+
+        # Resume from the last complete day, the oldest partial day or the
+        # first revisited day, whichever is earliest
+        start_date = None
+        if manifest['exported_dates'] or manifest['partial_dates']:
+            start_date = min(manifest['partial_dates'][:1] + manifest['exported_dates'][-1:] + [revisit_from])
+
+        exported = set(manifest['exported_dates'])
+
+        summary = {'dates': [], 'records': 0}
+        current_date = None
+        rows: List[Dict[str, Any]] = []
+
+        for record in self.data_service.iter_attendance(start_date):
+            date = record.get('timestamp', '').split(' ')[0]
+
+            # Skip days exported before the revisited ones and days still in progress
+            if not date or (date in exported and date < revisit_from) or (date >= today and not include_today):
+                continue
+
+            if date != current_date:
+                self._export_day(current_date, rows, manifest, today, summary)
+                current_date = date
+                rows = []
+
+            rows.append(record)
+
+        self._export_day(current_date, rows, manifest, today, summary)
+        return summary
+
+    def _export_day(self, date: Optional[str], rows: List[Dict[str, Any]], manifest: Dict[str, Any],
+                    today: str, summary: Dict[str, Any]):
+        """Write the records of a day unless they are exported already"""
+        if not rows:
+            return
+        digest = self._digest(rows)
+        if date in manifest['exported_dates'] and manifest['digests'].get(date) == digest:
+            return
+
+        self._write_partition(date, rows, manifest, today, digest)
+        summary['dates'].append(date)
+        summary['records'] += len(rows)
+
+    def _write_partition(self, date: str, rows: List[Dict[str, Any]], manifest: Dict[str, Any], today: str,
+                         digest: str):
+        """Write the records of a single day and record the day and its digest in the manifest"""
+        table = pa.table({
+            'attendance_id': [row.get('attendance_id') for row in rows],
+            'class_id': [row.get('class_id') for row in rows],
+            'student_id': [row.get('student_id') for row in rows],
+            'timestamp': [self._parse_timestamp(row.get('timestamp')) for row in rows],
+            'status': [row.get('status', 'present') for row in rows],
+        }, schema=self.schema)
+
+        partition_dir = os.path.join(self.output_dir, f"date={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        path = os.path.join(partition_dir, 'part-0000.parquet')
+
+        # Write to a temporary file first so readers never see a partial file
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression=self.compression, use_dictionary=True)
+        os.replace(tmp_path, path)
+
+        # Days that are not over yet are exported again on the next run
+        key = 'partial_dates' if date >= today else 'exported_dates'
+        for dates_key in ('partial_dates', 'exported_dates'):
+            if date in manifest[dates_key]:
+                manifest[dates_key].remove(date)
+        manifest[key].append(date)
+        manifest[key].sort()
+        manifest['digests'][date] = digest
+        self._save_manifest(manifest)
+
+        print(f"Exported {len(rows)} attendance records for {date} to {path}")
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """Load the list of already exported dates"""
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return self._empty_manifest()
+
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+
+        manifest.setdefault('exported_dates', [])
+        manifest.setdefault('partial_dates', [])
+        # Days exported before digests were kept are rewritten once when revisited
+        manifest.setdefault('digests', {})
+        return manifest
+
+    @staticmethod
+    def _empty_manifest() -> Dict[str, Any]:
+        """Manifest of an export directory without any exported days"""
+        return {'exported_dates': [], 'partial_dates': [], 'digests': {}}
+
+    @staticmethod
+    def _digest(rows: List[Dict[str, Any]]) -> str:
+        """Digest of the exported columns of a day's records, independent of their order"""
+        digest = hashlib.sha256()
+        for row in sorted((str(row.get('attendance_id')), str(row.get('class_id')), str(row.get('student_id')),
+                           str(row.get('timestamp')), str(row.get('status', 'present'))) for row in rows):
+            digest.update('\x1f'.join(row).encode())
+            digest.update(b'\x1e')
+        return digest.hexdigest()
+
+    def _save_manifest(self, manifest: Dict[str, Any]):
+        """Persist the list of exported dates"""
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+        """Parse a stored timestamp string, returning None if it is invalid"""
+        try:
+            return datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            return None
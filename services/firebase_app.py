@@ -0,0 +1,64 @@
+"""
+Firebase Admin SDK initialization
+
+The Firebase app is initialized once, on first use, by whichever of the
+Firestore service or the authentication dependency needs it first.
+"""
+
+import os
+import threading
+
+_init_lock = threading.Lock()
+
+
+def initialize_firebase():
+    """Initialize the default Firebase app if that has not happened yet"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    if firebase_admin._apps:
+        return
+
+    with _init_lock:
+        if firebase_admin._apps:
+            return
+
+        cred_path = os.environ.get('FIREBASE_CREDENTIALS_PATH', 'firebase_config/credentials.json')
+        project_id = os.environ.get('FIREBASE_PROJECT_ID', 'fingerprint-attendance-system')
+        simulation_mode = os.environ.get('FIREBASE_SIMULATION', 'false').lower() == 'true'
+
+        # Log initialization details
+        print(f"Initializing Firebase with credentials from: {cred_path}")
+        print(f"Project ID: {project_id}")
+        print(f"Simulation mode: {simulation_mode}")
+
+        # Use simulation mode (no actual Firebase connection)
+        if simulation_mode:
+            try:
+                firebase_admin.initialize_app(options={
+                    'projectId': project_id
+                })
+                print("Firebase initialized in simulation mode")
+            except Exception as e:
+                print(f"Error initializing Firebase in simulation mode: {str(e)}")
+        # Try to use real credentials
+        elif os.path.exists(cred_path):
+            try:
+                cred = credentials.Certificate(cred_path)
+                firebase_admin.initialize_app(cred, {
+                    'projectId': project_id
+                })
+                print("Firebase initialized successfully with credentials file")
+            except Exception as e:
+                print(f"Error initializing Firebase with credentials: {str(e)}")
+                # Fallback to simulation
+                firebase_admin.initialize_app(options={
+                    'projectId': project_id
+                })
+                print("Firebase initialized in fallback simulation mode")
+        else:
+            # Initialize with project ID for demo purposes
+            firebase_admin.initialize_app(options={
+                'projectId': project_id
+            })
+            print("Firebase initialized for demo (no credentials found)")
@@ -1,11 +1,56 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
 import os
 import json
 import uuid
+import heapq
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from itertools import groupby
+from typing import Dict, Any, Optional, List, Tuple
 
+from services.firebase_app import initialize_firebase
+from services.firestore_instrumentation import InstrumentedClient, instrument_service
+from services.group_commit import create_group_commit_writer
+
+# Firestore allows at most 500 writes per batch
+MAX_BATCH_SIZE = 500
+
+# Attendance data model: 'documents' stores one document per check-in in the
+# attendance collection, 'rolls' one document per class and date in
+# attendance_rolls holding a map of student_id to check-in record. 'dual' is
+# the migration phase: check-ins are written to rolls and read from both,
+# rolls taking precedence, until migrate_attendance.py has moved the
+# attendance collection and the model can be switched to 'rolls'.
+ATTENDANCE_MODEL = os.environ.get('ATTENDANCE_MODEL', 'documents').lower()
+ROLLS_COLLECTION = 'attendance_rolls'
+
+
+def writes_rolls() -> bool:
+    """Whether check-ins are written to rolls"""
+    return ATTENDANCE_MODEL in ('dual', 'rolls')
+
+
+def reads_documents() -> bool:
+    """Whether check-ins are read from the attendance collection"""
+    return ATTENDANCE_MODEL != 'rolls'
+
+
+def roll_id(class_id: str, date: str) -> str:
+    """Document ID of the roll of a class on a date"""
+    return f"{class_id}_{date}"
+
+
+def roll_fields(class_id: str, date: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fields to merge into a roll document to add or replace check-in records"""
+    return {
+        'class_id': class_id,
+        'date': date,
+        'records': {record['student_id']: record for record in records},
+        # Lets the rolls of a student be found with an array-contains query
+        'student_ids': firestore.ArrayUnion([record['student_id'] for record in records])
+    }
+
+@instrument_service
 class FirebaseService:
     """Service to interact with Cloud Firestore Database"""
     
@@ -14,56 +59,21 @@ class FirebaseService:
     def __new__(cls):
         """Singleton pattern to ensure only one Firebase connection"""
         if cls._instance is None:
-            cls._instance = super(FirebaseService, cls).__new__(cls)
-            cls._instance._initialize()
+            # Only kept once the connection is made, a failed one is tried again
+            instance = super(FirebaseService, cls).__new__(cls)
+            instance._initialize()
+            cls._instance = instance
         return cls._instance
     
     def _initialize(self):
         """Initialize Firebase connection"""
-        # Check if Firebase app is already initialized
-        if not firebase_admin._apps:
-            cred_path = os.environ.get('FIREBASE_CREDENTIALS_PATH', 'firebase_config/credentials.json')
-            project_id = os.environ.get('FIREBASE_PROJECT_ID', 'fingerprint-attendance-system')
-            simulation_mode = os.environ.get('FIREBASE_SIMULATION', 'false').lower() == 'true'
-            
-            # Log initialization details
-            print(f"Initializing Firebase with credentials from: {cred_path}")
-            print(f"Project ID: {project_id}")
-            print(f"Simulation mode: {simulation_mode}")
-            
-            # Use simulation mode (no actual Firebase connection)
-            if simulation_mode:
-                try:
-                    firebase_admin.initialize_app(options={
-                        'projectId': project_id
-                    })
-                    print("Firebase initialized in simulation mode")
-                except Exception as e:
-                    print(f"Error initializing Firebase in simulation mode: {str(e)}")
-            # Try to use real credentials
-            elif os.path.exists(cred_path):
-                try:
-                    cred = credentials.Certificate(cred_path)
-                    firebase_admin.initialize_app(cred, {
-                        'projectId': project_id
-                    })
-                    print("Firebase initialized successfully with credentials file")
-                except Exception as e:
-                    print(f"Error initializing Firebase with credentials: {str(e)}")
-                    # Fallback to simulation
-                    firebase_admin.initialize_app(options={
-                        'projectId': project_id
-                    })
-                    print("Firebase initialized in fallback simulation mode")
-            else:
-                # Initialize with project ID for demo purposes
-                firebase_admin.initialize_app(options={
-                    'projectId': project_id
-                })
-                print("Firebase initialized for demo (no credentials found)")
-        
-        # Initialize Firestore client
-        self.db = firestore.client()
+        initialize_firebase()
+        
+        # Initialize Firestore client, wrapped to account reads and writes
+        self.db = InstrumentedClient(firestore.client())
+        
+        # Attendance writes of concurrent scans share batched commits
+        self.group_commit = create_group_commit_writer(self.db)
     
     def get_collection(self, collection_name: str):
         """Get a reference to a specific collection in Firestore"""
@@ -81,17 +91,20 @@ class FirebaseService:
         
         return class_id
     
-    def get_class(self, class_id: str) -> Optional[Dict[str, Any]]:
-        """Get a class by ID from Firestore"""
-        class_doc = self.db.collection('classes').document(class_id).get()
+    def get_class(self, class_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a class by ID from Firestore, only the given fields when set"""
+        class_doc = self.db.collection('classes').document(class_id).get(field_paths=list(fields) if fields else None)
         
         if class_doc.exists:
             return class_doc.to_dict()
         return None
     
-    def get_all_classes(self) -> Dict[str, Any]:
-        """Get all classes from Firestore"""
-        classes_ref = self.db.collection('classes').stream()
+    def get_all_classes(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all classes from Firestore, only the given fields when set"""
+        query = self.db.collection('classes')
+        if fields:
+            query = query.select(list(fields))
+        classes_ref = query.stream()
         classes = {}
         
         for class_doc in classes_ref:
@@ -160,9 +173,9 @@ class FirebaseService:
         
         return student_id
     
-    def get_student(self, student_id: str) -> Optional[Dict[str, Any]]:
-        """Get a student by ID from Firestore"""
-        student_doc = self.db.collection('students').document(student_id).get()
+    def get_student(self, student_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a student by ID from Firestore, only the given fields when set"""
+        student_doc = self.db.collection('students').document(student_id).get(field_paths=list(fields) if fields else None)
         
         if student_doc.exists:
             return student_doc.to_dict()
@@ -180,9 +193,12 @@ class FirebaseService:
         
         return None
     
-    def get_all_students(self) -> Dict[str, Any]:
-        """Get all students from Firestore"""
-        students_ref = self.db.collection('students').stream()
+    def get_all_students(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all students from Firestore, only the given fields when set"""
+        query = self.db.collection('students')
+        if fields:
+            query = query.select(list(fields))
+        students_ref = query.stream()
         students = {}
         
         for student_doc in students_ref:
@@ -282,16 +298,35 @@ class FirebaseService:
         class_id = attendance_data.get('class_id')
         student_id = attendance_data.get('student_id')
         
-        # Create a document ID combining class, date and student for easier querying
-        document_id = f"{class_id}_{date}_{student_id}"
-        
-        # Store in attendance collection
-        self.db.collection('attendance').document(document_id).set(attendance_data)
+        if writes_rolls():
+            # Merge the check-in into the roll of the session, other records are untouched
+            reference = self.db.collection(ROLLS_COLLECTION).document(roll_id(class_id, date))
+            data, merge = roll_fields(class_id, date, [attendance_data]), True
+        else:
+            # Create a document ID combining class, date and student for easier querying
+            document_id = f"{class_id}_{date}_{student_id}"
+            reference = self.db.collection('attendance').document(document_id)
+            data, merge = attendance_data, False
+        
+        # Store in attendance collection, returning once the write is committed
+        if self.group_commit is not None:
+            self.group_commit.write(lambda batch: batch.set(reference, data, merge=merge))
+        else:
+            reference.set(data, merge=merge)
         
         return attendance_id
     
     def get_attendance(self, class_id: str, date: str) -> Dict[str, Any]:
         """Get attendance records for a class on a specific date from Firestore"""
+        attendance_records = {}
+        if writes_rolls():
+            # The whole session is one document read
+            roll_doc = self.db.collection(ROLLS_COLLECTION).document(roll_id(class_id, date)).get()
+            if roll_doc.exists:
+                attendance_records = roll_doc.to_dict().get('records', {})
+            if not reads_documents():
+                return attendance_records
+        
         # Query attendance collection for records matching the class_id and date
         query = self.db.collection('attendance').where('class_id', '==', class_id)
         
@@ -299,26 +334,25 @@ class FirebaseService:
         # In Firestore, we need to query by exact match or use compound queries
         results = query.stream()
         
-        attendance_records = {}
         for doc in results:
             data = doc.to_dict()
             record_date = data.get('timestamp', '').split(' ')[0]
             
-            # Filter records for the requested date
+            # Filter records for the requested date, records in the roll take precedence
             if record_date == date:
                 student_id = data.get('student_id')
-                attendance_records[student_id] = data
+                attendance_records.setdefault(student_id, data)
                 
         return attendance_records
     
     def get_student_attendance(self, student_id: str) -> Dict[str, Any]:
         """Get all attendance records for a student from Firestore"""
-        # Query attendance collection for records where student_id matches
-        query = self.db.collection('attendance').where('student_id', '==', student_id)
-        results = query.stream()
-        
         # Organize records by class_id and date
         student_attendance = {}
+        
+        # Query attendance collection for records where student_id matches
+        query = self.db.collection('attendance').where('student_id', '==', student_id)
+        results = query.stream() if reads_documents() else []
         for doc in results:
             data = doc.to_dict()
             class_id = data.get('class_id')
@@ -330,5 +364,124 @@ class FirebaseService:
                 student_attendance[class_id] = {}
             
             student_attendance[class_id][date] = data
+
+        if writes_rolls():
+            # Rolls take precedence over records not migrated yet
+            query = self.db.collection(ROLLS_COLLECTION).where('student_ids', 'array_contains', student_id)
+            for roll_doc in query.stream():
+                roll = roll_doc.to_dict()
+                record = roll.get('records', {}).get(student_id)
+                if record is not None:
+                    student_attendance.setdefault(roll['class_id'], {})[roll['date']] = record
+
+        return student_attendance
+
+    # Report operations
+    def save_report(self, report: Dict[str, Any], absent_records: List[Dict[str, Any]]) -> bool:
+        """
+        Store the materialized report of a class on a date together with the
+        absent records of its students in batched writes, the report last.
+        Absent records never replace a check-in: if one was stored since the
+        roll was read, nothing more is written and False is returned.
+        """
+        class_id = report['class_id']
+        date = report['date']
+        
+        batch = self.db.batch()
+        writes = 0
+        for record in absent_records:
+            record.setdefault('attendance_id', str(uuid.uuid4()))
+        
+        try:
+            if writes_rolls():
+                # All absent records go into the roll with a single write
+                if absent_records:
+                    self._add_absent_to_roll(batch, class_id, date, absent_records)
+                    writes += 1
+                absent_records = []
+            
+            for record in absent_records:
+                # Create only, the batch fails if the student checked in meanwhile
+                document_id = f"{class_id}_{date}_{record['student_id']}"
+                batch.create(self.db.collection('attendance').document(document_id), record)
+                writes += 1
+                if writes == MAX_BATCH_SIZE - 1:
+                    batch.commit()
+                    batch = self.db.batch()
+                    writes = 0
+            
+            batch.set(self.db.collection('reports').document(f"{class_id}_{date}"), report)
+            batch.commit()
+        except (AlreadyExists, FailedPrecondition) as e:
+            print(f"Roll of class {class_id} on {date} changed while it was closed: {str(e)}")
+            return False
+        return True
+    
+    def _add_absent_to_roll(self, batch, class_id: str, date: str, absent_records: List[Dict[str, Any]]):
+        """Add the absent records to the roll, failing the batch if the roll changed since it is read here"""
+        reference = self.db.collection(ROLLS_COLLECTION).document(roll_id(class_id, date))
+        roll_doc = reference.get()
+        if not roll_doc.exists:
+            batch.create(reference, roll_fields(class_id, date, absent_records))
+            return
+        
+        checked_in = roll_doc.to_dict().get('records', {})
+        fields = {
+            self.db.field_path('records', record['student_id']): record
+            for record in absent_records if record['student_id'] not in checked_in
+        }
+        fields['student_ids'] = firestore.ArrayUnion([record['student_id'] for record in absent_records])
+        batch.update(reference, fields, option=self.db.write_option(last_update_time=roll_doc.update_time))
+    
+    def get_report(self, class_id: str, date: str) -> Optional[Dict[str, Any]]:
+        """Get the materialized report of a class on a date from Firestore"""
+        report_doc = self.db.collection('reports').document(f"{class_id}_{date}").get()
         
-        return student_attendance
\ No newline at end of file
+        if report_doc.exists:
+            return report_doc.to_dict()
+        return None
+    
+    def iter_attendance(self, start_date: Optional[str] = None):
+        """
+        Stream attendance records from Firestore ordered by timestamp
+        Only records on or after start_date (YYYY-MM-DD) are returned when it is given
+        """
+        if not writes_rolls():
+            yield from self._iter_document_attendance(start_date)
+            return
+
+        days = self._iter_roll_days(start_date)
+        if reads_documents():
+            # Both sources are ordered by day, rolls take precedence within a day
+            legacy_days = groupby(self._iter_document_attendance(start_date),
+                                  key=lambda record: record.get('timestamp', '').split(' ')[0])
+            merged = heapq.merge(((day, 0, list(records)) for day, records in legacy_days),
+                                 ((day, 1, records) for day, records in days),
+                                 key=lambda entry: (entry[0], entry[1]))
+            days = ((day, [record for _, _, day_records in entries for record in day_records])
+                    for day, entries in groupby(merged, key=lambda entry: entry[0]))
+
+        for _, records in days:
+            session_records = {(record.get('class_id'), record.get('student_id')): record for record in records}
+            yield from sorted(session_records.values(), key=lambda record: record.get('timestamp', ''))
+
+    def _iter_document_attendance(self, start_date: Optional[str] = None):
+        """Stream the documents of the attendance collection ordered by timestamp"""
+        query = self.db.collection('attendance')
+
+        if start_date:
+            query = query.where('timestamp', '>=', f"{start_date} 00:00:00")
+
+        # Ordering by timestamp keeps records of the same day together so
+        # callers can process the collection one day at a time
+        for doc in query.order_by('timestamp').stream():
+            yield doc.to_dict()
+
+    def _iter_roll_days(self, start_date: Optional[str] = None):
+        """Stream (date, records) of the rolls ordered by date"""
+        query = self.db.collection(ROLLS_COLLECTION)
+        if start_date:
+            query = query.where('date', '>=', start_date)
+
+        for date, rolls in groupby(query.order_by('date').stream(), key=lambda roll_doc: roll_doc.to_dict().get('date')):
+            yield date, [record for roll_doc in rolls for record in roll_doc.to_dict().get('records', {}).values()]
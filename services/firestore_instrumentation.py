@@ -0,0 +1,234 @@
+"""
+Firestore instrumentation for the Fingerprint Attendance System
+
+Wraps the Firestore client so every round trip is accounted: document reads
+(queries are billed at least one read even when they return nothing), document
+writes, the number of round trips and the time spent waiting for Firestore.
+Usage is attributed to the current request and span (see utils.tracing) and to
+Prometheus counters labelled with the FirebaseService method that issued it.
+"""
+
+import contextvars
+import inspect
+import time
+from functools import wraps
+
+from utils.metrics import counter, histogram
+from utils.tracing import record_firestore_call, start_span, tracing_enabled
+
+FIRESTORE_READS = counter(
+    'firestore_document_reads_total',
+    'Firestore documents read by service operation',
+    ['operation']
+)
+
+FIRESTORE_WRITES = counter(
+    'firestore_document_writes_total',
+    'Firestore documents written by service operation',
+    ['operation']
+)
+
+FIRESTORE_CALL_DURATION = histogram(
+    'firestore_call_duration_seconds',
+    'Latency of individual Firestore round trips by service operation',
+    ['operation']
+)
+
+_current_operation: contextvars.ContextVar[str] = contextvars.ContextVar('firestore_operation', default='other')
+
+
+def _record(reads: int, writes: int, elapsed: float):
+    """Record a single Firestore round trip"""
+    operation = _current_operation.get()
+    if reads:
+        FIRESTORE_READS.labels(operation).inc(reads)
+    if writes:
+        FIRESTORE_WRITES.labels(operation).inc(writes)
+    FIRESTORE_CALL_DURATION.labels(operation).observe(elapsed)
+    record_firestore_call(reads, writes, elapsed)
+
+
+def _unwrap(value):
+    """Get the underlying Firestore object of an instrumented wrapper"""
+    return getattr(value, '_wrapped', value)
+
+
+class _Wrapper:
+    """Base class forwarding unknown attributes to the wrapped object"""
+
+    def __init__(self, wrapped):
+        self._wrapped = wrapped
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+
+class InstrumentedQuery(_Wrapper):
+    """Query or collection reference that counts the documents it streams"""
+
+    def _chain(self, name, *args, **kwargs):
+        return InstrumentedQuery(getattr(self._wrapped, name)(*args, **kwargs))
+
+    def where(self, *args, **kwargs):
+        return self._chain('where', *args, **kwargs)
+
+    def order_by(self, *args, **kwargs):
+        return self._chain('order_by', *args, **kwargs)
+
+    def limit(self, *args, **kwargs):
+        return self._chain('limit', *args, **kwargs)
+
+    def offset(self, *args, **kwargs):
+        return self._chain('offset', *args, **kwargs)
+
+    def select(self, *args, **kwargs):
+        return self._chain('select', *args, **kwargs)
+
+    def start_at(self, *args, **kwargs):
+        return self._chain('start_at', *args, **kwargs)
+
+    def start_after(self, *args, **kwargs):
+        return self._chain('start_after', *args, **kwargs)
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(*args, **kwargs))
+
+    def stream(self, *args, **kwargs):
+        start = time.perf_counter()
+        count = 0
+        try:
+            for doc in self._wrapped.stream(*args, **kwargs):
+                count += 1
+                yield doc
+        finally:
+            # Firestore bills a query that matches nothing as one read
+            _record(max(count, 1), 0, time.perf_counter() - start)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class InstrumentedDocument(_Wrapper):
+    """Document reference that counts reads and writes"""
+
+    def _call(self, name, reads, writes, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return getattr(self._wrapped, name)(*args, **kwargs)
+        finally:
+            _record(reads, writes, time.perf_counter() - start)
+
+    def get(self, *args, **kwargs):
+        return self._call('get', 1, 0, *args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._call('set', 0, 1, *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._call('update', 0, 1, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._call('delete', 0, 1, *args, **kwargs)
+
+    def collection(self, *args, **kwargs):
+        return InstrumentedQuery(self._wrapped.collection(*args, **kwargs))
+
+
+class InstrumentedBatch(_Wrapper):
+    """Write batch that accounts all of its writes in the commit round trip"""
+
+    def __init__(self, wrapped):
+        super().__init__(wrapped)
+        self._pending = 0
+
+    def create(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._wrapped.create(_unwrap(reference), *args, **kwargs)
+
+    def set(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._wrapped.set(_unwrap(reference), *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._wrapped.update(_unwrap(reference), *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        self._pending += 1
+        return self._wrapped.delete(_unwrap(reference), *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._wrapped.commit(*args, **kwargs)
+        finally:
+            _record(0, self._pending, time.perf_counter() - start)
+            self._pending = 0
+
+
+class InstrumentedClient(_Wrapper):
+    """Firestore client whose references account every round trip"""
+
+    def collection(self, *args, **kwargs):
+        return InstrumentedQuery(self._wrapped.collection(*args, **kwargs))
+
+    def document(self, *args, **kwargs):
+        return InstrumentedDocument(self._wrapped.document(*args, **kwargs))
+
+    def batch(self, *args, **kwargs):
+        return InstrumentedBatch(self._wrapped.batch(*args, **kwargs))
+
+    def get_all(self, references, *args, **kwargs):
+        start = time.perf_counter()
+        count = 0
+        try:
+            for doc in self._wrapped.get_all([_unwrap(ref) for ref in references], *args, **kwargs):
+                count += 1
+                yield doc
+        finally:
+            _record(count, 0, time.perf_counter() - start)
+
+
+def instrument_service(cls):
+    """
+    Class decorator wrapping every public method in a span when tracing is enabled
+    Firestore usage inside the method is attributed to the method name
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(method):
+            continue
+        setattr(cls, name, _instrument_method(f"{cls.__name__}.{name}", name, method))
+    return cls
+
+
+def _instrument_method(span_name: str, operation: str, method):
+    """Wrap a single service method in a span and operation context"""
+    if inspect.isgeneratorfunction(method):
+        # Generators may be resumed from other contexts, so the operation is
+        # set around each step instead of spanning the whole iteration
+        @wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            generator = method(*args, **kwargs)
+            while True:
+                token = _current_operation.set(operation)
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    _current_operation.reset(token)
+                yield item
+        return generator_wrapper
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        token = _current_operation.set(operation)
+        try:
+            # Spans are only allocated when something records them
+            if not tracing_enabled():
+                return method(*args, **kwargs)
+            with start_span(span_name):
+                return method(*args, **kwargs)
+        finally:
+            _current_operation.reset(token)
+    return wrapper
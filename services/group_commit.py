@@ -0,0 +1,106 @@
+"""
+Group commit of Firestore attendance writes
+
+Every scan used to wait for its own Firestore round trip. The writer collects
+the writes submitted within a short window (or until a batch is full) into
+one batched commit, and each caller returns once the batch holding its write
+is committed, so a scan is still only acknowledged when it is stored. During
+changeover bursts many scans share one round trip.
+
+Writes are committed by a background thread in the order they were
+submitted. If a commit fails, every caller of that batch gets the error.
+"""
+
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from utils.metrics import counter, histogram
+
+GROUP_COMMIT_SIZE = histogram(
+    'firestore_group_commit_writes',
+    'Writes per group commit',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+GROUP_COMMITS = counter(
+    'firestore_group_commits_total',
+    'Group commits by result',
+    ['result']
+)
+
+
+class GroupCommitWriter:
+    """Commits writes submitted by concurrent callers in shared batches"""
+
+    def __init__(self, db, window: float = 0.02, max_writes: int = 100):
+        self.db = db
+        self.window = window
+        self.max_writes = max_writes
+        self._queue: 'queue.Queue[Tuple[Callable[[Any], None], Future, contextvars.Context]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def write(self, apply: Callable[[Any], None]):
+        """
+        Add a write to the next batch and wait until it is committed
+        apply is called with the batch and adds the write to it
+        """
+        future = Future()
+        self._queue.put((apply, future, contextvars.copy_context()))
+        self._ensure_started()
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='firestore-group-commit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(pending) < self.max_writes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(pending)
+
+    def _commit(self, pending: List[Tuple[Callable[[Any], None], Future, contextvars.Context]]):
+        """Commit one batch and resolve the futures of its callers"""
+        try:
+            batch = self.db.batch()
+            for apply, _, _ in pending:
+                apply(batch)
+            # Accounted to the operation and trace of the first caller
+            pending[0][2].run(batch.commit)
+        except Exception as e:
+            GROUP_COMMITS.labels('error').inc()
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+
+        GROUP_COMMITS.labels('committed').inc()
+        GROUP_COMMIT_SIZE.observe(len(pending))
+        for _, future, _ in pending:
+            future.set_result(None)
+
+
+def create_group_commit_writer(db) -> Optional[GroupCommitWriter]:
+    """The writer configured by ATTENDANCE_COMMIT_WINDOW_MS and ATTENDANCE_COMMIT_MAX, None when disabled"""
+    window_ms = float(os.environ.get('ATTENDANCE_COMMIT_WINDOW_MS', '20'))
+    if window_ms <= 0:
+        return None
+    # Firestore allows at most 500 writes per batch
+    max_writes = min(int(os.environ.get('ATTENDANCE_COMMIT_MAX', '100')), 500)
+    return GroupCommitWriter(db, window_ms / 1000, max_writes)
@@ -5,17 +5,221 @@ This service provides a simple in-memory database that mimics Firebase functiona
 for local development and testing without requiring actual Firebase connectivity.
 """
 
+import atexit
+import functools
+import threading
 import uuid
 import json
 import os
-from typing import Dict, Any, Optional, List
+from collections.abc import Mapping
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 
+from services.local_journal import LocalJournal
+from utils.data_util import clone_data, project, shallow_copy
+from utils.persistent_map import PersistentMap
+
+
+# Levels of persistent maps under each collection, the values below them are documents
+COLLECTION_DEPTHS = {
+    'classes': 1,
+    'students': 1,
+    'attendance': 3,
+    'reports': 2
+}
+
+
+def _freeze(value: Any, levels: int) -> Any:
+    """value with its top levels of dicts turned into persistent maps"""
+    if levels <= 0 or not isinstance(value, dict):
+        return value
+    return PersistentMap((key, _freeze(item, levels - 1)) for key, item in value.items())
+
+
+def _freeze_root(data: Dict[str, Any]) -> Dict[str, Any]:
+    """A database root holding the collections of data as persistent maps"""
+    return {
+        collection: _freeze(data.get(collection, {}), depth)
+        for collection, depth in COLLECTION_DEPTHS.items()
+    }
+
+
+def _with(node: Mapping, part: str, value: Any) -> Mapping:
+    """A copy of a map or document with part set to value"""
+    if isinstance(node, PersistentMap):
+        return node.set(part, value)
+    return {**node, part: value}
+
+
+def _assoc(node: Mapping, path_parts: List[str], value: Any, depth: int, level: int) -> Mapping:
+    """A copy of node with the value at path_parts set, node holds the part at level of the full path"""
+    part, *rest = path_parts
+    if rest:
+        child = node.get(part)
+        if not isinstance(child, Mapping):
+            child = PersistentMap() if level < depth else {}
+        value = _assoc(child, rest, value, depth, level + 1)
+    return _with(node, part, value)
+
+
+def _dissoc(node: Mapping, path_parts: List[str]) -> Mapping:
+    """A copy of node without the existing value at path_parts"""
+    part, *rest = path_parts
+    if rest:
+        return _with(node, part, _dissoc(node[part], rest))
+    if isinstance(node, PersistentMap):
+        return node.delete(part)
+    return {key: item for key, item in node.items() if key != part}
+
+
+def _set_path(db: Dict[str, Any], path_parts: List[str], value: Any) -> Tuple[Dict[str, Any], bool]:
+    """
+    Set the value at a path, creating missing parents
+    db is left untouched and a new root is returned, it only copies the maps
+    on the path and shares everything else. Returns (root, result).
+    """
+    if not path_parts:
+        return db, False
+
+    depth = COLLECTION_DEPTHS.get(path_parts[0], 1)
+    value = _freeze(value, depth - len(path_parts) + 1)
+    return _assoc(db, path_parts, value, depth, 0), True
+
+
+def _update_path(db: Dict[str, Any], path_parts: List[str], value: Any) -> Tuple[Dict[str, Any], bool]:
+    """Merge a dict into the value at a path, setting it if missing. Returns (root, result)."""
+    current = _get_path(db, path_parts)
+    if current is None:
+        return _set_path(db, path_parts, value)
+    if isinstance(current, PersistentMap) and isinstance(value, dict):
+        for key, item in value.items():
+            db, _ = _set_path(db, path_parts + [key], item)
+        return db, True
+    if isinstance(current, dict) and isinstance(value, dict):
+        return _set_path(db, path_parts, {**current, **value})
+
+    return db, True
+
+
+def _delete_path(db: Dict[str, Any], path_parts: List[str], value: Any = None) -> Tuple[Dict[str, Any], bool]:
+    """Delete the value at a path. Returns (root, result)."""
+    if not path_parts:
+        return db, False
+
+    *parent_parts, last_part = path_parts
+
+    parent = _get_path(db, parent_parts) if parent_parts else db
+    if not isinstance(parent, Mapping) or last_part not in parent:
+        return db, False
+
+    return _dissoc(db, path_parts), True
+
+
+def _get_path(db: Dict[str, Any], path_parts: List[str]) -> Any:
+    """Get the value at a path"""
+    if not path_parts:
+        return None
+
+    curr = db
+    for part in path_parts:
+        if not isinstance(curr, Mapping):
+            return None
+        curr = curr.get(part)
+        if curr is None:
+            return None
+
+    return curr
+
+
+def _view(value: Any) -> Any:
+    """
+    The value at a path for a caller, maps become dicts and documents are
+    shallow copies, so nothing the database holds is deep cloned or handed out
+    """
+    if isinstance(value, PersistentMap):
+        return {key: _view(item) for key, item in value.items()}
+    if isinstance(value, dict):
+        return shallow_copy(value)
+    return value
+
+
+def _index_scope(path_parts: List[str]) -> Optional[List[str]]:
+    """The path of the enclosing student or attendance record that the secondary indexes cover"""
+    if not path_parts:
+        return None
+    if path_parts[0] == 'students':
+        return path_parts[:2]
+    if path_parts[0] == 'attendance':
+        return path_parts[:4]
+    return None
+
+
+def _attendance_keys(keys: List[str], value: Any):
+    """Yield (class_id, date, student_id) for the attendance records under attendance/{keys}"""
+    if len(keys) == 3:
+        if isinstance(value, dict):
+            yield keys[0], keys[1], keys[2]
+        return
+
+    if not isinstance(value, Mapping):
+        return
+    for key, child in value.items():
+        yield from _attendance_keys(keys + [key], child)
+
+
+_MUTATIONS = {
+    'set': _set_path,
+    'update': _update_path,
+    'delete': _delete_path
+}
+
+
+def _synchronized(method):
+    """Run a service method that reads and then writes while holding the writer lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class LocalReference:
+    """A reference to a path in the local database"""
+
+    def __init__(self, service, path_parts):
+        self.service = service
+        self.path_parts = path_parts
+
+    def get(self):
+        """Get data from the reference path"""
+        return _view(_get_path(self.service.db, self.path_parts))
+
+    def set(self, value):
+        """Set data at the reference path"""
+        return self.service._apply('set', self.path_parts, value)
+
+    def update(self, value):
+        """Update data at the reference path"""
+        return self.service._apply('update', self.path_parts, value)
+
+    def delete(self):
+        """Delete data at the reference path"""
+        return self.service._apply('delete', self.path_parts)
+
+    def child(self, child_path):
+        """Get a reference to a child path"""
+        new_parts = self.path_parts + [child_path]
+        return LocalReference(self.service, new_parts)
+
+
 class LocalDataService:
     """A simple in-memory database service as a Firebase alternative for testing"""
     
     _instance = None
     
+    # Only this process can write to the in-memory database
+    process_private = True
+    
     def __new__(cls):
         """Singleton pattern to ensure only one database instance"""
         if cls._instance is None:
@@ -25,20 +229,63 @@ class LocalDataService:
     
     def _initialize(self):
         """Initialize the local database"""
-        # Initialize the database structure
-        self.db = {
-            'classes': {},
-            'students': {},
-            'attendance': {}
-        }
-        
+        self._init_state()
+
+        # Persist to disk when a data directory is configured
+        data_dir = os.environ.get('LOCAL_DATA_DIR')
+        if data_dir:
+            self.journal = LocalJournal(
+                data_dir,
+                fsync_policy=os.environ.get('LOCAL_DATA_FSYNC', 'interval').lower(),
+                fsync_interval=float(os.environ.get('LOCAL_DATA_FSYNC_INTERVAL', '1.0')),
+                snapshot_every=int(os.environ.get('LOCAL_SNAPSHOT_EVERY', '10000'))
+            )
+            atexit.register(self.close)
+
+            if self._restore():
+                self._rebuild_indexes()
+                print(f"Local database restored from {data_dir}")
+                return
+
         # Add sample data for testing
         self._add_sample_data()
-        
+        self._rebuild_indexes()
+
+        if self.journal:
+            self.journal.snapshot(self.db)
+
         print("Local database initialized with sample data")
+
+    def _init_state(self):
+        """Initialize an empty database structure"""
+        self.db = _freeze_root({})
+        self.journal = None
+        self._snapshot_thread = None
+
+        # Writers hold the lock and publish a new root; readers use whatever root is current.
+        # Collections are persistent maps, so a new root only copies the path to the changed document
+        self._write_lock = threading.RLock()
+        self._rebuild_indexes()
+
+    def _restore(self) -> bool:
+        """Load the latest snapshot and replay the journal tail, returns False if nothing was persisted"""
+        db, entries = self.journal.load()
+        if db is None and not entries:
+            return False
+
+        if db is not None:
+            # Snapshots written before the collections were persistent maps hold plain dicts
+            self.db = _freeze_root(db)
+        for operation, path_parts, value in entries:
+            self.db, _ = _MUTATIONS[operation](self.db, path_parts, value)
+
+        return True
     
     def _add_sample_data(self):
         """Add sample data to the database"""
+        # Built in plain dicts and turned into persistent maps at the end
+        self.db = {collection: {} for collection in COLLECTION_DEPTHS}
+
         # Sample classes
         class_ids = {}
         
@@ -212,86 +459,171 @@ class LocalDataService:
                 'timestamp': f"{today} 13:10:00",
                 'status': 'present'
             }
+
+        self.db = _freeze_root(self.db)
     
     def get_reference(self, path: str):
         """Get a reference to a path in the database (mimics Firebase reference)"""
         # Handle paths like 'classes', 'students', 'attendance/class_id/date'
         parts = path.split('/')
-        
-        class LocalReference:
-            def __init__(self, db, path_parts):
-                self.db = db
-                self.path_parts = path_parts
-            
-            def get(self):
-                """Get data from the reference path"""
-                if not self.path_parts:
-                    return None
-                
-                curr = self.db
-                for part in self.path_parts:
-                    if not curr or part not in curr:
-                        return None
-                    curr = curr[part]
-                
-                return curr
-            
-            def set(self, value):
-                """Set data at the reference path"""
-                if not self.path_parts:
-                    return False
-                
-                *parent_parts, last_part = self.path_parts
-                
-                # Navigate to parent
-                parent = self.db
-                for part in parent_parts:
-                    if part not in parent:
-                        parent[part] = {}
-                    parent = parent[part]
-                
-                # Set value
-                parent[last_part] = value
-                return True
-            
-            def update(self, value):
-                """Update data at the reference path"""
-                current = self.get()
-                if current is None:
-                    self.set(value)
-                else:
-                    if isinstance(current, dict) and isinstance(value, dict):
-                        current.update(value)
-                        self.set(current)
-                
-                return True
-            
-            def delete(self):
-                """Delete data at the reference path"""
-                if not self.path_parts:
-                    return False
-                
-                *parent_parts, last_part = self.path_parts
-                
-                # Navigate to parent
-                parent = self.db
-                for part in parent_parts:
-                    if part not in parent:
-                        return False
-                    parent = parent[part]
-                
-                # Delete value
-                if last_part in parent:
-                    del parent[last_part]
-                    return True
-                return False
-            
-            def child(self, child_path):
-                """Get a reference to a child path"""
-                new_parts = self.path_parts + [child_path]
-                return LocalReference(self.db, new_parts)
-        
-        return LocalReference(self.db, parts)
+        return LocalReference(self, parts)
+
+    def _apply(self, operation: str, path_parts: List[str], value: Any = None) -> bool:
+        """Apply a set, update or delete to the database and journal it when persistence is enabled"""
+        with self._write_lock:
+            # Store a private copy so callers can keep modifying their own dict
+            value = clone_data(value)
+
+            # Indexes cover whole students and attendance records, so re-index the enclosing one
+            scope = _index_scope(path_parts)
+            before = self._index_entries(self.db, scope) if scope else set()
+
+            root, result = _MUTATIONS[operation](self.db, path_parts, value)
+            after = self._index_entries(root, scope) if scope else set()
+
+            # New index entries go in before the new root is published and stale ones are
+            # removed after, so a reader on either root finds everything it holds
+            self._add_index_entries(scope, after - before)
+            self.db = root
+            self._remove_index_entries(scope, before - after)
+
+            if result and self.journal:
+                self.journal.append(operation, path_parts, value)
+                if self.journal.needs_snapshot():
+                    self._snapshot_in_background()
+
+            return result
+
+    def load_data(self, data: Dict[str, Any]):
+        """Replace the contents of the database, e.g. with imported or generated data"""
+        with self._write_lock:
+            self.db = _freeze_root(data)
+            self._rebuild_indexes()
+            if self.journal:
+                self._wait_for_snapshot()
+                self.journal.snapshot(self.db)
+
+    def _rebuild_indexes(self):
+        """Rebuild the secondary indexes from the database"""
+        fingerprint_index = {}
+        student_attendance_index = {}
+        date_index = {}
+
+        for fingerprint_id, student_id in self._index_entries(self.db, ['students']):
+            fingerprint_index[fingerprint_id] = student_id
+
+        for class_id, date, student_id in self._index_entries(self.db, ['attendance']):
+            student_attendance_index.setdefault(student_id, set()).add((class_id, date))
+            class_counts = date_index.setdefault(date, {})
+            class_counts[class_id] = class_counts.get(class_id, 0) + 1
+
+        # fingerprint_id -> student_id
+        self.fingerprint_index = fingerprint_index
+        # student_id -> frozenset of (class_id, date)
+        self.student_attendance_index = {
+            student_id: frozenset(sessions) for student_id, sessions in student_attendance_index.items()
+        }
+        # date -> {class_id: number of records}, replaced as a whole on every change
+        self.date_index = date_index
+
+    def _index_entries(self, db: Dict[str, Any], scope: List[str]) -> set:
+        """
+        The index entries for the data under scope in db
+        (fingerprint_id, student_id) for students, (class_id, date, student_id) for attendance
+        """
+        value = _get_path(db, scope)
+        if value is None:
+            return set()
+
+        if scope[0] == 'students':
+            students = value if len(scope) == 1 else {scope[1]: value}
+            return {
+                (student['fingerprint_id'], student_id)
+                for student_id, student in students.items()
+                if isinstance(student, dict) and student.get('fingerprint_id') is not None
+            }
+
+        return set(_attendance_keys(scope[1:], value))
+
+    def _add_index_entries(self, scope: Optional[List[str]], entries: set):
+        """Add entries to the secondary indexes, readers only ever see whole new values"""
+        if not entries:
+            return
+
+        if scope[0] == 'students':
+            for fingerprint_id, student_id in entries:
+                self.fingerprint_index[fingerprint_id] = student_id
+            return
+
+        date_index = dict(self.date_index)
+        for class_id, date, student_id in entries:
+            sessions = self.student_attendance_index.get(student_id, frozenset())
+            self.student_attendance_index[student_id] = sessions | {(class_id, date)}
+
+            class_counts = dict(date_index.get(date, {}))
+            class_counts[class_id] = class_counts.get(class_id, 0) + 1
+            date_index[date] = class_counts
+        self.date_index = date_index
+
+    def _remove_index_entries(self, scope: Optional[List[str]], entries: set):
+        """Remove entries from the secondary indexes, readers only ever see whole new values"""
+        if not entries:
+            return
+
+        if scope[0] == 'students':
+            for fingerprint_id, student_id in entries:
+                if self.fingerprint_index.get(fingerprint_id) == student_id:
+                    del self.fingerprint_index[fingerprint_id]
+            return
+
+        date_index = dict(self.date_index)
+        for class_id, date, student_id in entries:
+            sessions = self.student_attendance_index.get(student_id, frozenset()) - {(class_id, date)}
+            if sessions:
+                self.student_attendance_index[student_id] = sessions
+            else:
+                self.student_attendance_index.pop(student_id, None)
+
+            class_counts = dict(date_index.get(date, {}))
+            class_counts[class_id] = class_counts.get(class_id, 0) - 1
+            if class_counts[class_id] <= 0:
+                del class_counts[class_id]
+            if class_counts:
+                date_index[date] = class_counts
+            else:
+                date_index.pop(date, None)
+        self.date_index = date_index
+
+    def _snapshot_in_background(self):
+        """Start writing a snapshot of the current root, roots are never modified so writers carry on"""
+        if self._snapshot_thread and self._snapshot_thread.is_alive():
+            return
+
+        sequence = self.journal.rotate()
+        self._snapshot_thread = threading.Thread(
+            target=self.journal.write_snapshot,
+            args=(self.db, sequence),
+            name='local-data-snapshot',
+            daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _wait_for_snapshot(self):
+        """Wait for a background snapshot to finish"""
+        if self._snapshot_thread:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+    def close(self):
+        """Write a final snapshot and close the journal"""
+        if not self.journal:
+            return
+
+        with self._write_lock:
+            self._wait_for_snapshot()
+            if self.journal.entries_since_snapshot:
+                self.journal.snapshot(self.db)
+            self.journal.close()
     
     # Class operations - mimic Firebase service
     def create_class(self, class_data: Dict[str, Any]) -> str:
@@ -305,16 +637,21 @@ class LocalDataService:
         
         return class_id
     
-    def get_class(self, class_id: str) -> Optional[Dict[str, Any]]:
-        """Get a class by ID"""
+    def get_class(self, class_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a class by ID, only the given fields when set"""
+        if fields:
+            return self._projected_document('classes', class_id, fields)
         class_ref = self.get_reference(f'classes/{class_id}')
         return class_ref.get()
     
-    def get_all_classes(self) -> Dict[str, Any]:
-        """Get all classes"""
+    def get_all_classes(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all classes, only the given fields when set"""
+        if fields:
+            return self._projected_collection('classes', fields)
         classes_ref = self.get_reference('classes')
         return classes_ref.get() or {}
     
+    @_synchronized
     def update_class(self, class_id: str, class_data: Dict[str, Any]) -> bool:
         """Update a class"""
         # Get the current data first to preserve enrolled_students
@@ -334,6 +671,7 @@ class LocalDataService:
         class_ref.set(class_data)
         return True
     
+    @_synchronized
     def delete_class(self, class_id: str) -> bool:
         """Delete a class"""
         # Get the class first to check if it exists
@@ -371,27 +709,48 @@ class LocalDataService:
         
         return student_id
     
-    def get_student(self, student_id: str) -> Optional[Dict[str, Any]]:
-        """Get a student by ID"""
+    def get_student(self, student_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a student by ID, only the given fields when set"""
+        if fields:
+            return self._projected_document('students', student_id, fields)
         student_ref = self.get_reference(f'students/{student_id}')
         return student_ref.get()
     
     def get_student_by_fingerprint(self, fingerprint_id: int) -> Optional[Dict[str, Any]]:
         """Get a student by fingerprint ID"""
-        students_ref = self.get_reference('students')
-        students = students_ref.get() or {}
+        # Read from one root; an index entry only counts if that root agrees with it
+        db = self.db
+        student_id = self.fingerprint_index.get(fingerprint_id)
+        if student_id is None:
+            return None
         
-        for student_id, student in students.items():
-            if student.get('fingerprint_id') == fingerprint_id:
-                return student
+        student = db['students'].get(student_id)
+        if not student or student.get('fingerprint_id') != fingerprint_id:
+            return None
         
-        return None
+        return shallow_copy(student)
     
-    def get_all_students(self) -> Dict[str, Any]:
-        """Get all students"""
+    def get_all_students(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all students, only the given fields when set"""
+        if fields:
+            return self._projected_collection('students', fields)
         students_ref = self.get_reference('students')
         return students_ref.get() or {}
     
+    def _projected_document(self, collection: str, document_id: str, fields: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """Copy of the given fields of a document, the rest is never copied"""
+        document = self.db[collection].get(document_id)
+        if document is None:
+            return None
+        return shallow_copy(project(document, fields))
+    
+    def _projected_collection(self, collection: str, fields: Tuple[str, ...]) -> Dict[str, Any]:
+        """Copy of the given fields of every document in a collection"""
+        # Read from one root so the result is a consistent snapshot
+        documents = self.db[collection]
+        return {document_id: shallow_copy(project(document, fields)) for document_id, document in documents.items()}
+    
+    @_synchronized
     def update_student(self, student_id: str, student_data: Dict[str, Any]) -> bool:
         """Update a student"""
         # Get the current data first to preserve enrolled_classes
@@ -411,6 +770,7 @@ class LocalDataService:
         student_ref.set(student_data)
         return True
     
+    @_synchronized
     def delete_student(self, student_id: str) -> bool:
         """Delete a student"""
         # Get the student first to check if it exists
@@ -436,6 +796,7 @@ class LocalDataService:
         student_ref.delete()
         return True
     
+    @_synchronized
     def enroll_student_in_class(self, student_id: str, class_id: str) -> bool:
         """Enroll a student in a class"""
         # Get the student and class first to check if they exist
@@ -475,14 +836,7 @@ class LocalDataService:
         class_id = attendance_data.get('class_id')
         student_id = attendance_data.get('student_id')
         
-        # Initialize structure if needed
-        if class_id not in self.db['attendance']:
-            self.db['attendance'][class_id] = {}
-        
-        if date not in self.db['attendance'][class_id]:
-            self.db['attendance'][class_id][date] = {}
-        
-        # Store attendance by class_id and date
+        # Store attendance by class_id and date, missing levels are created by set
         attendance_ref = self.get_reference(f'attendance/{class_id}/{date}')
         attendance_ref.child(student_id).set(attendance_data)
         
@@ -495,18 +849,66 @@ class LocalDataService:
     
     def get_student_attendance(self, student_id: str) -> Dict[str, Any]:
         """Get all attendance records for a student"""
-        # Get all attendance records
-        attendance_ref = self.get_reference('attendance')
-        all_attendance = attendance_ref.get() or {}
-        
-        # Filter for the specific student
+        attendance = self.db['attendance']
         student_attendance = {}
         
-        for class_id, dates in all_attendance.items():
-            for date, records in dates.items():
-                if student_id in records:
-                    if class_id not in student_attendance:
-                        student_attendance[class_id] = {}
-                    student_attendance[class_id][date] = records[student_id]
-        
-        return student_attendance
\ No newline at end of file
+        for class_id, date in sorted(self.student_attendance_index.get(student_id, ())):
+            record = attendance.get(class_id, {}).get(date, {}).get(student_id)
+            if record is not None:
+                student_attendance.setdefault(class_id, {})[date] = shallow_copy(record)
+
+        return student_attendance
+
+    def get_attendance_by_date(self, date: str) -> Dict[str, Any]:
+        """Get the attendance records of every class on a specific date, keyed by class_id"""
+        return self._attendance_by_date(self.db, self.date_index, date)
+
+    def _attendance_by_date(self, db: Dict[str, Any], date_index: Dict[str, Any], date: str) -> Dict[str, Any]:
+        """Get the attendance records on a date from one root"""
+        attendance_by_class = {}
+        for class_id in date_index.get(date, {}):
+            records = _get_path(db, ['attendance', class_id, date])
+            if records:
+                attendance_by_class[class_id] = _view(records)
+        return attendance_by_class
+
+    # Report operations
+    @_synchronized
+    def save_report(self, report: Dict[str, Any], absent_records: List[Dict[str, Any]]) -> bool:
+        """
+        Store the materialized report of a class on a date together with the absent records of its students
+        Absent records never replace a record of a student who checked in meanwhile
+        """
+        class_id = report['class_id']
+        date = report['date']
+        
+        for record in absent_records:
+            record.setdefault('attendance_id', str(uuid.uuid4()))
+            reference = self.get_reference(f"attendance/{class_id}/{date}/{record['student_id']}")
+            # Writers hold the lock, so nothing is stored between the check and the set
+            if _get_path(self.db, reference.path_parts) is None:
+                reference.set(record)
+        
+        self.get_reference(f'reports/{class_id}/{date}').set(report)
+        return True
+    
+    def get_report(self, class_id: str, date: str) -> Optional[Dict[str, Any]]:
+        """Get the materialized report of a class on a date"""
+        return self.get_reference(f'reports/{class_id}/{date}').get()
+    
+    def iter_attendance(self, start_date: Optional[str] = None):
+        """
+        Iterate over attendance records ordered by timestamp
+        Only records on or after start_date (YYYY-MM-DD) are returned when it is given
+        """
+        # Iterate over the root current at the start, later writes are not seen
+        db = self.db
+        date_index = self.date_index
+        dates = sorted(date for date in date_index if not start_date or date >= start_date)
+
+        for date in dates:
+            records = []
+            for class_records in self._attendance_by_date(db, date_index, date).values():
+                records.extend(class_records.values())
+            for record in sorted(records, key=lambda r: r.get('timestamp', '')):
+                yield record
@@ -0,0 +1,235 @@
+"""
+On-disk persistence for the local data service
+
+Mutations are appended to a journal file as they happen and the whole database
+is periodically written to a compacted snapshot. On startup the latest snapshot
+is loaded and only the journal entries written after it are replayed.
+
+Taking a snapshot first rotates the journal, so writers keep appending to a
+fresh file while the snapshot is written; the rotated file is removed once the
+snapshot is in place. If a snapshot failed, the next rotation appends to the
+rotated file it left behind, whose entries are in no snapshot yet.
+
+Journal records are framed as:
+
+    4 bytes  payload length (big endian)
+    4 bytes  CRC32 of the payload
+    payload  pickled (sequence, operation, path_parts, value)
+
+A torn record at the end of the journal (e.g. after a crash mid-write) fails
+the length or checksum test and is truncated away on load.
+"""
+
+import os
+import pickle
+import shutil
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+SNAPSHOT_FILE = 'snapshot.bin'
+JOURNAL_FILE = 'journal.log'
+ROTATED_JOURNAL_FILE = 'journal.log.1'
+SNAPSHOT_MAGIC = b'LDS1'
+
+_HEADER = struct.Struct('>II')
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+class LocalJournal:
+    """Append-only journal with periodic snapshots for the local data service"""
+
+    def __init__(self, data_dir: str, fsync_policy: str = 'interval', fsync_interval: float = 1.0,
+                 snapshot_every: int = 10000):
+        """
+        Initialize the journal in data_dir
+        Every entry is handed to the operating system when it is appended, so
+        it survives a crash of the process. fsync_policy decides when it is
+        forced to disk to survive a power loss as well: 'always' (every
+        mutation), 'interval' (at most fsync_interval seconds after it was
+        written) or 'never' (whenever the operating system writes it back)
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy {fsync_policy}, use one of {', '.join(FSYNC_POLICIES)}")
+
+        self.data_dir = data_dir
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+
+        self.sequence = 0
+        self.entries_since_snapshot = 0
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = None
+        # Pending fsync of entries appended within the interval
+        self._fsync_timer: Optional[threading.Timer] = None
+
+        os.makedirs(data_dir, exist_ok=True)
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.data_dir, SNAPSHOT_FILE)
+
+    @property
+    def journal_path(self) -> str:
+        return os.path.join(self.data_dir, JOURNAL_FILE)
+
+    @property
+    def rotated_journal_path(self) -> str:
+        return os.path.join(self.data_dir, ROTATED_JOURNAL_FILE)
+
+    def load(self) -> Tuple[Optional[Dict[str, Any]], List[Tuple[str, List[str], Any]]]:
+        """
+        Load the latest snapshot and the journal entries written after it
+        Returns (snapshot database or None, list of (operation, path_parts, value))
+        """
+        db = None
+        snapshot_sequence = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'rb') as f:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    raise ValueError(f"{self.snapshot_path} is not a local data snapshot")
+                state = pickle.load(f)
+            db = state['db']
+            snapshot_sequence = state['sequence']
+
+        entries = []
+        self.sequence = snapshot_sequence
+        valid_length = 0
+
+        # A rotated journal is left behind when a snapshot did not complete
+        data = b''
+        for path in (self.rotated_journal_path, self.journal_path):
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data += f.read()
+
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            length, checksum = _HEADER.unpack_from(data, offset)
+            payload = data[offset + _HEADER.size:offset + _HEADER.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                print(f"Local journal: discarding torn record at offset {offset}")
+                break
+
+            sequence, operation, path_parts, value = pickle.loads(payload)
+            offset += _HEADER.size + length
+            valid_length = offset
+
+            # Entries up to the snapshot sequence are already part of the snapshot,
+            # entries copied to the rotated journal by an interrupted rotation appear twice
+            if sequence <= self.sequence:
+                continue
+            entries.append((operation, path_parts, value))
+            self.sequence = sequence
+
+        if valid_length < len(data) or os.path.exists(self.rotated_journal_path):
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data[:valid_length])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            if os.path.exists(self.rotated_journal_path):
+                os.remove(self.rotated_journal_path)
+
+        self.entries_since_snapshot = len(entries)
+        self._file = open(self.journal_path, 'ab')
+        return db, entries
+
+    def append(self, operation: str, path_parts: List[str], value: Any = None):
+        """Append a mutation to the journal"""
+        with self._lock:
+            self.sequence += 1
+            payload = pickle.dumps((self.sequence, operation, list(path_parts), value), protocol=pickle.HIGHEST_PROTOCOL)
+            self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            self.entries_since_snapshot += 1
+
+            if self.fsync_policy == 'always':
+                self._sync()
+            elif self.fsync_policy == 'interval':
+                wait = self.fsync_interval - (time.monotonic() - self._last_fsync)
+                if wait <= 0:
+                    self._sync()
+                elif self._fsync_timer is None:
+                    # Synced by the timer even if no later entry is appended
+                    self._fsync_timer = threading.Timer(wait, self._timed_sync)
+                    self._fsync_timer.daemon = True
+                    self._fsync_timer.start()
+
+    def needs_snapshot(self) -> bool:
+        """Whether enough entries were journaled since the last snapshot"""
+        return self.snapshot_every > 0 and self.entries_since_snapshot >= self.snapshot_every
+
+    def rotate(self) -> int:
+        """
+        Start a new journal file for the entries after the next snapshot
+        Returns the sequence of the last entry in the rotated journal, which the
+        snapshot passed to write_snapshot must contain
+        """
+        with self._lock:
+            self._sync()
+            self._file.close()
+            if os.path.exists(self.rotated_journal_path):
+                # Left by a snapshot that failed, its entries must not be overwritten
+                with open(self.journal_path, 'rb') as journal, open(self.rotated_journal_path, 'ab') as rotated:
+                    shutil.copyfileobj(journal, rotated)
+                    rotated.flush()
+                    os.fsync(rotated.fileno())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_journal_path)
+            self._file = open(self.journal_path, 'ab')
+            self.entries_since_snapshot = 0
+            return self.sequence
+
+    def write_snapshot(self, db: Dict[str, Any], sequence: int):
+        """Write a compacted snapshot of the database and drop the rotated journal it replaces"""
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            pickle.dump({'sequence': sequence, 'db': db}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        if os.path.exists(self.rotated_journal_path):
+            os.remove(self.rotated_journal_path)
+
+    def snapshot(self, db: Dict[str, Any]):
+        """Write a compacted snapshot of the database, which must include every journaled entry"""
+        self.write_snapshot(db, self.rotate())
+
+    def flush(self):
+        """Flush buffered journal entries to disk"""
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._sync()
+
+    def close(self):
+        """Flush and close the journal"""
+        with self._lock:
+            if self._file and not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def _timed_sync(self):
+        with self._lock:
+            self._fsync_timer = None
+            if self._file and not self._file.closed:
+                self._sync()
+
+    def _sync(self):
+        if self._fsync_timer is not None:
+            self._fsync_timer.cancel()
+            self._fsync_timer = None
+        self._file.flush()
+        if self.fsync_policy != 'never':
+            os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
@@ -0,0 +1,40 @@
+"""
+FastAPI dependencies providing the shared services
+
+The services are created once in the application lifespan and kept on
+app.state. When the lifespan did not run (e.g. an ASGI transport in tests or
+benchmarks) they are created on first use instead.
+"""
+
+from starlette.requests import HTTPConnection
+
+from services.data_service import DataService, get_data_service
+
+
+def provide_data_service(connection: HTTPConnection) -> DataService:
+    """The data service of the application"""
+    state = connection.app.state
+    service = getattr(state, 'data_service', None)
+    if service is None:
+        service = state.data_service = get_data_service()
+    return service
+
+
+def provide_attendance_service(connection: HTTPConnection):
+    """The attendance service of the application"""
+    state = connection.app.state
+    service = getattr(state, 'attendance_service', None)
+    if service is None:
+        from services.attendance_service import AttendanceService
+        service = state.attendance_service = AttendanceService(provide_data_service(connection))
+    return service
+
+
+def provide_fingerprint_util(connection: HTTPConnection):
+    """The fingerprint sensor utility of the application"""
+    state = connection.app.state
+    util = getattr(state, 'fingerprint_util', None)
+    if util is None:
+        from utils.fingerprint_util import FingerprintUtil
+        util = state.fingerprint_util = FingerprintUtil()
+    return util
@@ -0,0 +1,89 @@
+"""
+In-memory cache of attendance reports
+
+A report of a class on a date only changes when attendance is recorded for
+that class and date, or when the class, its enrollments or the students in it
+change. The cache listens to the writes of the data service and drops exactly
+the affected reports, so repeated views of a report during and after a
+lecture are served from memory.
+
+Only writes made through this process are seen, so like the cache tier of
+the data service every report also expires after a time to live
+(REPORT_CACHE_TTL, by default DATA_CACHE_TTL seconds). Writes made by other
+processes are then served at most that late.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Callable
+
+from utils.data_util import clone_data
+from utils.metrics import record_cache_lookup
+
+
+class ReportCache:
+    """LRU cache of attendance reports by (class_id, date) with a time to live, invalidated by data service writes"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        # Incremented by every invalidation, a report computed across one is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, class_id: str, date: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """The cached report, or the result of compute which is cached unless it is an error"""
+        key = (class_id, date)
+        with self._lock:
+            entry = self._entries.get(key)
+            report = None
+            if entry is not None:
+                if entry[0] < time.monotonic():
+                    del self._entries[key]
+                else:
+                    report = entry[1]
+                    self._entries.move_to_end(key)
+            generation = self._generation
+
+        record_cache_lookup('attendance_report', report is not None)
+        if report is not None:
+            return clone_data(report)
+
+        report = compute()
+        if "error" not in report:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic() + self.ttl, clone_data(report))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return report
+
+    def invalidate(self, class_id: Optional[str] = None, date: Optional[str] = None):
+        """Drop the reports of a class on a date, of a class on all dates, or everything"""
+        with self._lock:
+            self._generation += 1
+            if class_id is None:
+                self._entries.clear()
+            elif date is not None:
+                self._entries.pop((class_id, date), None)
+            else:
+                for key in [key for key in self._entries if key[0] == class_id]:
+                    del self._entries[key]
+
+    def on_write(self, operation: str, args: Tuple, result: Any):
+        """Data service write listener"""
+        if operation == 'create_attendance':
+            record = args[0]
+            self.invalidate(record.get('class_id'), record.get('timestamp', '').split(' ')[0])
+        elif operation == 'save_report':
+            self.invalidate(args[0]['class_id'], args[0]['date'])
+        elif operation in ('update_class', 'delete_class'):
+            self.invalidate(args[0])
+        elif operation == 'enroll_student_in_class':
+            self.invalidate(args[1])
+        elif operation in ('update_student', 'delete_student'):
+            # Names and enrollments of the student appear in reports of any of their classes
+            self.invalidate()
@@ -0,0 +1,96 @@
+"""
+Migration of Firestore attendance to one roll document per session
+
+Copies the per check-in documents of the attendance collection into the
+attendance_rolls documents, one day at a time. It runs while the application
+is in the dual phase (ATTENDANCE_MODEL=dual), which writes check-ins to rolls
+and still reads the attendance collection. A record already present in a roll
+is left alone, so check-ins written during the migration are never
+overwritten and it can be run again safely. Afterwards the model is switched
+to rolls, and with delete set the migrated documents are removed.
+"""
+
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from services.firebase_service import MAX_BATCH_SIZE, ROLLS_COLLECTION, roll_id, roll_fields
+
+
+class RollMigration:
+    """Moves attendance documents into session rolls with batched writes"""
+
+    def __init__(self, db, batch_size: int = MAX_BATCH_SIZE, delete: bool = False, dry_run: bool = False):
+        self.db = db
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.delete = delete
+        self.dry_run = dry_run
+        self.stats = {'records': 0, 'migrated': 0, 'skipped': 0, 'rolls': 0, 'deleted': 0}
+
+    def run(self, start_date: Optional[str] = None) -> Dict[str, Any]:
+        """Migrate the records on or after start_date (YYYY-MM-DD), all of them without"""
+        start = time.perf_counter()
+        query = self.db.collection('attendance')
+        if start_date:
+            query = query.where('timestamp', '>=', f"{start_date} 00:00:00")
+
+        # Ordered by timestamp, so the records of a day arrive together
+        day = None
+        pending: List[Tuple[Any, Dict[str, Any]]] = []
+        for doc in query.order_by('timestamp').stream():
+            record = doc.to_dict()
+            self.stats['records'] += 1
+            record_day = record.get('timestamp', '').split(' ')[0]
+            if record_day != day:
+                self._migrate_day(pending)
+                day = record_day
+                pending = []
+            pending.append((doc.reference, record))
+        self._migrate_day(pending)
+
+        self.stats['elapsed'] = round(time.perf_counter() - start, 2)
+        return self.stats
+
+    def _migrate_day(self, documents: List[Tuple[Any, Dict[str, Any]]]):
+        """Merge the records of one day into their rolls"""
+        if not documents:
+            return
+
+        sessions: Dict[Tuple[str, str], List[Tuple[Any, Dict[str, Any]]]] = {}
+        for reference, record in documents:
+            date = record.get('timestamp', '').split(' ')[0]
+            sessions.setdefault((record.get('class_id'), date), []).append((reference, record))
+
+        # Students already in each roll, read with one batched get
+        roll_refs = [self.db.collection(ROLLS_COLLECTION).document(roll_id(class_id, date)) for class_id, date in sessions]
+        existing = {}
+        for roll_doc in self.db.get_all(roll_refs):
+            if roll_doc.exists:
+                existing[roll_doc.id] = set(roll_doc.to_dict().get('records', {}))
+
+        writes = []
+        for (class_id, date), session_documents in sessions.items():
+            present = existing.get(roll_id(class_id, date), set())
+            records = [record for _, record in session_documents if record.get('student_id') not in present]
+            self.stats['skipped'] += len(session_documents) - len(records)
+            if records:
+                writes.append(('merge', roll_id(class_id, date), roll_fields(class_id, date, records)))
+                self.stats['migrated'] += len(records)
+                self.stats['rolls'] += 1
+            if self.delete:
+                writes.extend(('delete', reference, None) for reference, _ in session_documents)
+                self.stats['deleted'] += len(session_documents)
+
+        self._commit(writes)
+
+    def _commit(self, writes: List[Tuple[str, Any, Any]]):
+        """Commit the writes in batches, rolls are merged before the documents they replace are deleted"""
+        if self.dry_run:
+            return
+        for offset in range(0, len(writes), self.batch_size):
+            batch = self.db.batch()
+            for kind, target, fields in writes[offset:offset + self.batch_size]:
+                if kind == 'merge':
+                    batch.set(self.db.collection(ROLLS_COLLECTION).document(target), fields, merge=True)
+                else:
+                    batch.delete(target)
+            batch.commit()
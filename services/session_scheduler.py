@@ -0,0 +1,264 @@
+"""
+Session scheduler: cache prewarming and end of session roll materialization
+
+A background task of the application that watches the class schedules.
+
+A few minutes before a session starts, the classes and the students enrolled
+in it are loaded into the cache tiers of the data service, by ID and by
+fingerprint, and held there until the session has started. The first scans
+of a lecture are then answered from memory instead of waiting for Firestore.
+
+Once the last minute of a session has passed, its roll is closed: students
+without a record get an absent record and the final report (present, late
+and absent) is stored as one document per class and date. Historical reports
+are then read from that document instead of joining enrollments and
+attendance again.
+
+On startup the sessions that ended earlier today are materialized again, so a
+restart does not leave rolls open.
+
+Every worker process prewarms its own caches, but only the process holding
+the scheduler lease (an exclusive lock on SESSION_SCHEDULER_LOCK) closes
+rolls when their sessions end; another one takes over if it exits. Reports
+outdated by attendance recorded after a session of that day ended (e.g.
+readers syncing offline scans) are materialized again on the next check by
+the process that recorded it, lease or not. The schedules are read once and
+read again after a class is written through this process, or after
+SESSION_SCHEDULE_REFRESH seconds for writes made elsewhere.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+# The lease is a file lock, without fcntl every process closes rolls
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from starlette.concurrency import run_in_threadpool
+
+from utils.metrics import counter
+from utils.time_util import get_current_time, ended_sessions, upcoming_sessions
+
+ROLLS_MATERIALIZED = counter(
+    'attendance_rolls_materialized_total',
+    'Session rolls closed into a materialized report, by result',
+    ['result']
+)
+SESSIONS_PREWARMED = counter(
+    'session_cache_prewarms_total',
+    'Sessions whose class and students were loaded into the caches before they started, by result',
+    ['result']
+)
+
+# All the scheduler reads of the classes
+SCHEDULE_FIELDS = ('class_id', 'class_name', 'schedules')
+CLASS_WRITES = ('create_class', 'update_class', 'delete_class')
+
+
+class SchedulerLease:
+    """An exclusive lock on a file, held by the one process that closes rolls"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Whether this process holds the lease, taking it if it is free"""
+        if self._file is not None or fcntl is None:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        print(f"Session scheduler: holding the lease {self.path}, closing rolls in this process")
+        return True
+
+    def release(self):
+        """Give the lease up, closing the file drops the lock"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SessionScheduler:
+    """Prewarms the caches before every session and materializes its report when it ends"""
+
+    def __init__(self, attendance_service, interval: float = 60.0, materialize: bool = True,
+                 prewarm_lead: float = 0.0, lease: Optional[SchedulerLease] = None,
+                 schedule_refresh: float = 600.0):
+        """
+        prewarm_lead is the number of seconds before a session its caches are warmed, 0 disables.
+        With a lease, rolls are only closed at the end of their sessions while holding it.
+        """
+        self.attendance_service = attendance_service
+        self.data_service = attendance_service.data_service
+        self.interval = interval
+        self.materialize = materialize
+        self.prewarm_lead = prewarm_lead
+        self.lease = lease
+        self.schedule_refresh = schedule_refresh
+        self._last_check: Optional[datetime] = None
+        self._prewarmed: Set[Tuple[str, str, str]] = set()
+        self._task: Optional[asyncio.Task] = None
+
+        # Schedules read from the data service, dropped by class writes
+        self._classes: Optional[Dict[str, Any]] = None
+        self._classes_read_at = 0.0
+        # Incremented by every class write, classes read across one are not kept
+        self._class_writes = 0
+        self._classes_lock = threading.Lock()
+        if hasattr(self.data_service, 'add_write_listener'):
+            self.data_service.add_write_listener(self._on_write)
+
+    def start(self):
+        """Start checking in the background of the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.lease:
+            self.lease.release()
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.check)
+            except Exception as e:
+                print(f"Session scheduler: check failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def check(self, now: Optional[datetime] = None) -> int:
+        """Prewarm the sessions about to start and materialize the sessions that ended since the last check, returns how many were materialized"""
+        if now is None:
+            now = get_current_time().replace(tzinfo=None)
+
+        classes = self._schedules()
+        if self.prewarm_lead > 0:
+            self._prewarm(classes, now)
+        if not self.materialize:
+            return 0
+
+        materialized = 0
+        done = set()
+        if not self.lease or self.lease.acquire():
+            # Scans are accepted until the end of the end minute, so a session is
+            # only closed once that minute has passed
+            until = now - timedelta(minutes=1)
+            since = self._last_check or datetime.combine(until.date(), datetime.min.time()) - timedelta(microseconds=1)
+            for session in ended_sessions(classes, since, until):
+                materialized += self._materialize(session['class_id'], session['date'], session['end_time'])
+                done.add((session['class_id'], session['date']))
+            # Only advance after a complete pass, a failed check is retried
+            self._last_check = until
+
+        # Late attendance is only seen by the process that recorded it, which
+        # closes those rolls again whether or not it holds the lease
+        for class_id, date, end_time in self.attendance_service.stale_reports():
+            if (class_id, date) not in done:
+                materialized += self._materialize(class_id, date, end_time)
+        return materialized
+
+    def _schedules(self) -> Dict[str, Any]:
+        """The classes with their schedules, read again after a class write or once they are schedule_refresh seconds old"""
+        with self._classes_lock:
+            if self._classes is not None and time.monotonic() - self._classes_read_at < self.schedule_refresh:
+                return self._classes
+            class_writes = self._class_writes
+
+        read_at = time.monotonic()
+        classes = self.data_service.get_all_classes(SCHEDULE_FIELDS)
+        with self._classes_lock:
+            if class_writes == self._class_writes:
+                self._classes = classes
+                self._classes_read_at = read_at
+        return classes
+
+    def _on_write(self, operation: str, args: Tuple, result: Any):
+        """Data service write listener dropping the schedules when a class is written"""
+        if operation in CLASS_WRITES:
+            with self._classes_lock:
+                self._class_writes += 1
+                self._classes = None
+
+    def _prewarm(self, classes, now: datetime):
+        """Warm the caches for the sessions starting within the lead time that are not warm yet"""
+        upcoming = {
+            (session['class_id'], session['date'], session['start_time']): session
+            for session in upcoming_sessions(classes, start=now, hours=self.prewarm_lead / 3600)
+        }
+        # Ended sessions are no longer upcoming and are forgotten
+        self._prewarmed.intersection_update(upcoming)
+        sessions = [session for key, session in upcoming.items() if key not in self._prewarmed]
+        if not sessions:
+            return
+
+        # Held until the last of these sessions has started, then the normal TTL applies
+        latest_start = max(datetime.strptime(f"{session['date']} {session['start_time']}", '%Y-%m-%d %H:%M')
+                           for session in sessions)
+        hold = max((latest_start - now).total_seconds(), 0.0)
+        try:
+            students = self.data_service.prewarm([session['class_id'] for session in sessions], hold)
+        except Exception as e:
+            SESSIONS_PREWARMED.labels('error').inc(len(sessions))
+            print(f"Session scheduler: prewarming {len(sessions)} sessions failed: {str(e)}")
+            return
+
+        SESSIONS_PREWARMED.labels('warmed').inc(len(sessions))
+        self._prewarmed.update(upcoming)
+        print(f"Session scheduler: prewarmed {len(sessions)} sessions with {students} students")
+
+    def _materialize(self, class_id: str, date: str, end_time: Optional[str] = None) -> int:
+        """Materialize one roll, returns 1 if it was stored"""
+        try:
+            report = self.attendance_service.materialize_report(class_id, date, end_time)
+        except Exception as e:
+            ROLLS_MATERIALIZED.labels('error').inc()
+            print(f"Session scheduler: materializing class {class_id} on {date} failed: {str(e)}")
+            return 0
+
+        if "error" in report:
+            ROLLS_MATERIALIZED.labels('skipped').inc()
+            return 0
+        ROLLS_MATERIALIZED.labels('stored').inc()
+        return 1
+
+
+def create_session_scheduler(attendance_service) -> Optional[SessionScheduler]:
+    """
+    The scheduler configured by SESSION_MATERIALIZATION, SESSION_PREWARM_MINUTES,
+    SESSION_CHECK_INTERVAL, SESSION_SCHEDULER_LOCK and SESSION_SCHEDULE_REFRESH,
+    None when it has nothing to do
+    """
+    materialize = os.environ.get('SESSION_MATERIALIZATION', 'true').lower() == 'true'
+    # Prewarming needs a cache tier to warm
+    prewarm_lead = 0.0
+    if getattr(attendance_service.data_service, 'caches', None):
+        prewarm_lead = float(os.environ.get('SESSION_PREWARM_MINUTES', '5')) * 60
+    if not materialize and prewarm_lead <= 0:
+        return None
+    # An empty lock path lets every process close rolls
+    lock_path = os.environ.get('SESSION_SCHEDULER_LOCK', 'data/session_scheduler.lock')
+    return SessionScheduler(attendance_service, float(os.environ.get('SESSION_CHECK_INTERVAL', '60')),
+                            materialize, prewarm_lead,
+                            lease=SchedulerLease(lock_path) if lock_path else None,
+                            schedule_refresh=float(os.environ.get('SESSION_SCHEDULE_REFRESH', '600')))
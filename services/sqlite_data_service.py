@@ -0,0 +1,522 @@
+"""
+SQLite Data Service for sites without reliable connectivity
+
+Stores classes, students, enrollments and attendance in normalized tables of a
+local SQLite database, so a single edge box can serve a building without a
+network connection. The service has the same methods as FirebaseService.
+
+The database runs in WAL mode so readers never wait for the writer, and every
+thread gets its own connection. All SQL is kept in module constants so the
+sqlite3 statement cache reuses the prepared statements.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+from utils.data_util import project
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classes (
+    class_id TEXT PRIMARY KEY,
+    class_name TEXT NOT NULL,
+    lecturer TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS class_schedules (
+    class_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    day_of_week TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    room_number TEXT,
+    PRIMARY KEY (class_id, position)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS class_schedules_day ON class_schedules (day_of_week, start_time);
+
+CREATE TABLE IF NOT EXISTS students (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    fingerprint_id INTEGER,
+    extra TEXT
+);
+
+CREATE INDEX IF NOT EXISTS students_fingerprint ON students (fingerprint_id);
+
+CREATE TABLE IF NOT EXISTS enrollments (
+    student_id TEXT NOT NULL,
+    class_id TEXT NOT NULL,
+    UNIQUE (student_id, class_id)
+);
+
+CREATE INDEX IF NOT EXISTS enrollments_class ON enrollments (class_id, student_id);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    class_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    attendance_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'present',
+    extra TEXT,
+    PRIMARY KEY (class_id, date, student_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS attendance_student ON attendance (student_id, class_id, date);
+CREATE INDEX IF NOT EXISTS attendance_timestamp ON attendance (timestamp);
+
+CREATE TABLE IF NOT EXISTS reports (
+    class_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    report TEXT NOT NULL,
+    PRIMARY KEY (class_id, date)
+) WITHOUT ROWID;
+"""
+
+# Classes
+SELECT_CLASS = "SELECT class_id, class_name, lecturer, extra FROM classes WHERE class_id = ?"
+SELECT_CLASSES = "SELECT class_id, class_name, lecturer, extra FROM classes"
+UPSERT_CLASS = ("INSERT INTO classes (class_id, class_name, lecturer, extra) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (class_id) DO UPDATE SET class_name = excluded.class_name, "
+                "lecturer = excluded.lecturer, extra = excluded.extra")
+DELETE_CLASS = "DELETE FROM classes WHERE class_id = ?"
+
+SELECT_SCHEDULES = ("SELECT class_id, day_of_week, start_time, end_time, room_number "
+                    "FROM class_schedules WHERE class_id = ? ORDER BY position")
+SELECT_ALL_SCHEDULES = ("SELECT class_id, day_of_week, start_time, end_time, room_number "
+                        "FROM class_schedules ORDER BY class_id, position")
+INSERT_SCHEDULE = ("INSERT INTO class_schedules (class_id, position, day_of_week, start_time, end_time, room_number) "
+                   "VALUES (?, ?, ?, ?, ?, ?)")
+DELETE_SCHEDULES = "DELETE FROM class_schedules WHERE class_id = ?"
+
+# Students
+SELECT_STUDENT = "SELECT student_id, name, fingerprint_id, extra FROM students WHERE student_id = ?"
+SELECT_STUDENT_BY_FINGERPRINT = ("SELECT student_id, name, fingerprint_id, extra FROM students "
+                                 "WHERE fingerprint_id = ? ORDER BY rowid LIMIT 1")
+SELECT_STUDENTS = "SELECT student_id, name, fingerprint_id, extra FROM students"
+UPSERT_STUDENT = ("INSERT INTO students (student_id, name, fingerprint_id, extra) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT (student_id) DO UPDATE SET name = excluded.name, "
+                  "fingerprint_id = excluded.fingerprint_id, extra = excluded.extra")
+DELETE_STUDENT = "DELETE FROM students WHERE student_id = ?"
+
+# Enrollments, ordered by rowid so lists keep their enrollment order
+SELECT_CLASS_ENROLLMENTS = "SELECT student_id FROM enrollments WHERE class_id = ? ORDER BY rowid"
+SELECT_STUDENT_ENROLLMENTS = "SELECT class_id FROM enrollments WHERE student_id = ? ORDER BY rowid"
+SELECT_ALL_ENROLLMENTS = "SELECT student_id, class_id FROM enrollments ORDER BY rowid"
+INSERT_ENROLLMENT = "INSERT OR IGNORE INTO enrollments (student_id, class_id) VALUES (?, ?)"
+DELETE_CLASS_ENROLLMENTS = "DELETE FROM enrollments WHERE class_id = ?"
+DELETE_STUDENT_ENROLLMENTS = "DELETE FROM enrollments WHERE student_id = ?"
+
+# Attendance
+ATTENDANCE_COLUMNS = "attendance_id, student_id, class_id, timestamp, status, extra"
+UPSERT_ATTENDANCE = ("INSERT OR REPLACE INTO attendance "
+                     "(class_id, date, student_id, attendance_id, timestamp, status, extra) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)")
+INSERT_MISSING_ATTENDANCE = ("INSERT OR IGNORE INTO attendance "
+                             "(class_id, date, student_id, attendance_id, timestamp, status, extra) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)")
+SELECT_ATTENDANCE = f"SELECT {ATTENDANCE_COLUMNS} FROM attendance WHERE class_id = ? AND date = ?"
+SELECT_STUDENT_ATTENDANCE = f"SELECT date, {ATTENDANCE_COLUMNS} FROM attendance WHERE student_id = ?"
+SELECT_ATTENDANCE_SINCE = (f"SELECT {ATTENDANCE_COLUMNS} FROM attendance "
+                           "WHERE timestamp >= ? ORDER BY timestamp")
+
+# Materialized reports
+UPSERT_REPORT = "INSERT OR REPLACE INTO reports (class_id, date, report) VALUES (?, ?, ?)"
+SELECT_REPORT = "SELECT report FROM reports WHERE class_id = ? AND date = ?"
+
+CLASS_COLUMNS = ('class_id', 'class_name', 'lecturer', 'schedules', 'enrolled_students')
+SCHEDULE_COLUMNS = ('day_of_week', 'start_time', 'end_time', 'room_number')
+STUDENT_COLUMNS = ('student_id', 'name', 'fingerprint_id', 'enrolled_classes')
+RECORD_COLUMNS = ('attendance_id', 'student_id', 'class_id', 'timestamp', 'status')
+
+
+def _extra(data: Dict[str, Any], columns: Iterable[str]) -> Optional[str]:
+    """Serialize the fields that have no column of their own"""
+    extra = {key: value for key, value in data.items() if key not in columns}
+    return json.dumps(extra) if extra else None
+
+
+def _with_extra(document: Dict[str, Any], extra: Optional[str]) -> Dict[str, Any]:
+    """Merge the serialized extra fields back into a document"""
+    if extra:
+        document.update(json.loads(extra))
+    return document
+
+
+def _wanted(field: str, fields: Optional[Tuple[str, ...]]) -> bool:
+    """Whether a projection includes a field, no projection includes all"""
+    return not fields or field in fields
+
+
+def _projected(document: Optional[Dict[str, Any]], fields: Optional[Tuple[str, ...]]) -> Optional[Dict[str, Any]]:
+    """A document reduced to the given fields, unchanged without a projection"""
+    if document is None or not fields:
+        return document
+    return project(document, fields)
+
+
+def _attendance_record(row) -> Dict[str, Any]:
+    """Build an attendance record from (attendance_id, student_id, class_id, timestamp, status, extra)"""
+    attendance_id, student_id, class_id, timestamp, status, extra = row
+    return _with_extra({
+        'attendance_id': attendance_id,
+        'student_id': student_id,
+        'class_id': class_id,
+        'timestamp': timestamp,
+        'status': status
+    }, extra)
+
+
+class SQLiteDataService:
+    """Service storing the attendance system data in a local SQLite database"""
+
+    _instance = None
+
+    def __new__(cls):
+        """Singleton pattern to ensure only one database per process"""
+        if cls._instance is None:
+            cls._instance = super(SQLiteDataService, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self, path: Optional[str] = None):
+        """Create the database and its tables if needed"""
+        self.path = path or os.environ.get('SQLITE_DB_PATH', 'data/attendance.db')
+        self._local = threading.local()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+
+        print(f"SQLite database initialized at {self.path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, multi-statement writes use explicit transactions
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one write transaction and yield the connection"""
+        conn = self._connection()
+        if conn.in_transaction:
+            # Nested use joins the outer transaction
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Documents
+    def put_class(self, class_data: Dict[str, Any], replace_enrollments: bool = True):
+        """
+        Insert or replace a class document, including its schedules and enrolled
+        students. Without replace_enrollments the enrolled students are added to
+        the existing ones.
+        """
+        with self.transaction() as conn:
+            class_id = class_data['class_id']
+            conn.execute(UPSERT_CLASS, (class_id, class_data.get('class_name', ''), class_data.get('lecturer'),
+                                        _extra(class_data, CLASS_COLUMNS)))
+
+            conn.execute(DELETE_SCHEDULES, (class_id,))
+            conn.executemany(INSERT_SCHEDULE, [
+                (class_id, position, schedule.get('day_of_week'), schedule.get('start_time'),
+                 schedule.get('end_time'), schedule.get('room_number'))
+                for position, schedule in enumerate(class_data.get('schedules') or [])
+            ])
+
+            if replace_enrollments:
+                conn.execute(DELETE_CLASS_ENROLLMENTS, (class_id,))
+            conn.executemany(INSERT_ENROLLMENT, [
+                (student_id, class_id) for student_id in class_data.get('enrolled_students') or []
+            ])
+
+    def put_student(self, student_data: Dict[str, Any], replace_enrollments: bool = True):
+        """
+        Insert or replace a student document, including the classes it is
+        enrolled in. Without replace_enrollments the classes are added to the
+        existing enrollments.
+        """
+        with self.transaction() as conn:
+            student_id = student_data['student_id']
+            conn.execute(UPSERT_STUDENT, (student_id, student_data.get('name', ''), student_data.get('fingerprint_id'),
+                                          _extra(student_data, STUDENT_COLUMNS)))
+
+            if replace_enrollments:
+                conn.execute(DELETE_STUDENT_ENROLLMENTS, (student_id,))
+            conn.executemany(INSERT_ENROLLMENT, [
+                (student_id, class_id) for class_id in student_data.get('enrolled_classes') or []
+            ])
+
+    def put_enrollments(self, enrollments: List[tuple]):
+        """Add (student_id, class_id) enrollments, existing ones are left untouched"""
+        with self.transaction() as conn:
+            conn.executemany(INSERT_ENROLLMENT, enrollments)
+
+    def put_attendance(self, records: List[Dict[str, Any]], replace: bool = True):
+        """
+        Insert or replace attendance records, one per class, date and student
+        Without replace, the existing record of a student is kept
+        """
+        rows = []
+        for record in records:
+            rows.append((
+                record.get('class_id'),
+                record.get('timestamp', '').split(' ')[0],
+                record.get('student_id'),
+                record.get('attendance_id'),
+                record.get('timestamp', ''),
+                record.get('status', 'present'),
+                _extra(record, RECORD_COLUMNS)
+            ))
+
+        with self.transaction() as conn:
+            conn.executemany(UPSERT_ATTENDANCE if replace else INSERT_MISSING_ATTENDANCE, rows)
+
+    # Class operations
+    def create_class(self, class_data: Dict[str, Any]) -> str:
+        """Create a new class in the database"""
+        class_id = str(uuid.uuid4())
+        class_data['class_id'] = class_id
+        class_data['enrolled_students'] = []
+
+        self.put_class(class_data)
+
+        return class_id
+
+    def get_class(self, class_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a class by ID, only the given fields when set"""
+        conn = self._connection()
+        row = conn.execute(SELECT_CLASS, (class_id,)).fetchone()
+        if row is None:
+            return None
+
+        schedules = conn.execute(SELECT_SCHEDULES, (class_id,)).fetchall() if _wanted('schedules', fields) else []
+        enrolled = conn.execute(SELECT_CLASS_ENROLLMENTS, (class_id,)).fetchall() if _wanted('enrolled_students', fields) else []
+        return _projected(self._class_document(row, schedules, [student_id for student_id, in enrolled]), fields)
+
+    def get_all_classes(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all classes, only the given fields when set"""
+        conn = self._connection()
+
+        # Three queries for the whole collection instead of three per class,
+        # the schedule and enrollment queries are skipped when not projected
+        schedules: Dict[str, List] = {}
+        if _wanted('schedules', fields):
+            for row in conn.execute(SELECT_ALL_SCHEDULES):
+                schedules.setdefault(row[0], []).append(row)
+
+        enrolled: Dict[str, List[str]] = {}
+        if _wanted('enrolled_students', fields):
+            for student_id, class_id in conn.execute(SELECT_ALL_ENROLLMENTS):
+                enrolled.setdefault(class_id, []).append(student_id)
+
+        return {
+            row[0]: _projected(self._class_document(row, schedules.get(row[0], []), enrolled.get(row[0], [])), fields)
+            for row in conn.execute(SELECT_CLASSES)
+        }
+
+    def update_class(self, class_id: str, class_data: Dict[str, Any]) -> bool:
+        """Update a class"""
+        with self.transaction() as conn:
+            if conn.execute(SELECT_CLASS, (class_id,)).fetchone() is None:
+                return False
+
+            # Preserve enrolled_students and class_id
+            enrolled = conn.execute(SELECT_CLASS_ENROLLMENTS, (class_id,)).fetchall()
+            class_data['enrolled_students'] = [student_id for student_id, in enrolled]
+            class_data['class_id'] = class_id
+
+            self.put_class(class_data)
+            return True
+
+    def delete_class(self, class_id: str) -> bool:
+        """Delete a class and remove it from the enrolled students"""
+        with self.transaction() as conn:
+            if conn.execute(DELETE_CLASS, (class_id,)).rowcount == 0:
+                return False
+
+            conn.execute(DELETE_SCHEDULES, (class_id,))
+            conn.execute(DELETE_CLASS_ENROLLMENTS, (class_id,))
+            return True
+
+    # Student operations
+    def create_student(self, student_data: Dict[str, Any]) -> str:
+        """Create a new student in the database"""
+        student_id = str(uuid.uuid4())
+        student_data['student_id'] = student_id
+        student_data['enrolled_classes'] = []
+
+        self.put_student(student_data)
+
+        return student_id
+
+    def get_student(self, student_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+        """Get a student by ID, only the given fields when set"""
+        conn = self._connection()
+        row = conn.execute(SELECT_STUDENT, (student_id,)).fetchone()
+        if row is not None and not _wanted('enrolled_classes', fields):
+            return _projected(self._student_document(row, []), fields)
+        return _projected(self._student_with_enrollments(conn, row), fields)
+
+    def get_student_by_fingerprint(self, fingerprint_id: int) -> Optional[Dict[str, Any]]:
+        """Get a student by fingerprint ID"""
+        conn = self._connection()
+        row = conn.execute(SELECT_STUDENT_BY_FINGERPRINT, (fingerprint_id,)).fetchone()
+        return self._student_with_enrollments(conn, row)
+
+    def get_all_students(self, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+        """Get all students, only the given fields when set"""
+        conn = self._connection()
+
+        enrolled: Dict[str, List[str]] = {}
+        if _wanted('enrolled_classes', fields):
+            for student_id, class_id in conn.execute(SELECT_ALL_ENROLLMENTS):
+                enrolled.setdefault(student_id, []).append(class_id)
+
+        return {
+            row[0]: _projected(self._student_document(row, enrolled.get(row[0], [])), fields)
+            for row in conn.execute(SELECT_STUDENTS)
+        }
+
+    def update_student(self, student_id: str, student_data: Dict[str, Any]) -> bool:
+        """Update a student"""
+        with self.transaction() as conn:
+            if conn.execute(SELECT_STUDENT, (student_id,)).fetchone() is None:
+                return False
+
+            # Preserve enrolled_classes and student_id
+            enrolled = conn.execute(SELECT_STUDENT_ENROLLMENTS, (student_id,)).fetchall()
+            student_data['enrolled_classes'] = [class_id for class_id, in enrolled]
+            student_data['student_id'] = student_id
+
+            self.put_student(student_data)
+            return True
+
+    def delete_student(self, student_id: str) -> bool:
+        """Delete a student and remove it from the classes it is enrolled in"""
+        with self.transaction() as conn:
+            if conn.execute(DELETE_STUDENT, (student_id,)).rowcount == 0:
+                return False
+
+            conn.execute(DELETE_STUDENT_ENROLLMENTS, (student_id,))
+            return True
+
+    def enroll_student_in_class(self, student_id: str, class_id: str) -> bool:
+        """Enroll a student in a class"""
+        with self.transaction() as conn:
+            if (conn.execute(SELECT_STUDENT, (student_id,)).fetchone() is None or
+                    conn.execute(SELECT_CLASS, (class_id,)).fetchone() is None):
+                return False
+
+            conn.execute(INSERT_ENROLLMENT, (student_id, class_id))
+            return True
+
+    # Attendance operations
+    def create_attendance(self, attendance_data: Dict[str, Any]) -> str:
+        """Create a new attendance record in the database"""
+        attendance_id = str(uuid.uuid4())
+        attendance_data['attendance_id'] = attendance_id
+
+        self.put_attendance([attendance_data])
+
+        return attendance_id
+
+    def get_attendance(self, class_id: str, date: str) -> Dict[str, Any]:
+        """Get attendance records for a class on a specific date"""
+        rows = self._connection().execute(SELECT_ATTENDANCE, (class_id, date))
+        return {row[1]: _attendance_record(row) for row in rows}
+
+    def get_student_attendance(self, student_id: str) -> Dict[str, Any]:
+        """Get all attendance records for a student"""
+        student_attendance = {}
+        for row in self._connection().execute(SELECT_STUDENT_ATTENDANCE, (student_id,)):
+            record = _attendance_record(row[1:])
+            student_attendance.setdefault(record['class_id'], {})[row[0]] = record
+
+        return student_attendance
+
+    # Report operations
+    def save_report(self, report: Dict[str, Any], absent_records: List[Dict[str, Any]]) -> bool:
+        """
+        Store the materialized report of a class on a date and the absent records in one transaction
+        Absent records never replace a record of a student who checked in meanwhile
+        """
+        for record in absent_records:
+            record.setdefault('attendance_id', str(uuid.uuid4()))
+
+        with self.transaction() as conn:
+            self.put_attendance(absent_records, replace=False)
+            conn.execute(UPSERT_REPORT, (report['class_id'], report['date'], json.dumps(report)))
+        return True
+
+    def get_report(self, class_id: str, date: str) -> Optional[Dict[str, Any]]:
+        """Get the materialized report of a class on a date"""
+        row = self._connection().execute(SELECT_REPORT, (class_id, date)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_attendance(self, start_date: Optional[str] = None):
+        """
+        Iterate over attendance records ordered by timestamp
+        Only records on or after start_date (YYYY-MM-DD) are returned when it is given
+        """
+        since = f"{start_date} 00:00:00" if start_date else ''
+        for row in self._connection().execute(SELECT_ATTENDANCE_SINCE, (since,)):
+            yield _attendance_record(row)
+
+    def close(self):
+        """Close the connection of the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _class_document(self, row, schedules, enrolled_students: List[str]) -> Dict[str, Any]:
+        """Build a class document from its row, schedule rows and enrolled student IDs"""
+        class_id, class_name, lecturer, extra = row
+        return _with_extra({
+            'class_id': class_id,
+            'class_name': class_name,
+            'lecturer': lecturer,
+            'schedules': [dict(zip(SCHEDULE_COLUMNS, schedule[1:])) for schedule in schedules],
+            'enrolled_students': enrolled_students
+        }, extra)
+
+    def _student_document(self, row, enrolled_classes: List[str]) -> Dict[str, Any]:
+        """Build a student document from its row and enrolled class IDs"""
+        student_id, name, fingerprint_id, extra = row
+        return _with_extra({
+            'student_id': student_id,
+            'name': name,
+            'fingerprint_id': fingerprint_id,
+            'enrolled_classes': enrolled_classes
+        }, extra)
+
+    def _student_with_enrollments(self, conn: sqlite3.Connection, row) -> Optional[Dict[str, Any]]:
+        """Build a student document from its row, or None when there is no row"""
+        if row is None:
+            return None
+        enrolled = conn.execute(SELECT_STUDENT_ENROLLMENTS, (row[0],)).fetchall()
+        return self._student_document(row, [class_id for class_id, in enrolled])
@@ -0,0 +1,6 @@
+"""Shared pytest setup, the tests import the application packages from the repository root"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
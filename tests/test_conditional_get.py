@@ -0,0 +1,137 @@
+"""ETags of the change log and 304 answers of the class and student routes"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import services.change_log as change_log_module
+from middleware.auth_middleware import verify_token
+from routes import class_routes, student_routes
+from services.change_log import ChangeLog
+from services.data_service import TieredDataService
+from services.local_data_service import LocalDataService
+from services.providers import provide_data_service
+from utils.conditional import etag_matches
+
+
+class CountingService(TieredDataService):
+    """Data service counting the reads that reach it"""
+
+    def __init__(self, tiers):
+        super().__init__(tiers)
+        self.reads = 0
+
+    def _read(self, operation, *args):
+        self.reads += 1
+        return super()._read(operation, *args)
+
+
+@pytest.fixture
+def data_service(monkeypatch):
+    monkeypatch.setenv('FIREBASE_SIMULATION', 'true')
+    monkeypatch.delenv('LOCAL_DATA_DIR', raising=False)
+    monkeypatch.setattr(LocalDataService, '_instance', None)
+    service = CountingService([('local', LocalDataService())])
+    change_log = ChangeLog(complete=True)
+    service.add_write_listener(change_log.on_write)
+    monkeypatch.setattr(change_log_module, '_change_log', change_log)
+    return service
+
+
+@pytest.fixture
+def client(data_service):
+    app = FastAPI()
+    app.include_router(class_routes.router)
+    app.include_router(student_routes.router)
+    app.dependency_overrides[provide_data_service] = lambda: data_service
+    app.dependency_overrides[verify_token] = lambda: {}
+    return TestClient(app)
+
+
+def test_document_etag_changes_only_with_the_document():
+    log = ChangeLog(complete=True)
+    first = log.etag('students', 's1')
+    other = log.etag('students', 's2')
+    collection = log.etag('students')
+
+    log.on_write('update_student', ('s1', {}), True)
+    assert log.etag('students', 's1') != first
+    assert log.etag('students', 's2') == other
+    assert log.etag('students') != collection
+
+
+def test_collection_wide_writes_change_every_document_etag():
+    log = ChangeLog(complete=True)
+    student = log.etag('students', 's1')
+    log.on_write('delete_class', ('c1',), True)
+    assert log.etag('students', 's1') != student
+
+
+def test_failed_writes_change_nothing():
+    log = ChangeLog(complete=True)
+    etag = log.etag('classes', 'c1')
+    log.on_write('update_class', ('c1', {}), False)
+    assert log.etag('classes', 'c1') == etag
+
+
+def test_incomplete_log_etags_expire(monkeypatch):
+    log = ChangeLog(complete=False, etag_ttl=60)
+    monkeypatch.setattr(change_log_module.time, 'time', lambda: 6000.0)
+    etag = log.etag('classes')
+    monkeypatch.setattr(change_log_module.time, 'time', lambda: 6059.0)
+    assert log.etag('classes') == etag
+    monkeypatch.setattr(change_log_module.time, 'time', lambda: 6060.0)
+    assert log.etag('classes') != etag
+
+
+def test_projections_have_their_own_etags():
+    log = ChangeLog(complete=True)
+    assert log.etag('students', fields=('name', 'student_id')) != log.etag('students')
+    assert log.etag('students', fields=('name', 'student_id')) == log.etag('students', fields=('name', 'student_id'))
+
+
+def test_etag_matching():
+    etag = 'W/"abc.students.1"'
+    assert etag_matches('W/"abc.students.1"', etag)
+    assert etag_matches('"abc.students.1"', etag)
+    assert etag_matches('"other", W/"abc.students.1"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('W/"abc.students.2"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_unchanged_list_is_answered_with_304_without_reads(client, data_service):
+    response = client.get('/api/students/')
+    assert response.status_code == 200
+    etag = response.headers['etag']
+
+    reads = data_service.reads
+    response = client.get('/api/students/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert data_service.reads == reads
+
+
+def test_write_invalidates_the_etag(client, data_service):
+    students = client.get('/api/students/')
+    student_id = next(iter(students.json()['students']))
+    document = client.get(f'/api/students/{student_id}')
+
+    data_service.update_student(student_id, {'name': 'Renamed', 'fingerprint_id': 999})
+
+    response = client.get('/api/students/', headers={'If-None-Match': students.headers['etag']})
+    assert response.status_code == 200
+    assert response.headers['etag'] != students.headers['etag']
+    response = client.get(f'/api/students/{student_id}', headers={'If-None-Match': document.headers['etag']})
+    assert response.status_code == 200
+    assert response.json()['name'] == 'Renamed'
+
+
+def test_projection_is_not_answered_with_the_etag_of_the_whole_list(client):
+    whole = client.get('/api/classes/')
+    projected = client.get('/api/classes/?fields=class_name', headers={'If-None-Match': whole.headers['etag']})
+    assert projected.status_code == 200
+    assert set(next(iter(projected.json()['classes'].values()))) == {'class_id', 'class_name'}
+
+    again = client.get('/api/classes/?fields=class_name', headers={'If-None-Match': projected.headers['etag']})
+    assert again.status_code == 304
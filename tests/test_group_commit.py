@@ -0,0 +1,112 @@
+"""Batching and error propagation of the group commit writer"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.group_commit import GroupCommitWriter, create_group_commit_writer
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, value):
+        self.writes.append(value)
+
+    def commit(self):
+        self.db.commit(self.writes)
+
+
+class FakeDB:
+    """Records the writes of every commit, failing the commits listed in fail"""
+
+    def __init__(self, fail=()):
+        self.commits = []
+        self.fail = set(fail)
+        self._lock = threading.Lock()
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def commit(self, writes):
+        with self._lock:
+            index = len(self.commits)
+            self.commits.append(list(writes))
+        if index in self.fail:
+            raise RuntimeError(f"commit {index} failed")
+
+
+def write_concurrently(writer, values):
+    """Submit the writes at once, returns the result or exception of each"""
+    barrier = threading.Barrier(len(values))
+
+    def write(value):
+        barrier.wait()
+        try:
+            return writer.write(lambda batch: batch.set(value))
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(len(values)) as executor:
+        return list(executor.map(write, values))
+
+
+def test_concurrent_writes_share_a_commit():
+    db = FakeDB()
+    writer = GroupCommitWriter(db, window=0.2, max_writes=100)
+    results = write_concurrently(writer, list(range(10)))
+
+    assert results == [None] * 10
+    assert len(db.commits) == 1
+    assert sorted(db.commits[0]) == list(range(10))
+
+
+def test_batches_are_limited_to_max_writes():
+    db = FakeDB()
+    writer = GroupCommitWriter(db, window=0.2, max_writes=4)
+    results = write_concurrently(writer, list(range(10)))
+
+    assert results == [None] * 10
+    assert all(len(writes) <= 4 for writes in db.commits)
+    assert sorted(value for writes in db.commits for value in writes) == list(range(10))
+
+
+def test_failed_commit_fails_every_caller_of_the_batch():
+    db = FakeDB(fail={0})
+    writer = GroupCommitWriter(db, window=0.2, max_writes=100)
+    results = write_concurrently(writer, list(range(5)))
+
+    assert len(db.commits) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert {str(result) for result in results} == {"commit 0 failed"}
+
+    # The writer keeps committing later batches
+    assert writer.write(lambda batch: batch.set('after')) is None
+    assert db.commits[-1] == ['after']
+
+
+def test_failing_write_fails_its_batch():
+    db = FakeDB()
+    writer = GroupCommitWriter(db, window=0.01)
+
+    def bad(batch):
+        raise ValueError("bad record")
+
+    with pytest.raises(ValueError, match="bad record"):
+        writer.write(bad)
+    assert db.commits == []
+    assert writer.write(lambda batch: batch.set(1)) is None
+
+
+def test_writer_configuration(monkeypatch):
+    monkeypatch.setenv('ATTENDANCE_COMMIT_WINDOW_MS', '0')
+    assert create_group_commit_writer(FakeDB()) is None
+
+    monkeypatch.setenv('ATTENDANCE_COMMIT_WINDOW_MS', '5')
+    monkeypatch.setenv('ATTENDANCE_COMMIT_MAX', '1000')
+    writer = create_group_commit_writer(FakeDB())
+    assert writer.window == pytest.approx(0.005)
+    assert writer.max_writes == 500
@@ -0,0 +1,128 @@
+"""Replay, truncation and rotation of the local data service journal"""
+
+import os
+
+from services.local_journal import LocalJournal
+
+
+def open_journal(data_dir, **kwargs):
+    journal = LocalJournal(str(data_dir), fsync_policy='never', **kwargs)
+    db, entries = journal.load()
+    return journal, db, entries
+
+
+def test_entries_are_replayed_in_order(tmp_path):
+    journal, db, entries = open_journal(tmp_path)
+    assert db is None and entries == []
+    journal.append('set', ['students', 's1'], {'name': 'Ann'})
+    journal.append('update', ['students', 's1'], {'name': 'Anna'})
+    journal.append('delete', ['students', 's1'])
+    journal.close()
+
+    journal, db, entries = open_journal(tmp_path)
+    assert entries == [
+        ('set', ['students', 's1'], {'name': 'Ann'}),
+        ('update', ['students', 's1'], {'name': 'Anna'}),
+        ('delete', ['students', 's1'], None),
+    ]
+    assert journal.sequence == 3
+
+
+def test_torn_record_is_truncated(tmp_path):
+    journal, _, _ = open_journal(tmp_path)
+    journal.append('set', ['classes', 'c1'], {'class_name': 'Math'})
+    journal.append('set', ['classes', 'c2'], {'class_name': 'Physics'})
+    journal.close()
+
+    # A crash in the middle of the second record
+    size = os.path.getsize(journal.journal_path)
+    with open(journal.journal_path, 'r+b') as f:
+        f.truncate(size - 3)
+
+    journal, _, entries = open_journal(tmp_path)
+    assert entries == [('set', ['classes', 'c1'], {'class_name': 'Math'})]
+
+    # New entries follow the last valid one instead of the torn bytes
+    journal.append('set', ['classes', 'c3'], {'class_name': 'Biology'})
+    journal.close()
+    _, _, entries = open_journal(tmp_path)
+    assert [path[1] for _, path, _ in entries] == ['c1', 'c3']
+
+
+def test_corrupted_record_ends_replay(tmp_path):
+    journal, _, _ = open_journal(tmp_path)
+    for index in range(3):
+        journal.append('set', ['students', f's{index}'], {'index': index})
+    journal.close()
+
+    first_record = os.path.getsize(journal.journal_path) // 3
+    with open(journal.journal_path, 'r+b') as f:
+        f.seek(first_record + 12)
+        byte = f.read(1)
+        f.seek(first_record + 12)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    _, _, entries = open_journal(tmp_path)
+    assert [path[1] for _, path, _ in entries] == ['s0']
+
+
+def test_snapshot_replaces_the_entries_it_contains(tmp_path):
+    journal, _, _ = open_journal(tmp_path)
+    journal.append('set', ['students', 's1'], {'name': 'Ann'})
+    journal.snapshot({'students': {'s1': {'name': 'Ann'}}})
+    journal.append('set', ['students', 's2'], {'name': 'Ben'})
+    journal.close()
+
+    journal, db, entries = open_journal(tmp_path)
+    assert db == {'students': {'s1': {'name': 'Ann'}}}
+    assert entries == [('set', ['students', 's2'], {'name': 'Ben'})]
+    assert not os.path.exists(journal.rotated_journal_path)
+
+
+def test_failed_snapshots_keep_every_entry(tmp_path):
+    journal, _, _ = open_journal(tmp_path)
+    journal.append('set', ['students', 's1'], {'name': 'Ann'})
+    # The snapshot of this rotation is never written
+    journal.rotate()
+    journal.append('set', ['students', 's2'], {'name': 'Ben'})
+    # Nor the one of the next rotation, which must not overwrite the first
+    journal.rotate()
+    journal.append('set', ['students', 's3'], {'name': 'Cy'})
+    journal.close()
+
+    journal, db, entries = open_journal(tmp_path)
+    assert db is None
+    assert [path[1] for _, path, _ in entries] == ['s1', 's2', 's3']
+    assert not os.path.exists(journal.rotated_journal_path)
+
+
+def test_needs_snapshot_after_snapshot_every_entries(tmp_path):
+    journal, _, _ = open_journal(tmp_path, snapshot_every=2)
+    journal.append('set', ['students', 's1'], {})
+    assert not journal.needs_snapshot()
+    journal.append('set', ['students', 's2'], {})
+    assert journal.needs_snapshot()
+    journal.snapshot({})
+    assert not journal.needs_snapshot()
+    journal.close()
+
+
+def test_local_data_service_restores_writes(tmp_path, monkeypatch):
+    from services.local_data_service import LocalDataService
+
+    monkeypatch.setenv('LOCAL_DATA_DIR', str(tmp_path))
+    monkeypatch.setenv('LOCAL_DATA_FSYNC', 'never')
+    monkeypatch.setattr(LocalDataService, '_instance', None)
+    service = LocalDataService()
+    student_id = service.create_student({'name': 'Dana', 'fingerprint_id': 4242})
+    service.update_student(student_id, {'name': 'Dana K', 'fingerprint_id': 4242})
+    service.close()
+
+    # A new process restores the snapshot and replays the journal
+    monkeypatch.setattr(LocalDataService, '_instance', None)
+    restored = LocalDataService()
+    try:
+        assert restored.get_student(student_id)['name'] == 'Dana K'
+        assert restored.get_student_by_fingerprint(4242)['student_id'] == student_id
+    finally:
+        restored.close()
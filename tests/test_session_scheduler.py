@@ -0,0 +1,156 @@
+"""Roll materialization of the session scheduler"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.attendance_service import AttendanceService
+from services.data_service import create_data_service
+from services.session_scheduler import SchedulerLease, SessionScheduler
+from services.sqlite_data_service import SQLiteDataService
+from utils.time_util import get_current_time
+
+# The sessions were yesterday, so attendance recorded now is late
+YESTERDAY = get_current_time().replace(tzinfo=None) - timedelta(days=1)
+DATE = YESTERDAY.strftime('%Y-%m-%d')
+
+
+def at(time_str: str) -> datetime:
+    return datetime.strptime(f"{DATE} {time_str}", '%Y-%m-%d %H:%M:%S')
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_DB_PATH', str(tmp_path / 'attendance.db'))
+    monkeypatch.setattr(SQLiteDataService, '_instance', None)
+    return tmp_path
+
+
+@pytest.fixture
+def campus(database):
+    """A class meeting yesterday 09:00-10:00 with three enrolled students"""
+    data_service = create_data_service(['sqlite'])
+    class_id = data_service.create_class({
+        'class_name': 'Mathematics 101',
+        'lecturer': 'Dr. Smith',
+        'schedules': [{'day_of_week': YESTERDAY.strftime('%A'), 'start_time': '09:00', 'end_time': '10:00',
+                       'room_number': 'A101'}]
+    })
+    student_ids = []
+    for fingerprint_id, name in enumerate(['Ann', 'Ben', 'Cy'], start=1):
+        student_id = data_service.create_student({'name': name, 'fingerprint_id': fingerprint_id})
+        data_service.enroll_student_in_class(student_id, class_id)
+        student_ids.append(student_id)
+    return data_service, class_id, student_ids
+
+
+def worker(database, lease: bool = True):
+    """The data service, attendance service and scheduler of one worker process"""
+    data_service = create_data_service(['sqlite'])
+    attendance_service = AttendanceService(data_service)
+    scheduler = SessionScheduler(attendance_service,
+                                 lease=SchedulerLease(str(database / 'scheduler.lock')) if lease else None)
+    return data_service, attendance_service, scheduler
+
+
+def statuses(data_service, class_id):
+    return {student_id: record['status'] for student_id, record in data_service.get_attendance(class_id, DATE).items()}
+
+
+def test_roll_is_closed_once_the_end_minute_has_passed(database, campus):
+    campus_data, class_id, student_ids = campus
+    # Recorded by another process, so it is not stale in this one
+    campus_data.create_attendance({'student_id': student_ids[0], 'class_id': class_id,
+                                   'timestamp': f"{DATE} 09:05:00", 'status': 'present'})
+    data_service, attendance_service, scheduler = worker(database)
+
+    assert scheduler.check(at('10:00:30')) == 0
+    assert data_service.get_report(class_id, DATE) is None
+
+    assert scheduler.check(at('10:01:00')) == 1
+    assert statuses(data_service, class_id) == {
+        student_ids[0]: 'present', student_ids[1]: 'absent', student_ids[2]: 'absent'
+    }
+    report = data_service.get_report(class_id, DATE)
+    assert (report['present_students'], report['absent_students']) == (1, 2)
+
+    # Closed once, later checks leave it alone
+    assert scheduler.check(at('10:05:00')) == 0
+    scheduler.lease.release()
+
+
+def test_only_the_lease_holder_closes_rolls(database, campus):
+    _, class_id, _ = campus
+    first = worker(database)
+    second = worker(database)
+
+    assert first[2].check(at('10:01:00')) == 1
+    assert second[2].check(at('10:01:00')) == 0
+
+    # The other worker takes over once the lease is given up
+    first[2].lease.release()
+    assert second[2].lease.acquire()
+    second[2].lease.release()
+
+
+def test_late_attendance_is_materialized_by_the_recording_worker(database, campus):
+    _, class_id, student_ids = campus
+    lease_holder = worker(database)
+    assert lease_holder[2].check(at('10:01:00')) == 1
+
+    # A reader syncs a scan of the session to a worker without the lease
+    data_service, attendance_service, scheduler = worker(database)
+    assert not scheduler.lease.acquire()
+    attendance_service.record_attendance(2, f"{DATE} 09:10:00")
+    assert attendance_service.stale_reports() == [(class_id, DATE, '10:00')]
+    # Computed from the records until it is materialized again
+    assert attendance_service.generate_attendance_report(class_id, DATE)['present_students'] == 1
+
+    assert scheduler.check() == 1
+    assert attendance_service.stale_reports() == []
+    report = lease_holder[0].get_report(class_id, DATE)
+    assert (report['present_students'], report['absent_students']) == (1, 2)
+    assert statuses(data_service, class_id)[student_ids[1]] == 'present'
+    lease_holder[2].lease.release()
+
+
+def test_attendance_of_a_day_without_a_session_is_not_materialized(database, campus):
+    _, class_id, student_ids = campus
+    data_service, attendance_service, scheduler = worker(database, lease=False)
+    other_day = (YESTERDAY - timedelta(days=2)).strftime('%Y-%m-%d')
+    data_service.create_attendance({'student_id': student_ids[0], 'class_id': class_id,
+                                    'timestamp': f"{other_day} 09:05:00", 'status': 'present'})
+
+    assert attendance_service.stale_reports() == []
+    assert 'error' in attendance_service.materialize_report(class_id, other_day)
+    assert scheduler.check(at('12:00:00')) == 1  # yesterday's session only
+    assert len(data_service.get_attendance(class_id, other_day)) == 1
+    assert data_service.get_report(class_id, other_day) is None
+
+
+def test_check_ins_are_never_replaced_by_absent_records(database, campus):
+    _, class_id, student_ids = campus
+    data_service, attendance_service, _ = worker(database, lease=False)
+    attendance_service.materialize_report(class_id, DATE, '10:00')
+    data_service.create_attendance({'student_id': student_ids[2], 'class_id': class_id,
+                                    'timestamp': f"{DATE} 09:20:00", 'status': 'late'})
+
+    attendance_service.materialize_report(class_id, DATE, '10:00')
+    assert statuses(data_service, class_id)[student_ids[2]] == 'late'
+    assert data_service.get_report(class_id, DATE)['late_students'] == 1
+
+
+def test_class_writes_drop_the_cached_schedules(database, campus):
+    _, class_id, _ = campus
+    data_service, _, scheduler = worker(database, lease=False)
+    reads = []
+    get_all_classes = data_service.get_all_classes
+    data_service.get_all_classes = lambda *args: reads.append(args) or get_all_classes(*args)
+
+    scheduler.check(at('08:00:00'))
+    scheduler.check(at('08:01:00'))
+    assert len(reads) == 1
+
+    data_service.update_class(class_id, {'class_name': 'Mathematics 102', 'lecturer': 'Dr. Smith', 'schedules': []})
+    assert scheduler.check(at('10:01:00')) == 0
+    assert len(reads) == 2
@@ -0,0 +1,146 @@
+"""
+Content type negotiation and compact encodings for device traffic
+
+Readers can submit scans and receive acknowledgements as MessagePack or CBOR
+instead of JSON. The encoding of a request body is taken from its
+Content-Type, the encoding of the response from Accept, falling back to the
+encoding of the request. Both libraries are optional, JSON always works.
+
+Compact messages use single letter keys:
+
+    scan  {"f": fingerprint_id, "t": unix time or "YYYY-MM-DD HH:MM:SS", "i": reader sequence number}
+    ack   {"i": sequence number, "ok": true, "n": student name, "c": class name}
+          {"i": sequence number, "ok": false, "e": error}
+
+"t" and "i" are optional. JSON bodies may also use the long field names of
+GET /api/attendance/record (fingerprint_id, timestamp).
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import pytz
+
+# MessagePack and CBOR support is optional, JSON is used without them
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import cbor2
+    CBOR_AVAILABLE = True
+except ImportError:
+    CBOR_AVAILABLE = False
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# Media types accepted for each encoding
+_ALIASES = {
+    'application/json': JSON,
+    'application/msgpack': MSGPACK,
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+    'application/cbor': CBOR,
+}
+
+
+class UnsupportedEncoding(ValueError):
+    """The media type is unknown or its library is not installed"""
+
+
+def _media_type(header: Optional[str]) -> Optional[str]:
+    """The encoding named by a Content-Type header or Accept entry"""
+    if not header:
+        return None
+    return _ALIASES.get(header.split(';')[0].strip().lower())
+
+
+def available(media_type: str) -> bool:
+    """Whether an encoding can be used"""
+    if media_type == MSGPACK:
+        return MSGPACK_AVAILABLE
+    if media_type == CBOR:
+        return CBOR_AVAILABLE
+    return media_type == JSON
+
+
+def request_encoding(content_type: Optional[str]) -> str:
+    """The encoding of a request body, JSON when no Content-Type is given"""
+    if not content_type:
+        return JSON
+    media_type = _media_type(content_type)
+    if media_type is None or not available(media_type):
+        raise UnsupportedEncoding(f"Unsupported content type {content_type}")
+    return media_type
+
+
+def response_encoding(accept: Optional[str], request_media_type: str = JSON) -> str:
+    """The encoding of a response, the first available one in Accept or that of the request"""
+    if accept:
+        for entry in accept.split(','):
+            media_type = _media_type(entry)
+            if media_type is not None and available(media_type):
+                return media_type
+    return request_media_type
+
+
+def decode(media_type: str, body: bytes) -> Any:
+    """Decode a request body, raises ValueError for malformed bodies"""
+    try:
+        if media_type == MSGPACK:
+            return msgpack.unpackb(body, raw=False)
+        if media_type == CBOR:
+            return cbor2.loads(body)
+        return json.loads(body)
+    except Exception as e:
+        # The codecs raise their own exception types for truncated or invalid data
+        raise ValueError(f"Malformed {media_type} body: {str(e) or type(e).__name__}")
+
+
+def encode(media_type: str, value: Any) -> bytes:
+    """Encode a response body"""
+    if media_type == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    if media_type == CBOR:
+        return cbor2.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def parse_scan(message: Any) -> Dict[str, Any]:
+    """
+    Read a scan in compact or long form
+    Returns fingerprint_id, timestamp (None for now) and the reader sequence number
+    """
+    if not isinstance(message, dict):
+        raise ValueError("A scan must be a map")
+
+    fingerprint_id = message.get('f', message.get('fingerprint_id'))
+    if isinstance(fingerprint_id, bool) or not isinstance(fingerprint_id, int):
+        raise ValueError("A scan needs an integer fingerprint ID")
+
+    timestamp = message.get('t', message.get('timestamp'))
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        # Unix time from the reader clock, attendance timestamps are UTC
+        try:
+            timestamp = datetime.fromtimestamp(timestamp, pytz.UTC).strftime('%Y-%m-%d %H:%M:%S')
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"A scan timestamp is out of range: {timestamp}")
+    elif timestamp is not None and not isinstance(timestamp, str):
+        raise ValueError("A scan timestamp must be unix time or YYYY-MM-DD HH:MM:SS")
+
+    return {'fingerprint_id': fingerprint_id, 'timestamp': timestamp, 'sequence': message.get('i')}
+
+
+def compact_ack(result: Dict[str, Any], sequence: Any = None) -> Dict[str, Any]:
+    """The compact acknowledgement of a recorded scan"""
+    ack = {} if sequence is None else {'i': sequence}
+    if 'error' in result:
+        ack.update(ok=False, e=result['error'])
+    else:
+        ack.update(ok=True, n=result.get('name'), c=result.get('class_name'))
+    return ack
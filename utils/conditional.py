@@ -0,0 +1,45 @@
+"""
+Conditional GET support for rarely changing resources
+
+A route computes the ETag of the resource from the change log before reading
+it. When the client already holds that version, it is answered with 304 Not
+Modified and the data service is not touched at all. Otherwise the ETag is
+sent with the response so the next poll can be conditional. ETags of a log
+that may miss writes made elsewhere expire after DATA_CACHE_TTL seconds, so
+a 304 is never staler than a cached read.
+"""
+
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Clients must revalidate, a 304 costs no database reads
+CACHE_CONTROL = "no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag, using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    A 304 response if the client holds the current version, otherwise None
+    after adding the validator headers to the response
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
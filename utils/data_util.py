@@ -0,0 +1,29 @@
+from typing import Any, Dict, Iterable
+
+
+def clone_data(value: Any) -> Any:
+    """
+    Deep copy JSON-like data (dicts, lists and scalars)
+    Much faster than copy.deepcopy for the documents stored by the data services
+    """
+    if isinstance(value, dict):
+        return {key: clone_data(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [clone_data(item) for item in value]
+    return value
+
+
+def shallow_copy(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy a document and its list and dict fields, anything nested deeper is shared
+    Enough for callers that set fields or append to lists of a document they read
+    """
+    return {
+        key: list(item) if isinstance(item, list) else dict(item) if isinstance(item, dict) else item
+        for key, item in document.items()
+    }
+
+
+def project(document: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """The given top-level fields of a document, missing fields are left out"""
+    return {field: document[field] for field in fields if field in document}
@@ -1,55 +1,74 @@
-import serial
 import time
 import random
 from typing import Tuple, Optional, List
 import os
 import glob
 
-# For CircuitPython fingerprint library
-try:
-    import adafruit_fingerprint
-    FINGERPRINT_LIBRARY_AVAILABLE = True
-except ImportError:
-    print("Adafruit fingerprint library not available, using simulation mode")
-    FINGERPRINT_LIBRARY_AVAILABLE = False
-    # Create a stub for the constants to avoid errors
-    class AdafruitFingerprintStub:
-        OK = 0
+from utils.metrics import SENSOR_OPERATION_DURATION, timed
+
+# The serial and CircuitPython fingerprint libraries are only imported when a
+# hardware sensor is used, see _load_sensor_libraries
+serial = None
+adafruit_fingerprint = None
+FINGERPRINT_LIBRARY_AVAILABLE = False
+_sensor_libraries_loaded = False
+
+# Create a stub for the constants to avoid errors
+class AdafruitFingerprintStub:
+    OK = 0
+    
+    # Additional stub methods and attributes for simulation mode
+    class FingerprintStub:
+        def __init__(self):
+            self.finger_id = 0
+            self.confidence = 0
+            self.template_count = 0
+            self.model_id = 0
         
-        # Additional stub methods and attributes for simulation mode
-        class FingerprintStub:
-            def __init__(self):
-                self.finger_id = 0
-                self.confidence = 0
-                self.template_count = 0
-                self.model_id = 0
+        def get_image(self):
+            return AdafruitFingerprintStub.OK
             
-            def get_image(self):
-                return AdafruitFingerprintStub.OK
-                
-            def image_2_tz(self, slot):
-                return AdafruitFingerprintStub.OK
-                
-            def finger_search(self):
-                return AdafruitFingerprintStub.OK
-                
-            def create_model(self):
-                return AdafruitFingerprintStub.OK
-                
-            def store(self):
-                return AdafruitFingerprintStub.OK
-                
-            def delete_model(self, model_id):
-                return AdafruitFingerprintStub.OK
-                
-            def read_templates(self):
-                return AdafruitFingerprintStub.OK
-        
-        @staticmethod
-        def Adafruit_Fingerprint(serial_conn):
-            return AdafruitFingerprintStub.FingerprintStub()
+        def image_2_tz(self, slot):
+            return AdafruitFingerprintStub.OK
+            
+        def finger_search(self):
+            return AdafruitFingerprintStub.OK
+            
+        def create_model(self):
+            return AdafruitFingerprintStub.OK
+            
+        def store(self):
+            return AdafruitFingerprintStub.OK
+            
+        def delete_model(self, model_id):
+            return AdafruitFingerprintStub.OK
             
-    adafruit_fingerprint = AdafruitFingerprintStub()
+        def read_templates(self):
+            return AdafruitFingerprintStub.OK
+    
+    @staticmethod
+    def Adafruit_Fingerprint(serial_conn):
+        return AdafruitFingerprintStub.FingerprintStub()
+
+def _load_sensor_libraries() -> bool:
+    """Import the sensor libraries on first use, returns whether they are available"""
+    global serial, adafruit_fingerprint, FINGERPRINT_LIBRARY_AVAILABLE, _sensor_libraries_loaded
+    if _sensor_libraries_loaded:
+        return FINGERPRINT_LIBRARY_AVAILABLE
+    
+    try:
+        import serial as serial_module
+        import adafruit_fingerprint as fingerprint_module
+        serial = serial_module
+        adafruit_fingerprint = fingerprint_module
+        FINGERPRINT_LIBRARY_AVAILABLE = True
+    except ImportError:
+        print("Adafruit fingerprint library not available, using simulation mode")
+        adafruit_fingerprint = AdafruitFingerprintStub()
+        FINGERPRINT_LIBRARY_AVAILABLE = False
+    
+    _sensor_libraries_loaded = True
+    return FINGERPRINT_LIBRARY_AVAILABLE
 
 class FingerprintUtil:
     """Utility for interacting with the fingerprint sensor via serial connection"""
@@ -61,8 +80,9 @@ class FingerprintUtil:
         self.ser = None
         self.fingerprint = None
         
-        # Set up simulation mode for development/testing
-        self.simulation_mode = not FINGERPRINT_LIBRARY_AVAILABLE or os.environ.get('FINGERPRINT_SIMULATION', 'true').lower() == 'true'
+        # Set up simulation mode for development/testing, the sensor libraries
+        # are not even imported in simulation mode
+        self.simulation_mode = os.environ.get('FINGERPRINT_SIMULATION', 'true').lower() == 'true' or not _load_sensor_libraries()
         
         if self.simulation_mode:
             print("Fingerprint sensor running in simulation mode")
@@ -109,6 +129,7 @@ class FingerprintUtil:
         # If no port found, return None
         return None
     
+    @timed(SENSOR_OPERATION_DURATION, 'connect')
     def connect(self) -> bool:
         """Connect to the fingerprint sensor"""
         if self.simulation_mode:
@@ -153,6 +174,7 @@ class FingerprintUtil:
             self.ser = None
             self.fingerprint = None
     
+    @timed(SENSOR_OPERATION_DURATION, 'verify')
     def verify_fingerprint(self) -> Tuple[bool, Optional[int]]:
         """
         Verify a fingerprint against stored templates
@@ -243,6 +265,7 @@ class FingerprintUtil:
             print("Simulated scenario: No fingerprint detected")
             return None
     
+    @timed(SENSOR_OPERATION_DURATION, 'enroll')
     def enroll_fingerprint(self, new_id: int) -> bool:
         """
         Enroll a new fingerprint in the sensor
@@ -335,6 +358,7 @@ class FingerprintUtil:
         
         return True
         
+    @timed(SENSOR_OPERATION_DURATION, 'delete')
     def delete_fingerprint(self, fingerprint_id: int) -> bool:
         """
         Delete a fingerprint template from the sensor
@@ -371,6 +395,7 @@ class FingerprintUtil:
             print(f"Error deleting fingerprint: {str(e)}")
             return False
             
+    @timed(SENSOR_OPERATION_DURATION, 'template_count')
     def get_template_count(self) -> int:
         """
         Get the number of fingerprint templates stored in the sensor
@@ -403,6 +428,7 @@ class FingerprintUtil:
             print(f"Error reading template count: {str(e)}")
             return 0
             
+    @timed(SENSOR_OPERATION_DURATION, 'status')
     def is_connected(self) -> bool:
         """
         Check if the fingerprint sensor is connected and operational
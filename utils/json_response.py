@@ -0,0 +1,40 @@
+"""
+Fast JSON responses for the large read endpoints
+
+The class and student routes return stored documents as they are. Validating
+tens of thousands of them against the response model and encoding them with
+the standard library costs far more than the read itself, so these routes
+render the documents straight to JSON with orjson instead. The response
+models stay declared on the routes for the API documentation.
+
+orjson is optional, the standard library encoder is used without it.
+"""
+
+import json
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+class FastJSONResponse(JSONResponse):
+    """A JSONResponse rendered by orjson when it is installed"""
+
+    def render(self, content) -> bytes:
+        # Values JSON has no type for (e.g. Firestore timestamps) are encoded like FastAPI does
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, default=jsonable_encoder)
+        return json.dumps(content, default=jsonable_encoder, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+def json_response(content, response: Response) -> FastJSONResponse:
+    """A fast JSON response for stored documents, keeping the headers set on response"""
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return FastJSONResponse(content=content, headers=headers)
@@ -0,0 +1,185 @@
+"""
+Persistent (immutable) hash map
+
+set and delete return a new map and leave the old one untouched. The two
+share every node except the few on the path to the changed key, so a write
+copies a handful of small dicts instead of the whole map. Maps are never
+modified once built, which lets readers use one without a lock while a
+writer builds the next version.
+
+Keys are spread over a trie of up to 32-way nodes by their hash, with small
+buckets of keys at the leaves. Iteration order is not insertion order.
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+# Keys per leaf bucket before it is split into a node
+_BUCKET_SIZE = 8
+
+_MISSING = object()
+
+
+class _Node:
+    """An inner node, children maps a slot to a _Node or a bucket dict"""
+
+    __slots__ = ('children',)
+
+    def __init__(self, children: Dict[int, Any]):
+        self.children = children
+
+
+def _hash(key) -> int:
+    return hash(key) & _HASH_MASK
+
+
+def _assoc(node: _Node, shift: int, key_hash: int, key, value) -> Tuple[_Node, bool]:
+    """A copy of node with key set to value, and whether the key is new"""
+    slot = (key_hash >> shift) & _MASK
+    children = dict(node.children)
+    child = children.get(slot)
+
+    if isinstance(child, _Node):
+        children[slot], added = _assoc(child, shift + _BITS, key_hash, key, value)
+        return _Node(children), added
+
+    bucket = dict(child) if child else {}
+    added = key not in bucket
+    bucket[key] = value
+    if len(bucket) > _BUCKET_SIZE and shift + _BITS < _HASH_BITS:
+        # Split the bucket over a node one level down
+        split = _Node({})
+        for bucket_key, bucket_value in bucket.items():
+            split, _ = _assoc(split, shift + _BITS, _hash(bucket_key), bucket_key, bucket_value)
+        children[slot] = split
+    else:
+        children[slot] = bucket
+    return _Node(children), added
+
+
+def _insert(node: _Node, shift: int, key_hash: int, key, value) -> bool:
+    """Set key in place in a node nothing else can see yet, returns whether the key is new"""
+    slot = (key_hash >> shift) & _MASK
+    child = node.children.get(slot)
+    if isinstance(child, _Node):
+        return _insert(child, shift + _BITS, key_hash, key, value)
+
+    if child is None:
+        child = node.children[slot] = {}
+    added = key not in child
+    child[key] = value
+    if len(child) > _BUCKET_SIZE and shift + _BITS < _HASH_BITS:
+        split = node.children[slot] = _Node({})
+        for bucket_key, bucket_value in child.items():
+            _insert(split, shift + _BITS, _hash(bucket_key), bucket_key, bucket_value)
+    return added
+
+
+def _dissoc(node: _Node, shift: int, key_hash: int, key) -> Optional[_Node]:
+    """A copy of node without key, None when the key is missing"""
+    slot = (key_hash >> shift) & _MASK
+    child = node.children.get(slot)
+    if child is None:
+        return None
+
+    if isinstance(child, _Node):
+        child = _dissoc(child, shift + _BITS, key_hash, key)
+        if child is None:
+            return None
+        empty = not child.children
+    else:
+        if key not in child:
+            return None
+        child = {bucket_key: value for bucket_key, value in child.items() if bucket_key != key}
+        empty = not child
+
+    children = dict(node.children)
+    if empty:
+        del children[slot]
+    else:
+        children[slot] = child
+    return _Node(children)
+
+
+def _items(node: _Node) -> Iterator[Tuple[Any, Any]]:
+    for child in node.children.values():
+        if isinstance(child, _Node):
+            yield from _items(child)
+        else:
+            yield from child.items()
+
+
+class PersistentMap(Mapping):
+    """An immutable mapping whose set and delete return a new map"""
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items: Optional[Iterable[Tuple[Any, Any]]] = None):
+        self._root = _Node({})
+        self._size = 0
+        # The new map is private until returned, so it is built in place
+        for key, value in items or ():
+            self._size += _insert(self._root, 0, _hash(key), key, value)
+
+    @classmethod
+    def _create(cls, root: _Node, size: int) -> 'PersistentMap':
+        new = cls.__new__(cls)
+        new._root = root
+        new._size = size
+        return new
+
+    def set(self, key, value) -> 'PersistentMap':
+        """A map with key set to value"""
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        return self._create(root, self._size + added)
+
+    def delete(self, key) -> 'PersistentMap':
+        """A map without key, this map when the key is missing"""
+        root = _dissoc(self._root, 0, _hash(key), key)
+        if root is None:
+            return self
+        return self._create(root, self._size - 1)
+
+    def get(self, key, default=None):
+        key_hash = hash(key) & _HASH_MASK
+        child = self._root.children.get(key_hash & _MASK)
+        while type(child) is _Node:
+            key_hash >>= _BITS
+            child = child.children.get(key_hash & _MASK)
+        if child is None:
+            return default
+        return child.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator:
+        for key, _ in _items(self._root):
+            yield key
+
+    def __len__(self) -> int:
+        return self._size
+
+    def items(self):
+        # Walks the nodes once instead of looking up every key
+        return _items(self._root)
+
+    def values(self):
+        return (value for _, value in _items(self._root))
+
+    def __reduce__(self):
+        # The layout depends on the hashes of the running process, so pickle the items
+        return PersistentMap, (list(_items(self._root)),)
+
+    def __repr__(self) -> str:
+        return f"PersistentMap({dict(_items(self._root))!r})"
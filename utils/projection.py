@@ -0,0 +1,39 @@
+"""
+Field projection for the class and student endpoints
+
+Clients pass fields=name,fingerprint_id to receive only those fields of each
+document. The projection is handed down to the data service, so Firestore
+sends only the selected fields and the local stores copy only those. The ID
+field of the document is always included.
+
+Projected documents are partial, like all documents of these routes they are
+returned with utils.json_response instead of being validated against the
+response model.
+"""
+
+from typing import Optional, Tuple, Iterable
+
+from fastapi import HTTPException
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str], id_field: str) -> Optional[Tuple[str, ...]]:
+    """
+    The projection requested by a comma separated fields parameter, None for
+    whole documents. Unknown fields are rejected with 400.
+    """
+    if not fields:
+        return None
+
+    allowed = tuple(allowed)
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}, use any of {', '.join(allowed)}"
+        )
+
+    requested.add(id_field)
+    # Sorted so equal projections share cache entries
+    return tuple(sorted(requested))
+
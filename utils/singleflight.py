@@ -0,0 +1,74 @@
+"""
+Single-flight execution of identical calls
+
+When many threads ask for the same thing at once, e.g. the class of a lecture
+while its students are scanning in, only the first caller runs the call and
+the others wait for its result (or its exception) instead of issuing the same
+database read again.
+
+A call started before a write may return data from before it. Writers drop
+the affected calls with forget, so callers arriving after the write start a
+new call instead of joining the old one.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """A call in flight and its outcome"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.shared = False
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run function unless a call with the same key is in flight, in which
+        case wait for that one. Returns (value, shared), shared is True when
+        the value was returned to other callers too and must be copied before
+        it is modified.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.shared = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                # No caller can join any more
+                shared = call.shared
+            call.done.set()
+        return call.value, shared
+
+    def forget(self, match: Callable[[Hashable], bool]):
+        """Let later callers of the matching keys start a new call"""
+        with self._lock:
+            for key in [key for key in self._calls if match(key)]:
+                del self._calls[key]
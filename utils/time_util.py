@@ -51,4 +51,66 @@ def time_in_range(start_time_str, end_time_str, check_time_str=None):
         else:
             return check_time >= start_time or check_time <= end_time
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+
+def upcoming_sessions(classes, room_number=None, start=None, hours=24):
+    """
+    Get the scheduled sessions that have not ended yet and begin within the
+    next hours, optionally only those in one room, ordered by start time
+    """
+    if start is None:
+        start = get_current_time().replace(tzinfo=None)
+    end = start + timedelta(hours=hours)
+    
+    # Start a day early for overnight sessions still running
+    sessions = [
+        session for session_start, session_end, session in _scheduled_sessions(classes, start.date() - timedelta(days=1), end.date(), room_number)
+        if session_end > start and session_start < end
+    ]
+    sessions.sort(key=lambda session: (session['date'], session['start_time']))
+    return sessions
+
+
+def ended_sessions(classes, since, until=None):
+    """Get the scheduled sessions that ended after since and at or before until, ordered by end time"""
+    if until is None:
+        until = get_current_time().replace(tzinfo=None)
+    
+    # Overnight sessions end on the day after their date
+    sessions = [
+        (session_end, session) for session_start, session_end, session in _scheduled_sessions(classes, since.date() - timedelta(days=1), until.date())
+        if since < session_end <= until
+    ]
+    sessions.sort(key=lambda item: item[0])
+    return [session for _, session in sessions]
+
+
+def _scheduled_sessions(classes, first_day, last_day, room_number=None):
+    """Yield (start, end, session) for every scheduled session on the days from first_day to last_day"""
+    day = first_day
+    while day <= last_day:
+        day_of_week = day.strftime('%A')
+        for class_id, class_info in classes.items():
+            for schedule in class_info.get('schedules', []):
+                if schedule.get('day_of_week') != day_of_week:
+                    continue
+                if room_number is not None and schedule.get('room_number') != room_number:
+                    continue
+                try:
+                    session_start = datetime.combine(day, datetime.strptime(schedule['start_time'], '%H:%M').time())
+                    session_end = datetime.combine(day, datetime.strptime(schedule['end_time'], '%H:%M').time())
+                except (KeyError, ValueError):
+                    continue
+                if session_end <= session_start:
+                    # Overnight session
+                    session_end += timedelta(days=1)
+                yield session_start, session_end, {
+                    'class_id': class_id,
+                    'class_name': class_info.get('class_name'),
+                    'date': day.strftime('%Y-%m-%d'),
+                    'start_time': schedule['start_time'],
+                    'end_time': schedule['end_time'],
+                    'room_number': schedule.get('room_number')
+                }
+        day += timedelta(days=1)
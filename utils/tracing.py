@@ -0,0 +1,244 @@
+"""
+Request tracing and Firestore usage accounting
+
+Spans follow the OpenTelemetry data model (trace id, span id, parent, start and
+end time in nanoseconds, attributes). When TRACE_EXPORTER is 'otel' and the
+opentelemetry-api package is installed, spans are created through the
+OpenTelemetry tracer so any configured SDK exporter receives them. Otherwise a
+built-in tracer hands finished spans to a pluggable exporter:
+
+    TRACE_EXPORTER=none     spans are discarded (default)
+    TRACE_EXPORTER=console  spans are printed as JSON lines
+    TRACE_EXPORTER=file     spans are appended as JSON lines to TRACE_FILE
+
+The module also keeps per-request counters of Firestore documents read and
+written, round trips and time spent in Firestore.
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# OpenTelemetry is optional, the built-in tracer is used without it
+try:
+    from opentelemetry import trace as otel_trace
+    OPENTELEMETRY_AVAILABLE = True
+except ImportError:
+    OPENTELEMETRY_AVAILABLE = False
+
+
+class FirestoreUsage:
+    """Firestore usage accumulated during a single request"""
+
+    __slots__ = ('reads', 'writes', 'round_trips', 'elapsed')
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+        self.elapsed = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'firestore.reads': self.reads,
+            'firestore.writes': self.writes,
+            'firestore.round_trips': self.round_trips,
+            'firestore.time_ms': round(self.elapsed * 1000, 3),
+        }
+
+
+_current_usage: contextvars.ContextVar[Optional[FirestoreUsage]] = contextvars.ContextVar('firestore_usage', default=None)
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+
+def start_usage() -> contextvars.Token:
+    """Start accounting Firestore usage for the current request"""
+    return _current_usage.set(FirestoreUsage())
+
+
+def end_usage(token: contextvars.Token):
+    """Stop accounting Firestore usage for the current request"""
+    _current_usage.reset(token)
+
+
+def current_usage() -> Optional[FirestoreUsage]:
+    """Get the Firestore usage of the current request, if one is being accounted"""
+    return _current_usage.get()
+
+
+def record_firestore_call(reads: int = 0, writes: int = 0, elapsed: float = 0.0):
+    """Record one Firestore round trip against the current request and span"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.reads += reads
+        usage.writes += writes
+        usage.round_trips += 1
+        usage.elapsed += elapsed
+
+    span = _current_span.get()
+    if span is not None:
+        span.add_usage(reads, writes, elapsed)
+
+
+class Span:
+    """A finished or in-progress operation in the built-in tracer"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.attributes = dict(attributes or {})
+        self.status = 'OK'
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_usage(self, reads: int, writes: int, elapsed: float):
+        attrs = self.attributes
+        attrs['firestore.reads'] = attrs.get('firestore.reads', 0) + reads
+        attrs['firestore.writes'] = attrs.get('firestore.writes', 0) + writes
+        attrs['firestore.round_trips'] = attrs.get('firestore.round_trips', 0) + 1
+        attrs['firestore.time_ms'] = round(attrs.get('firestore.time_ms', 0) + elapsed * 1000, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'start_time_unix_nano': self.start_time,
+            'end_time_unix_nano': self.end_time,
+            'duration_ms': round((self.end_time - self.start_time) / 1e6, 3) if self.end_time else None,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class NoopSpanExporter:
+    """Exporter that discards all spans"""
+
+    def export(self, span: Span):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class ConsoleSpanExporter:
+    """Exporter printing spans as JSON lines to stdout"""
+
+    def export(self, span: Span):
+        print(json.dumps(span.to_dict(), default=str), file=sys.stdout)
+
+    def shutdown(self):
+        pass
+
+
+class FileSpanExporter:
+    """Exporter appending spans as JSON lines to a file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def _exporter_from_environment():
+    """Create the span exporter selected by TRACE_EXPORTER"""
+    name = os.environ.get('TRACE_EXPORTER', 'none').lower()
+
+    if name == 'console':
+        return ConsoleSpanExporter()
+    if name == 'file':
+        return FileSpanExporter(os.environ.get('TRACE_FILE', 'traces.jsonl'))
+    if name == 'otel' and not OPENTELEMETRY_AVAILABLE:
+        print("opentelemetry-api not available, traces are not exported")
+    return NoopSpanExporter()
+
+
+_exporter = None
+_use_otel = os.environ.get('TRACE_EXPORTER', 'none').lower() == 'otel' and OPENTELEMETRY_AVAILABLE
+
+
+def get_span_exporter():
+    """Get the exporter receiving finished spans, creating it on first use"""
+    global _exporter
+    if _exporter is None:
+        _exporter = _exporter_from_environment()
+    return _exporter
+
+
+def set_span_exporter(exporter):
+    """Replace the exporter receiving finished spans (any object with export(span))"""
+    global _exporter, _use_otel
+    if _exporter is not None:
+        _exporter.shutdown()
+    _exporter = exporter
+    _use_otel = False
+
+
+def tracing_enabled() -> bool:
+    """Whether spans are recorded at all"""
+    return _use_otel or not isinstance(get_span_exporter(), NoopSpanExporter)
+
+
+@contextmanager
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """
+    Start a span as a child of the current span
+    Firestore calls made inside the span are added to its attributes
+    """
+    if _use_otel:
+        tracer = otel_trace.get_tracer('fingerprint-attendance')
+        with tracer.start_as_current_span(name, attributes=attributes) as otel_span:
+            span = Span(name, '', None, attributes)
+            token = _current_span.set(span)
+            try:
+                yield span
+            finally:
+                _current_span.reset(token)
+                for key, value in span.attributes.items():
+                    otel_span.set_attribute(key, value)
+        return
+
+    parent = _current_span.get()
+    trace_id = parent.trace_id if parent else secrets.token_hex(16)
+    span = Span(name, trace_id, parent.span_id if parent else None, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.status = 'ERROR'
+        span.set_attribute('exception.message', str(e))
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end_time = time.time_ns()
+
+        # Child usage also counts towards the parent span
+        if parent is not None:
+            for key in ('firestore.reads', 'firestore.writes', 'firestore.round_trips', 'firestore.time_ms'):
+                if key in span.attributes:
+                    value = parent.attributes.get(key, 0) + span.attributes[key]
+                    parent.attributes[key] = round(value, 3) if key == 'firestore.time_ms' else value
+
+        get_span_exporter().export(span)
@@ -111,6 +111,9 @@ function initFormHandlers() {
 function loadDashboardData() {
     console.log("Loading dashboard data...");
     
+    // New check-ins are pushed by the server instead of re-fetching reports
+    startAttendanceFeed();
+    
     // In simulation mode, use fake data
     if (window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1') {
         simulateDashboardData();
@@ -121,6 +124,55 @@ function loadDashboardData() {
     // This would make authenticated API calls to get real data
 }
 
+// Live attendance feed over Server-Sent Events
+const RECENT_ATTENDANCE_ROWS = 20;
+let attendanceFeed = null;
+
+function startAttendanceFeed(classId) {
+    if (!window.EventSource) {
+        console.log("EventSource not supported, live attendance disabled");
+        return;
+    }
+    
+    if (attendanceFeed) {
+        attendanceFeed.close();
+    }
+    
+    // The browser reconnects by itself and resumes from the last event ID
+    const url = classId ? `/api/attendance/stream?class_id=${encodeURIComponent(classId)}` : '/api/attendance/stream';
+    attendanceFeed = new EventSource(url);
+    attendanceFeed.addEventListener('attendance', function(e) {
+        addRecentAttendance(JSON.parse(e.data));
+    });
+    attendanceFeed.onerror = function() {
+        console.log("Attendance feed interrupted, reconnecting...");
+    };
+}
+
+function addRecentAttendance(record) {
+    const recentAttendance = document.getElementById('recent-attendance-data');
+    if (!recentAttendance) {
+        return;
+    }
+    
+    // Drop the loading placeholder
+    if (recentAttendance.querySelector('td[colspan]')) {
+        recentAttendance.innerHTML = '';
+    }
+    
+    const row = document.createElement('tr');
+    [record.student_name || record.student_id, record.class_name || record.class_id, record.timestamp].forEach(value => {
+        const cell = document.createElement('td');
+        cell.textContent = value;
+        row.appendChild(cell);
+    });
+    recentAttendance.insertBefore(row, recentAttendance.firstChild);
+    
+    while (recentAttendance.children.length > RECENT_ATTENDANCE_ROWS) {
+        recentAttendance.removeChild(recentAttendance.lastChild);
+    }
+}
+
 // Simulate dashboard data for development
 function simulateDashboardData() {
     console.log("Using simulated dashboard data");